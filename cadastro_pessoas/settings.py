@@ -70,7 +70,9 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pessoas.papeis.PapelMiddleware',  # Role resolved once per request, cached in the session
     'django.contrib.messages.middleware.MessageMiddleware',
+    'pessoas.cache_paginas.CachePaginasMiddleware',  # Full-page cache of public pages for anonymous visitors
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # Required for allauth
 ]
@@ -115,10 +117,34 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Concurrent gunicorn threads wait for the write lock instead of failing
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # File-based test database so threaded tests share real locking
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
 
+# Cache shared by every worker: the signal-driven invalidations (availability,
+# directory, role versions, page cache) must reach all processes, which a
+# per-process LocMemCache would not. The table is created by the pessoas 0017
+# migration. Hit/miss counters are not kept here (see pessoas/contadores.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'simed_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -146,14 +172,29 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
-
-# Whitenoise configuration for serving static files in production
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Whitenoise configuration for serving static files in production. The static
+# backend (pessoas/estaticos.py) extends CompressedManifestStaticFilesStorage:
+# collectstatic minifies CSS/JS, recompresses PNGs losslessly and adds WebP
+# alternates before hashing, and writes a size report to STATIC_ROOT.
+# (STATICFILES_STORAGE is ignored since Django 5.1.)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'pessoas.estaticos.EstaticosOtimizadosStorage',
+    },
+}
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rendered PDF receipts (pessoas/comprovantes.py); kept outside MEDIA_ROOT, which is public
+COMPROVANTES_ROOT = BASE_DIR / 'comprovantes'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -1,9 +1,66 @@
-from django.contrib import admin
+import io
+import tempfile
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse
+from django.utils import timezone
+from django.template.response import TemplateResponse
+from django.urls import path
+from .forms import ImportacaoCSVForm
 from .models import Perfil, Consulta, Medicamento, Especialidade, Profissional
+from . import importacao, lote_pdf
+
+
+class ImportacaoCSVAdminMixin:
+    """Acrescenta à listagem do admin um upload de CSV processado por pessoas.importacao."""
+    change_list_template = 'admin/pessoas/change_list_importacao.html'
+    tipo_importacao = None
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path(
+                'importar-csv/',
+                self.admin_site.admin_view(self.importar_csv),
+                name='%s_%s_importar_csv' % info,
+            ),
+        ] + super().get_urls()
+
+    def importar_csv(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        relatorio = None
+        form = ImportacaoCSVForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            arquivo = io.TextIOWrapper(form.cleaned_data['arquivo'].file, encoding='utf-8-sig', newline='')
+            try:
+                relatorio = importacao.importar(
+                    arquivo,
+                    self.tipo_importacao,
+                    lote=form.cleaned_data['lote'],
+                    so_validar=form.cleaned_data['so_validar'],
+                )
+            except (UnicodeDecodeError, importacao.ErroImportacao) as erro:
+                messages.error(request, f'Arquivo não importado: {erro}')
+            else:
+                if relatorio.erros:
+                    messages.warning(request, f'{len(relatorio.erros)} linhas com erro foram ignoradas.')
+                else:
+                    messages.success(request, 'Arquivo processado sem erros.')
+        return TemplateResponse(request, 'admin/pessoas/importar_csv.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Importar {self.model._meta.verbose_name_plural} de CSV',
+            'form': form,
+            'relatorio': relatorio,
+            'colunas': importacao.COLUNAS[self.tipo_importacao],
+            'obrigatorias': importacao.OBRIGATORIAS[self.tipo_importacao],
+        })
 
 
 @admin.register(Perfil)
-class PerfilAdmin(admin.ModelAdmin):
+class PerfilAdmin(ImportacaoCSVAdminMixin, admin.ModelAdmin):
+    tipo_importacao = 'usuarios'
     list_display = ['usuario', 'tipo_usuario', 'telefone', 'data_nascimento']
     list_filter = ['tipo_usuario']
     search_fields = ['usuario__username', 'usuario__email', 'telefone']
@@ -16,7 +73,8 @@ class EspecialidadeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Profissional)
-class ProfissionalAdmin(admin.ModelAdmin):
+class ProfissionalAdmin(ImportacaoCSVAdminMixin, admin.ModelAdmin):
+    tipo_importacao = 'profissionais'
     list_display = ['nome', 'especialidade', 'crm', 'ativo', 'destaque']
     list_filter = ['especialidade', 'ativo', 'destaque']
     search_fields = ['nome', 'crm', 'email']
@@ -30,6 +88,30 @@ class ConsultaAdmin(admin.ModelAdmin):
     list_filter = ['status', 'data_hora']
     search_fields = ['paciente__username', 'medico__username']
     date_hierarchy = 'data_hora'
+    actions = ['gerar_pdf_impressao', 'gerar_zip_pdfs']
+
+    def _gerar_lote(self, request, queryset, formato):
+        consultas = queryset.ativas()
+        if not consultas.exists():
+            self.message_user(request, 'Nenhuma consulta agendada ou confirmada na seleção.', messages.WARNING)
+            return None
+        # Arquivo temporário apagado quando o FileResponse o fechar
+        destino = tempfile.TemporaryFile()
+        relatorio = lote_pdf.gerar(consultas, destino, formato)
+        destino.seek(0)
+        return FileResponse(
+            destino,
+            as_attachment=True,
+            filename=f'pdfs_{timezone.localdate():%Y%m%d}_{relatorio.paginas}_paginas.{formato}',
+        )
+
+    @admin.action(description='Gerar agendas e comprovantes em um PDF para impressão')
+    def gerar_pdf_impressao(self, request, queryset):
+        return self._gerar_lote(request, queryset, 'pdf')
+
+    @admin.action(description='Gerar agendas e comprovantes em um ZIP')
+    def gerar_zip_pdfs(self, request, queryset):
+        return self._gerar_lote(request, queryset, 'zip')
 
 
 @admin.register(Medicamento)
@@ -0,0 +1,278 @@
+# pessoas/agenda_bits.py
+
+"""
+Motor de disponibilidade em memória baseado em máscaras de bits.
+
+Cada dia de um profissional vira um inteiro de largura fixa em que o bit i
+representa o i-ésimo horário da grade (definida por HorarioTrabalho). Livres,
+primeiro horário livre e cruzamento com as restrições do paciente passam a ser
+operações bit a bit em vez de loops sobre objetos time.
+"""
+
+from datetime import datetime, time, timedelta
+from functools import reduce
+from itertools import chain
+from math import gcd
+from django.utils import timezone
+from .models import Consulta, HorarioTrabalho, Profissional, ReservaHorario
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _hora(minutos):
+    return time(minutos // 60, minutos % 60)
+
+
+# Posições dos bits ligados de cada valor de byte, para percorrer máscaras 8 bits por vez
+_BITS_DO_BYTE = tuple(
+    tuple(i for i in range(8) if (valor >> i) & 1) for valor in range(256)
+)
+
+
+def _mascara_periodica(primeiro, salto, quantidade):
+    """
+    Máscara com `quantidade` bits ligados a cada `salto` posições a partir de
+    `primeiro`, calculada de uma vez pela soma da progressão geométrica
+    (2^(salto*quantidade) - 1) / (2^salto - 1) em vez de um bit por iteração.
+    """
+    if quantidade <= 0:
+        return 0
+    return ((1 << (salto * quantidade)) - 1) // ((1 << salto) - 1) << primeiro
+
+
+class AgendaDia:
+    """
+    Agenda de um profissional em um dia. `grade` marca os horários em que ele
+    atende e `livres` os que ainda não têm consulta (sempre um subconjunto).
+    """
+    __slots__ = ('inicio', 'passo', 'largura', 'grade', 'livres', 'horas')
+
+    def __init__(self, inicio, passo, largura, grade, livres=None, horas=None):
+        self.inicio = inicio
+        self.passo = passo
+        self.largura = largura
+        self.grade = grade
+        self.livres = grade if livres is None else livres & grade
+        # Tabela índice -> time, compartilhada entre os dias com a mesma grade
+        self.horas = horas or tuple(_hora(inicio + i * passo) for i in range(largura))
+
+    def copia(self):
+        """Nova agenda com a mesma grade e todos os horários livres."""
+        return AgendaDia(self.inicio, self.passo, self.largura, self.grade, horas=self.horas)
+
+    @classmethod
+    def dos_horarios(cls, horarios):
+        """
+        Monta a grade do dia a partir dos HorarioTrabalho daquele dia da semana.
+        Blocos com intervalos diferentes compartilham uma grade com passo igual
+        ao MDC dos intervalos.
+        """
+        horarios = [h for h in horarios if h.intervalo_minutos and h.hora_inicio < h.hora_fim]
+        if not horarios:
+            return None
+        inicio = min(_minutos(h.hora_inicio) for h in horarios)
+        fim = max(_minutos(h.hora_fim) for h in horarios)
+        passo = reduce(gcd, (h.intervalo_minutos for h in horarios))
+        # Alinha a grade ao início de cada bloco
+        passo = reduce(gcd, (_minutos(h.hora_inicio) - inicio for h in horarios), passo)
+        largura = (fim - inicio + passo - 1) // passo
+
+        grade = 0
+        for h in horarios:
+            primeiro = (_minutos(h.hora_inicio) - inicio) // passo
+            salto = h.intervalo_minutos // passo
+            quantidade = -(-(_minutos(h.hora_fim) - _minutos(h.hora_inicio)) // h.intervalo_minutos)
+            grade |= _mascara_periodica(primeiro, salto, quantidade)
+        return cls(inicio, passo, largura, grade)
+
+    def indice(self, hora):
+        """Posição do horário na grade, ou None se não cair em um slot."""
+        deslocamento = _minutos(hora) - self.inicio
+        if deslocamento < 0 or deslocamento % self.passo:
+            return None
+        i = deslocamento // self.passo
+        if i >= self.largura or not (self.grade >> i) & 1:
+            return None
+        return i
+
+    def hora(self, i):
+        return self.horas[i]
+
+    def ocupar(self, hora):
+        i = self.indice(hora)
+        if i is not None:
+            self.livres &= ~(1 << i)
+
+    def ocupar_todos(self, horas):
+        """Ocupa vários horários de uma vez, aplicando uma única máscara."""
+        inicio, passo = self.inicio, self.passo
+        ocupados = 0
+        for hora in horas:
+            deslocamento = hora.hour * 60 + hora.minute - inicio
+            if deslocamento >= 0 and not deslocamento % passo:
+                ocupados |= 1 << (deslocamento // passo)
+        self.livres &= ~ocupados & self.grade
+
+    def liberar(self, hora):
+        i = self.indice(hora)
+        if i is not None:
+            self.livres |= 1 << i
+
+    def esta_livre(self, hora):
+        i = self.indice(hora)
+        return i is not None and bool((self.livres >> i) & 1)
+
+    def horarios(self):
+        """Todos os horários da grade, livres ou não."""
+        return self._horas_da_mascara(self.grade)
+
+    def horarios_livres(self, mascara=None):
+        """Lista os horários livres, opcionalmente restritos a uma máscara."""
+        livres = self.livres if mascara is None else self.livres & mascara
+        return self._horas_da_mascara(livres)
+
+    def _horas_da_mascara(self, mascara):
+        horas = []
+        base = 0
+        while mascara:
+            for i in _BITS_DO_BYTE[mascara & 0xFF]:
+                horas.append(self.horas[base + i])
+            mascara >>= 8
+            base += 8
+        return horas
+
+    def primeiro_livre(self, mascara=None):
+        """Primeiro horário livre do dia (bit menos significativo), ou None."""
+        livres = self.livres if mascara is None else self.livres & mascara
+        if not livres:
+            return None
+        return self.horas[(livres & -livres).bit_length() - 1]
+
+    def total_livres(self, mascara=None):
+        livres = self.livres if mascara is None else self.livres & mascara
+        return bin(livres).count('1')
+
+    def mascara_janela(self, de, ate):
+        """Máscara dos slots que começam em [de, ate)."""
+        primeiro = max(0, -(-(_minutos(de) - self.inicio) // self.passo))
+        ultimo = min(self.largura, -(-(_minutos(ate) - self.inicio) // self.passo))
+        if ultimo <= primeiro:
+            return 0
+        return ((1 << (ultimo - primeiro)) - 1) << primeiro
+
+    def mascara_restricoes(self, janelas):
+        """União das janelas [(de, ate), ...] em que o paciente pode comparecer."""
+        mascara = 0
+        for de, ate in janelas:
+            mascara |= self.mascara_janela(de, ate)
+        return mascara
+
+    def intersecao(self, janelas):
+        """Horários livres compatíveis com as janelas informadas pelo paciente."""
+        return self.horarios_livres(self.mascara_restricoes(janelas))
+
+
+class MotorDisponibilidade:
+    """
+    Conjunto de AgendaDia indexado por (profissional_id, data). Os horários de
+    trabalho são carregados de uma vez; as consultas ativas, de uma vez para
+    todo o período ou, com `bloco_dias`, aos poucos conforme os dias são lidos.
+    """
+
+    def __init__(self, usuarios=None, fim=None, bloco_dias=None):
+        self.grades = {}   # (profissional_id, dia_semana) -> AgendaDia modelo
+        self.dias = {}     # (profissional_id, data) -> AgendaDia
+        self.usuarios = usuarios or {}  # usuario_id -> profissional_id
+        self.com_agenda = set()         # profissionais com ao menos um dia de atendimento
+        self.fim = fim
+        self.bloco_dias = bloco_dias
+        self.carregado_ate = None
+
+    @classmethod
+    def carregar(cls, profissionais, inicio, fim, bloco_dias=None):
+        """Carrega a agenda dos profissionais (ids ou objetos) entre duas datas."""
+        ids = [getattr(p, 'id', p) for p in profissionais]
+        usuarios = dict(Profissional.objects.filter(
+            pk__in=ids, usuario__isnull=False
+        ).values_list('usuario_id', 'id'))
+        motor = cls(usuarios, fim, bloco_dias)
+
+        horarios_por_dia = {}
+        for horario in HorarioTrabalho.objects.filter(profissional_id__in=ids, ativo=True):
+            horarios_por_dia.setdefault((horario.profissional_id, horario.dia_semana), []).append(horario)
+        for chave, horarios in horarios_por_dia.items():
+            agenda = AgendaDia.dos_horarios(horarios)
+            if agenda:
+                motor.adicionar_grade(*chave, agenda)
+
+        motor.carregado_ate = inicio - timedelta(days=1)
+        if not bloco_dias:
+            motor._carregar_consultas(inicio, fim)
+        return motor
+
+    def _carregar_consultas(self, inicio, fim):
+        """Marca como ocupados os horários das consultas ativas e reservas entre duas datas."""
+        self.carregado_ate = fim
+        if not self.usuarios:
+            return
+        data_inicio = timezone.make_aware(datetime.combine(inicio, time.min))
+        data_fim = timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min))
+        consultas = Consulta.objects.ativas().entre(inicio, fim).filter(
+            medico_id__in=self.usuarios
+        ).values_list('medico_id', 'data_hora')
+        # Horários com reserva temporária também ficam indisponíveis
+        reservados = ReservaHorario.objects.filter(
+            medico_id__in=self.usuarios,
+            data_hora__gte=data_inicio,
+            data_hora__lt=data_fim,
+            expira_em__gt=timezone.now()
+        ).values_list('medico_id', 'data_hora')
+        fuso = timezone.get_current_timezone()
+        for medico_id, data_hora in chain(consultas, reservados):
+            local = data_hora.astimezone(fuso)
+            agenda = self.dia(self.usuarios[medico_id], local.date())
+            if agenda:
+                agenda.ocupar(local.time())
+
+    def adicionar_grade(self, profissional_id, dia_semana, agenda):
+        self.grades[(profissional_id, dia_semana)] = agenda
+        self.com_agenda.add(profissional_id)
+
+    def atende(self, profissional_id):
+        """Indica se o profissional tem algum horário de trabalho carregado."""
+        return profissional_id in self.com_agenda
+
+    def dia(self, profissional_id, data):
+        """AgendaDia do profissional na data (criada sob demanda), ou None se não atende."""
+        if self.carregado_ate is not None and data > self.carregado_ate and self.bloco_dias:
+            fim_bloco = data + timedelta(days=self.bloco_dias - 1)
+            if self.fim:
+                fim_bloco = min(fim_bloco, self.fim)
+            self._carregar_consultas(self.carregado_ate + timedelta(days=1), max(fim_bloco, data))
+
+        chave = (profissional_id, data)
+        agenda = self.dias.get(chave)
+        if agenda is None:
+            modelo = self.grades.get((profissional_id, data.weekday()))
+            if modelo is None:
+                return None
+            agenda = modelo.copia()
+            self.dias[chave] = agenda
+        return agenda
+
+    def horarios_livres(self, profissional_id, data, janelas=None):
+        agenda = self.dia(profissional_id, data)
+        if agenda is None:
+            return []
+        if janelas:
+            return agenda.intersecao(janelas)
+        return agenda.horarios_livres()
+
+    def primeiro_livre(self, profissional_id, data, janelas=None):
+        agenda = self.dia(profissional_id, data)
+        if agenda is None:
+            return None
+        mascara = agenda.mascara_restricoes(janelas) if janelas else None
+        return agenda.primeiro_livre(mascara)
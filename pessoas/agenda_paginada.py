@@ -0,0 +1,180 @@
+# pessoas/agenda_paginada.py
+
+"""
+Agenda de consultas por dia ou semana, paginada por chave (data_hora, id).
+
+A janela limita a leitura a um intervalo de data_hora, que os índices
+(medico, data_hora, status) e (data_hora) atendem, e cada página é buscada
+com "depois de / antes de (data_hora, id)" em vez de OFFSET: o custo da
+página depende do tamanho da janela e da página, não de quantas consultas
+existem na tabela. Paciente e médico vêm no mesmo SELECT (select_related).
+
+O histórico do painel do paciente usa os mesmos cursores sem janela, da
+consulta mais recente para a mais antiga (recentes() e historico()).
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import Q
+from django.utils import timezone
+
+VISOES = {'dia': 1, 'semana': 7}
+VISAO_PADRAO = 'dia'
+
+POR_PAGINA = 50
+
+# Cursor: instante em UTC e id, só com caracteres seguros em URL
+_FORMATO_CURSOR = '%Y%m%dT%H%M%S%f'
+
+
+def cursor(consulta):
+    return f'{consulta.data_hora.astimezone(dt_timezone.utc):{_FORMATO_CURSOR}}-{consulta.id}'
+
+
+def ler_cursor(valor):
+    """(data_hora, id) de um cursor, ou None se ele for inválido."""
+    try:
+        instante, consulta_id = valor.split('-')
+        data_hora = datetime.strptime(instante, _FORMATO_CURSOR).replace(tzinfo=dt_timezone.utc)
+        return data_hora, int(consulta_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def janela(visao, data=None):
+    """
+    (inicio, fim) da visão pedida: o próprio dia, ou a semana (segunda a
+    domingo) que contém a data. Sem data, usa hoje.
+    """
+    data = data or timezone.localdate()
+    if visao == 'semana':
+        inicio = data - timedelta(days=data.weekday())
+    else:
+        inicio = data
+    return inicio, inicio + timedelta(days=VISOES[visao] - 1)
+
+
+def pagina(consultas, apos=None, antes=None, por_pagina=POR_PAGINA):
+    """
+    Uma página de `consultas` em ordem (data_hora, id), depois do cursor
+    `apos` ou antes do cursor `antes`. Retorna (itens, cursor da próxima
+    página, cursor da página anterior); os cursores são None quando não há
+    mais nada naquela direção.
+    """
+    consultas = consultas.select_related('paciente', 'medico')
+    chave = ler_cursor(antes) if antes else None
+    if chave:
+        data_hora, consulta_id = chave
+        itens = list(consultas.filter(
+            Q(data_hora__lt=data_hora) | Q(data_hora=data_hora, id__lt=consulta_id)
+        ).order_by('-data_hora', '-id')[:por_pagina + 1])
+        mais_antes = len(itens) > por_pagina
+        itens = itens[:por_pagina][::-1]
+        return (
+            itens,
+            cursor(itens[-1]) if itens else None,
+            cursor(itens[0]) if itens and mais_antes else None,
+        )
+
+    chave = ler_cursor(apos) if apos else None
+    if chave:
+        data_hora, consulta_id = chave
+        consultas = consultas.filter(
+            Q(data_hora__gt=data_hora) | Q(data_hora=data_hora, id__gt=consulta_id)
+        )
+    itens = list(consultas.order_by('data_hora', 'id')[:por_pagina + 1])
+    mais_depois = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+    return (
+        itens,
+        cursor(itens[-1]) if itens and mais_depois else None,
+        cursor(itens[0]) if itens and chave else None,
+    )
+
+
+def recentes(consultas, antes=None, apos=None, por_pagina=POR_PAGINA):
+    """
+    Uma página de `consultas` da mais recente para a mais antiga, com
+    data_hora antes do cursor `antes` (mais antigas) ou depois do cursor
+    `apos` (mais recentes). Retorna (itens, cursor das mais antigas, cursor
+    das mais recentes), None quando não há mais nada naquela direção.
+    """
+    consultas = consultas.select_related('paciente', 'medico')
+    chave = ler_cursor(apos) if apos else None
+    if chave:
+        data_hora, consulta_id = chave
+        itens = list(consultas.filter(
+            Q(data_hora__gt=data_hora) | Q(data_hora=data_hora, id__gt=consulta_id)
+        ).order_by('data_hora', 'id')[:por_pagina + 1])
+        mais_recentes = len(itens) > por_pagina
+        itens = itens[:por_pagina][::-1]
+        return (
+            itens,
+            cursor(itens[-1]) if itens else None,
+            cursor(itens[0]) if itens and mais_recentes else None,
+        )
+
+    chave = ler_cursor(antes) if antes else None
+    if chave:
+        data_hora, consulta_id = chave
+        consultas = consultas.filter(
+            Q(data_hora__lt=data_hora) | Q(data_hora=data_hora, id__lt=consulta_id)
+        )
+    itens = list(consultas.order_by('-data_hora', '-id')[:por_pagina + 1])
+    mais_antigas = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+    return (
+        itens,
+        cursor(itens[-1]) if itens and mais_antigas else None,
+        cursor(itens[0]) if itens and chave else None,
+    )
+
+
+def historico(request, consultas):
+    """
+    Lê os cursores ?antes= / ?apos= e devolve o contexto do histórico com a
+    página das consultas, da mais recente para a mais antiga.
+    """
+    itens, antigas, novas = recentes(
+        consultas,
+        antes=request.GET.get('antes'),
+        apos=request.GET.get('apos'),
+    )
+    return {
+        'consultas': itens,
+        'pagina_antigas': antigas,
+        'pagina_recentes': novas,
+    }
+
+
+def agenda(request, consultas):
+    """
+    Lê ?visao=dia|semana, ?data=AAAA-MM-DD e os cursores ?apos= / ?antes= e
+    devolve o contexto da agenda com a página das consultas da janela.
+    """
+    visao = request.GET.get('visao')
+    if visao not in VISOES:
+        visao = VISAO_PADRAO
+    try:
+        data = datetime.strptime(request.GET.get('data', ''), '%Y-%m-%d').date()
+    except ValueError:
+        data = None
+    inicio, fim = janela(visao, data)
+
+    itens, proximo, anterior = pagina(
+        consultas.entre(inicio, fim),
+        apos=request.GET.get('apos'),
+        antes=request.GET.get('antes'),
+    )
+    passo = timedelta(days=VISOES[visao])
+    return {
+        'consultas': itens,
+        'visao': visao,
+        'visoes': list(VISOES),
+        'inicio': inicio,
+        'fim': fim,
+        'hoje': timezone.localdate(),
+        'janela_anterior': (inicio - passo).isoformat(),
+        'janela_seguinte': (inicio + passo).isoformat(),
+        'pagina_seguinte': proximo,
+        'pagina_anterior': anterior,
+    }
@@ -0,0 +1,107 @@
+# pessoas/agendamento.py
+
+"""
+Serviço único de agendamento de consultas.
+
+A checagem de horário livre nos formulários é só uma validação amigável; quem
+garante que não existam duas consultas ativas do mesmo médico no mesmo horário
+é a restrição única parcial `consulta_unica_por_horario`. O INSERT roda dentro
+de um savepoint: se outra requisição ganhou a corrida, o conflito volta como
+HorarioIndisponivel, sem lock de tabela e sem novas tentativas. Horários com
+reserva temporária de outro usuário (pessoas/reservas.py) também são recusados.
+
+remover_consultas() exclui várias consultas de uma vez (remoção de um
+médico ou paciente): os signals de post_delete de Consulta ficam desligados
+durante a exclusão e o resumo, o registro de eventos, os comprovantes e os
+caches são ajustados uma vez para o lote inteiro.
+"""
+
+from contextvars import ContextVar
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import Consulta, EventoAgenda, Profissional, ReservaHorario
+from . import cache_disponibilidade, comprovantes, metricas, ocupacao, reservas
+
+# Verdadeiro enquanto remover_consultas() exclui um lote; lido pelos signals
+_removendo_em_lote = ContextVar('removendo_em_lote', default=False)
+
+MENSAGEM_HORARIO_OCUPADO = 'Este horário já está ocupado. Por favor, escolha outro.'
+MENSAGEM_HORARIO_RESERVADO = 'Este horário está reservado por outra pessoa no momento. Por favor, escolha outro.'
+
+
+class HorarioIndisponivel(Exception):
+    """O horário escolhido já foi ocupado por outra consulta ativa."""
+
+    def __init__(self, mensagem=MENSAGEM_HORARIO_OCUPADO):
+        super().__init__(mensagem)
+
+
+def agendar_consulta(paciente, medico, data_hora, profissional=None, observacoes=None, reservado_por=None):
+    """
+    Cria a consulta de forma atômica e retorna a instância salva.
+    Levanta HorarioIndisponivel se o médico já tem consulta ativa no horário
+    ou se o horário está reservado por alguém que não `reservado_por`.
+    """
+    if reservas.esta_reservado(medico.pk, data_hora, exceto_usuario=reservado_por):
+        raise HorarioIndisponivel(MENSAGEM_HORARIO_RESERVADO)
+
+    consulta = Consulta(
+        paciente=paciente,
+        medico=medico,
+        profissional=profissional,
+        data_hora=data_hora,
+        observacoes=observacoes,
+    )
+    try:
+        with transaction.atomic():
+            consulta.save()
+            # A reserva temporária do horário foi consumida pelo agendamento
+            ReservaHorario.objects.filter(medico=medico, data_hora=data_hora).delete()
+    except IntegrityError:
+        if Consulta.objects.ativas().filter(medico=medico, data_hora=data_hora).exists():
+            raise HorarioIndisponivel()
+        raise
+    return consulta
+
+
+def removendo_em_lote():
+    """Os signals de post_delete de Consulta devem ignorar a exclusão atual."""
+    return _removendo_em_lote.get()
+
+
+def remover_consultas(consultas):
+    """
+    Exclui as consultas do queryset com um número fixo de queries (os
+    signals fariam algumas por consulta). Retorna quantas foram excluídas.
+    """
+    linhas = list(consultas.values('id', 'data_hora', 'medico_id', 'profissional_id'))
+    if not linhas:
+        return 0
+    datas = {timezone.localtime(linha['data_hora']).date() for linha in linhas}
+    medico_ids = {linha['medico_id'] for linha in linhas}
+    profissional_ids = {linha['profissional_id'] for linha in linhas}
+    profissional_ids.update(
+        Profissional.objects.filter(usuario_id__in=medico_ids).values_list('id', flat=True)
+    )
+
+    with transaction.atomic():
+        marcador = _removendo_em_lote.set(True)
+        try:
+            Consulta.objects.filter(pk__in=[linha['id'] for linha in linhas]).delete()
+        finally:
+            _removendo_em_lote.reset(marcador)
+        metricas.recalcular(medico_ids, datas)
+        EventoAgenda.objects.bulk_create([
+            EventoAgenda(
+                data=timezone.localtime(linha['data_hora']).date(),
+                tipo='removida',
+                consulta_id=linha['id'],
+                dados={'id': linha['id']},
+            )
+            for linha in linhas
+        ], batch_size=500)
+        for linha in linhas:
+            comprovantes.remover(linha['id'])
+        cache_disponibilidade.invalidar_dias(datas, profissional_ids, medico_ids)
+        ocupacao.invalidar_tudo()
+    return len(linhas)
@@ -0,0 +1,75 @@
+# pessoas/busca_horarios.py
+
+"""
+Busca dos próximos horários livres entre todos os profissionais de uma
+especialidade.
+
+Cada profissional vira um fluxo (gerador) de horários livres em ordem
+cronológica, calculado dia a dia sobre o motor de máscaras de bits; os fluxos
+são combinados com um merge k-way em heap (heapq.merge), então só os dias
+necessários para achar os N primeiros horários chegam a ser calculados.
+"""
+
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import islice
+from django.utils import timezone
+from .agenda_bits import MotorDisponibilidade
+from .models import Profissional
+
+# Janelas de preferência de horário do paciente
+PERIODOS = {
+    'manha': (time(0, 0), time(12, 0)),
+    'tarde': (time(12, 0), time(18, 0)),
+    'noite': (time(18, 0), time(23, 59)),
+}
+
+# Quantos dias de consultas o motor carrega por query durante a busca
+BLOCO_DIAS = 2
+
+
+def _fluxo_profissional(motor, profissional_id, inicio, fim, janelas, agora):
+    """Gera (data_hora, profissional_id) dos horários livres do profissional, em ordem."""
+    data = inicio
+    while data <= fim:
+        agenda = motor.dia(profissional_id, data)
+        if agenda:
+            mascara = agenda.mascara_restricoes(janelas) if janelas else agenda.grade
+            if data == agora.date():
+                mascara &= agenda.mascara_janela(agora.time(), time(23, 59))
+            for hora in agenda.horarios_livres(mascara):
+                yield datetime.combine(data, hora), profissional_id
+        data += timedelta(days=1)
+
+
+def proximos_horarios(especialidade, inicio, fim, janelas=None, limite=10):
+    """
+    Retorna os `limite` primeiros horários livres entre os profissionais
+    ativos da especialidade, de `inicio` a `fim` (inclusive), como lista de
+    (data_hora, profissional) em ordem cronológica. Profissionais sem usuário
+    ficam de fora: não recebem agendamentos e suas consultas não seriam
+    descontadas da grade.
+    """
+    profissionais = {
+        p.id: p for p in Profissional.objects.filter(
+            especialidade=especialidade, ativo=True, usuario__isnull=False
+        )
+    }
+    if not profissionais:
+        return []
+
+    agora = timezone.localtime()
+    inicio = max(inicio, agora.date())
+    if fim < inicio:
+        return []
+
+    motor = MotorDisponibilidade.carregar(profissionais.values(), inicio, fim, bloco_dias=BLOCO_DIAS)
+    fluxos = [
+        _fluxo_profissional(motor, profissional_id, inicio, fim, janelas, agora)
+        for profissional_id in profissionais
+        if motor.atende(profissional_id)
+    ]
+    return [
+        (data_hora, profissionais[profissional_id])
+        for data_hora, profissional_id in islice(heapq.merge(*fluxos), limite)
+    ]
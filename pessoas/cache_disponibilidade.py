@@ -0,0 +1,121 @@
+# pessoas/cache_disponibilidade.py
+
+"""
+Cache das respostas de disponibilidade por (profissional, data).
+
+A grade de um dia só muda quando uma consulta daquele dia é criada, alterada
+ou removida, ou quando o horário de trabalho do profissional muda. As views
+de horários guardam o resultado já calculado e os signals apagam apenas as
+chaves afetadas. As reservas temporárias são pessoais e continuam sendo
+aplicadas depois da leitura do cache.
+
+O cache é o DatabaseCache de settings.CACHES, uma tabela do banco: os
+workers do gunicorn veem as mesmas entradas, então a invalidação feita por
+um deles vale para todos. Um acerto custa só a leitura da chave; os
+contadores de acertos e faltas ficam em memória e são somados aos dos
+outros workers por pessoas/contadores.py.
+"""
+
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from . import contadores
+from .models import Profissional
+from .disponibilidade import HORIZONTE_DIAS
+
+# Validade das entradas; limita o tempo de vida de algo que escape da invalidação
+TIMEOUT = 10 * 60
+
+PREFIXO = 'disponibilidade'
+CHAVE_ACERTOS = f'{PREFIXO}:acertos'
+CHAVE_FALTAS = f'{PREFIXO}:faltas'
+
+# Marca valores None guardados no cache (profissional sem horários configurados)
+_VAZIO = '__vazio__'
+
+
+def chave_profissional(profissional_id, data):
+    return f'{PREFIXO}:prof:{profissional_id}:{data.isoformat()}'
+
+
+def chave_medico(medico_id, data):
+    return f'{PREFIXO}:medico:{medico_id}:{data.isoformat()}'
+
+
+def obter(chave, calcular):
+    """Lê a chave do cache ou calcula, guarda e retorna o valor."""
+    valor = cache.get(chave)
+    if valor is not None:
+        contadores.contar(CHAVE_ACERTOS)
+        return None if valor == _VAZIO else valor
+    contadores.contar(CHAVE_FALTAS)
+    valor = calcular()
+    cache.set(chave, _VAZIO if valor is None else valor, TIMEOUT)
+    return valor
+
+
+def estatisticas():
+    """Acertos, faltas e taxa de acerto acumulados desde o último zerar_estatisticas()."""
+    valores = contadores.valores([CHAVE_ACERTOS, CHAVE_FALTAS])
+    acertos = valores.get(CHAVE_ACERTOS, 0)
+    faltas = valores.get(CHAVE_FALTAS, 0)
+    total = acertos + faltas
+    return {
+        'acertos': acertos,
+        'faltas': faltas,
+        'taxa_acerto': round(acertos / total, 4) if total else None,
+    }
+
+
+def zerar_estatisticas():
+    contadores.zerar([CHAVE_ACERTOS, CHAVE_FALTAS])
+
+
+def _apagar_depois_do_commit(chaves):
+    # Apagar antes do commit deixaria outra requisição guardar o estado antigo
+    chaves = list(chaves)
+    if chaves:
+        transaction.on_commit(lambda: cache.delete_many(chaves))
+
+
+def invalidar_dias(datas, profissional_ids=(), medico_ids=()):
+    """Apaga as entradas dos profissionais e médicos informados nas datas."""
+    chaves = set()
+    for data in datas:
+        chaves.update(chave_profissional(pid, data) for pid in profissional_ids if pid)
+        chaves.update(chave_medico(mid, data) for mid in medico_ids if mid)
+    _apagar_depois_do_commit(chaves)
+
+
+def invalidar_consulta(consulta, data_hora_anterior=None):
+    """Invalida o dia da consulta (e o dia antigo, se ela foi remarcada)."""
+    fuso = timezone.get_current_timezone()
+    datas = {consulta.data_hora.astimezone(fuso).date()}
+    if data_hora_anterior:
+        datas.add(data_hora_anterior.astimezone(fuso).date())
+
+    profissional_ids = {consulta.profissional_id}
+    profissional_ids.update(
+        Profissional.objects.filter(usuario_id=consulta.medico_id).values_list('id', flat=True)
+    )
+    invalidar_dias(datas, profissional_ids, [consulta.medico_id])
+
+
+def _proximas_datas(dia_semana=None):
+    hoje = timezone.localdate()
+    datas = (hoje + timedelta(days=i) for i in range(HORIZONTE_DIAS + 1))
+    if dia_semana is None:
+        return list(datas)
+    return [data for data in datas if data.weekday() == dia_semana]
+
+
+def invalidar_dia_semana(profissional_id, dia_semana):
+    """Invalida as próximas datas de um dia da semana do profissional."""
+    usuario_ids = Profissional.objects.filter(pk=profissional_id).values_list('usuario_id', flat=True)
+    invalidar_dias(_proximas_datas(dia_semana), [profissional_id], list(usuario_ids))
+
+
+def invalidar_profissional(profissional):
+    """Invalida todas as próximas datas do profissional."""
+    invalidar_dias(_proximas_datas(), [profissional.id], [profissional.usuario_id])
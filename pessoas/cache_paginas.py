@@ -0,0 +1,171 @@
+# pessoas/cache_paginas.py
+
+"""
+Cache de página inteira das páginas públicas para visitantes anônimos.
+
+As páginas institucionais e o diretório de profissionais são iguais para
+todo visitante sem login. O middleware guarda o HTML da primeira resposta e
+serve as seguintes do cache, sem passar pela view nem pelo template. Um
+acerto lê duas chaves da tabela do cache (DatabaseCache, compartilhado entre
+os workers): a versão e a página. A sessão do anônimo também pode ser lida,
+para conferir se há mensagens pendentes. Só entram requisições GET/HEAD de
+anônimos sem mensagens pendentes; respostas que definem cookies (ou usaram o
+token CSRF) não são guardadas.
+
+As chaves levam uma versão guardada no cache, como em pessoas/papeis.py:
+os signals de Profissional, Especialidade e dos comentários aprovados
+apagam a versão após o commit e todas as páginas passam a ser geradas de
+novo. As chaves também levam o hash do manifesto de estáticos, para que um
+deploy com CSS novo não sirva HTML apontando para os arquivos antigos.
+Parâmetros de campanha (utm_*, gclid...) não entram na chave: essas views
+não os leem, e cada anúncio geraria uma cópia da mesma página.
+
+Os contadores de acertos e faltas por página não gravam nada no acerto: são
+somados em memória e gravados periodicamente por pessoas/contadores.py, como
+em pessoas/cache_disponibilidade.py.
+"""
+
+import hashlib
+import uuid
+from django.contrib import messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from . import contadores
+
+# Nomes das URLs servidas do cache
+PAGINAS = (
+    'home', 'sobre', 'cirurgia', 'exames', 'odontologia', 'oftalmologia', 'tomografia',
+    'profissionais', 'profissional_detalhe',
+)
+
+# Validade das entradas; limita o tempo de vida de algo que escape da invalidação
+TIMEOUT = 10 * 60
+
+PREFIXO = 'paginas'
+CHAVE_VERSAO = f'{PREFIXO}:versao'
+
+PARAMETROS_CAMPANHA = ('gclid', 'fbclid', 'msclkid')
+
+
+def _chave_contador(tipo, pagina):
+    return f'{PREFIXO}:{tipo}:{pagina}'
+
+
+def versao():
+    """Versão atual das páginas; cria uma se o cache não tiver."""
+    atual = cache.get(CHAVE_VERSAO)
+    if atual is None:
+        cache.add(CHAVE_VERSAO, uuid.uuid4().hex, None)
+        atual = cache.get(CHAVE_VERSAO)
+    return atual
+
+
+def invalidar():
+    """Descarta todas as páginas guardadas após o commit."""
+    transaction.on_commit(lambda: cache.delete(CHAVE_VERSAO))
+
+
+def _endereco(request):
+    """URL absoluta da requisição sem os parâmetros de campanha."""
+    consulta = request.GET.copy()
+    for parametro in list(consulta):
+        if parametro.startswith('utm_') or parametro in PARAMETROS_CAMPANHA:
+            del consulta[parametro]
+    endereco = request.build_absolute_uri(request.path)
+    return f'{endereco}?{consulta.urlencode()}' if consulta else endereco
+
+
+def chave(request):
+    manifesto = getattr(staticfiles_storage, 'manifest_hash', '')
+    resumo = hashlib.md5(_endereco(request).encode('utf-8')).hexdigest()
+    return f'{PREFIXO}:{versao()}:{manifesto}:{resumo}'
+
+
+def elegivel(request):
+    """GET/HEAD de um visitante anônimo, sem mensagens a exibir."""
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(messages.get_messages(request))
+    )
+
+
+def estatisticas():
+    """
+    Acertos, faltas e taxa de acerto por página e no total, acumulados desde
+    o último zerar_estatisticas().
+    """
+    chaves = [_chave_contador(tipo, pagina) for pagina in PAGINAS for tipo in ('acertos', 'faltas')]
+    valores = contadores.valores(chaves)
+
+    def resumo(acertos, faltas):
+        total = acertos + faltas
+        return {
+            'acertos': acertos,
+            'faltas': faltas,
+            'taxa_acerto': round(acertos / total, 4) if total else None,
+        }
+
+    paginas = {
+        pagina: resumo(
+            valores.get(_chave_contador('acertos', pagina), 0),
+            valores.get(_chave_contador('faltas', pagina), 0),
+        )
+        for pagina in PAGINAS
+    }
+    return {
+        **resumo(
+            sum(pagina['acertos'] for pagina in paginas.values()),
+            sum(pagina['faltas'] for pagina in paginas.values()),
+        ),
+        'paginas': paginas,
+    }
+
+
+def zerar_estatisticas():
+    contadores.zerar([_chave_contador(tipo, pagina) for pagina in PAGINAS for tipo in ('acertos', 'faltas')])
+
+
+class CachePaginasMiddleware:
+    """
+    Serve as PAGINAS do cache para anônimos. Deve vir depois de
+    AuthenticationMiddleware e MessageMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        chave_pagina = getattr(request, '_chave_cache_pagina', None)
+        if chave_pagina and self._guardavel(request, response):
+            cache.set(chave_pagina, (response.content, response['Content-Type']), TIMEOUT)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        pagina = request.resolver_match.url_name
+        if pagina not in PAGINAS or not elegivel(request):
+            return None
+        chave_pagina = chave(request)
+        guardada = cache.get(chave_pagina)
+        if guardada is not None:
+            contadores.contar(_chave_contador('acertos', pagina))
+            conteudo, tipo = guardada
+            return HttpResponse(conteudo, content_type=tipo)
+        contadores.contar(_chave_contador('faltas', pagina))
+        request._chave_cache_pagina = chave_pagina
+        return None
+
+    @staticmethod
+    def _guardavel(request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            and not request.session.modified
+            # A view pode ter registrado mensagens para a próxima página
+            and not len(messages.get_messages(request))
+        )
@@ -0,0 +1,174 @@
+# pessoas/calendario_ics.py
+
+"""
+Calendários iCalendar (RFC 5545): o arquivo de uma consulta e o feed
+assinável (webcal) da agenda de um profissional ou de um paciente.
+
+O feed é lido por aplicativos de calendário que o consultam de tempos em
+tempos, quase sempre sem nada novo. Por isso a versão do feed (o ETag) sai
+de uma agregação barata sobre as consultas da janela: o maior atualizado_em
+e a contagem, que muda quando uma consulta é excluída. Se o cliente manda
+essa versão em If-None-Match, a resposta é um 304 sem gerar o calendário.
+Não há Last-Modified: uma exclusão não muda a maior data e o cliente que
+revalidasse só por data não a veria. Quando gera, é uma única consulta com
+os JOINs de paciente e médico.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+from django.db.models import Count, Max, Q
+from django.urls import reverse
+from django.utils import timezone
+from .models import AssinaturaCalendario, Consulta
+
+# Janela do feed em relação a hoje
+DIAS_ANTES = 30
+DIAS_DEPOIS = 365
+
+DURACAO = timedelta(minutes=30)
+
+PRODID = '-//SIMED//Consulta Médica//PT'
+
+# Status da consulta -> STATUS do evento
+STATUS_EVENTO = {
+    'agendada': 'TENTATIVE',
+    'confirmada': 'CONFIRMED',
+    'concluida': 'CONFIRMED',
+    'cancelada': 'CANCELLED',
+}
+
+ALARMES = (
+    ('-PT1H', 'Lembrete: Consulta em 1 hora'),
+    ('-P1D', 'Lembrete: Consulta amanhã'),
+)
+
+
+def _texto(valor):
+    """Escapa um valor TEXT (vírgula, ponto e vírgula, barra e quebra de linha)."""
+    return (
+        str(valor).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def _dobrar(linha):
+    """Quebra a linha em partes de até 75 octetos, com continuação iniciada por espaço."""
+    partes = []
+    atual, tamanho = '', 0
+    for caractere in linha:
+        octetos = len(caractere.encode('utf-8'))
+        if tamanho + octetos > 75:
+            partes.append(atual)
+            atual, tamanho = ' ', 1
+        atual += caractere
+        tamanho += octetos
+    partes.append(atual)
+    return '\r\n'.join(partes)
+
+
+def _utc(data_hora):
+    return data_hora.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _nome(usuario):
+    return f'{usuario.username} {usuario.last_name}'.strip()
+
+
+def evento(consulta, visao='paciente', alarmes=False):
+    """
+    Linhas do VEVENT da consulta. Na visão do paciente o título é o médico;
+    na do profissional, o paciente.
+    """
+    if visao == 'profissional':
+        titulo = f'Consulta - {_nome(consulta.paciente)}'
+    else:
+        titulo = f'Consulta SIMED - Dr(a). {_nome(consulta.medico)}'
+    linhas = [
+        'BEGIN:VEVENT',
+        f'UID:consulta-{consulta.id}@simed.com.br',
+        f'DTSTAMP:{_utc(timezone.now())}',
+        f'LAST-MODIFIED:{_utc(consulta.atualizado_em)}',
+        # Cresce a cada gravação; o calendário substitui a versão anterior do evento
+        f'SEQUENCE:{int(consulta.atualizado_em.timestamp())}',
+        f'DTSTART:{_utc(consulta.data_hora)}',
+        f'DTEND:{_utc(consulta.data_hora + DURACAO)}',
+        f'SUMMARY:{_texto(titulo)}',
+        'DESCRIPTION:' + _texto('Consulta médica na SIMED - Serviço Integrado de Medicina'),
+        'LOCATION:' + _texto('SIMED - Clínica Médica'),
+        f'STATUS:{STATUS_EVENTO.get(consulta.status, "CONFIRMED")}',
+    ]
+    if alarmes and consulta.status != 'cancelada':
+        for gatilho, descricao in ALARMES:
+            linhas += ['BEGIN:VALARM', f'TRIGGER:{gatilho}', 'ACTION:DISPLAY', f'DESCRIPTION:{_texto(descricao)}', 'END:VALARM']
+    linhas.append('END:VEVENT')
+    return linhas
+
+
+def calendario(eventos, nome=None):
+    """Texto do VCALENDAR com os eventos (listas de linhas de evento())."""
+    linhas = ['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN']
+    if nome:
+        linhas.append(f'X-WR-CALNAME:{_texto(nome)}')
+    for linhas_evento in eventos:
+        linhas += linhas_evento
+    linhas.append('END:VCALENDAR')
+    return '\r\n'.join(_dobrar(linha) for linha in linhas) + '\r\n'
+
+
+# --- Feed assinável ---
+
+def dono(usuario):
+    """
+    Campos da assinatura do usuário: a agenda do profissional, para médicos
+    com cadastro de profissional, ou as próprias consultas, para os demais.
+    """
+    profissional = getattr(usuario, 'profissional', None)
+    if profissional is not None:
+        return {'profissional': profissional}
+    return {'paciente': usuario}
+
+
+def assinatura(usuario):
+    """Assinatura existente do usuário, ou None."""
+    return AssinaturaCalendario.objects.filter(**dono(usuario)).first()
+
+
+def url(request, assinatura):
+    """URL webcal:// do feed, que abre a assinatura no aplicativo de calendário."""
+    endereco = request.build_absolute_uri(reverse('calendario_feed', args=[assinatura.token]))
+    return 'webcal://' + endereco.split('://', 1)[1]
+
+
+def consultas(assinatura):
+    """Consultas da janela do feed, incluindo as canceladas (o cliente as remove)."""
+    hoje = timezone.localdate()
+    if assinatura.profissional_id:
+        filtro = Q(profissional_id=assinatura.profissional_id)
+        if assinatura.profissional.usuario_id:
+            filtro |= Q(medico_id=assinatura.profissional.usuario_id)
+    else:
+        filtro = Q(paciente_id=assinatura.paciente_id)
+    return Consulta.objects.filter(filtro).entre(
+        hoje - timedelta(days=DIAS_ANTES), hoje + timedelta(days=DIAS_DEPOIS)
+    )
+
+
+def versao(assinatura):
+    """
+    ETag do feed. O início da janela entra nele porque, ao virar o dia,
+    consultas antigas saem do feed sem que nada seja gravado.
+    """
+    resumo = consultas(assinatura).aggregate(ultima=Max('atualizado_em'), total=Count('id'))
+    ultima = resumo['ultima']
+    marca = int(ultima.timestamp() * 1_000_000) if ultima else 0
+    inicio = timezone.localdate() - timedelta(days=DIAS_ANTES)
+    return f'"{resumo["total"]}-{marca}-{inicio:%Y%m%d}"'
+
+
+def feed(assinatura):
+    """Texto do calendário da assinatura."""
+    visao = 'profissional' if assinatura.profissional_id else 'paciente'
+    if visao == 'profissional':
+        nome = f'SIMED - Agenda de {assinatura.profissional.nome}'
+    else:
+        nome = 'SIMED - Minhas consultas'
+    linhas = consultas(assinatura).select_related('paciente', 'medico').order_by('data_hora', 'id')
+    return calendario((evento(consulta, visao) for consulta in linhas), nome)
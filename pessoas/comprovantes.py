@@ -0,0 +1,162 @@
+# pessoas/comprovantes.py
+
+"""
+Comprovantes de consulta em PDF, desenhados uma vez e guardados em disco.
+
+O arquivo é identificado pelo id da consulta e pelo atualizado_em: enquanto
+a consulta não muda, o mesmo PDF é servido (FileResponse, que o servidor
+envia direto do disco) e o navegador revalida com ETag/Last-Modified,
+recebendo 304 sem corpo. Quando a consulta é salva de novo, o nome muda, o
+PDF é redesenhado e a versão antiga é apagada.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.colors import HexColor
+from reportlab.pdfgen import canvas
+
+# Mudar quando o desenho do comprovante mudar, para descartar os PDFs antigos
+VERSAO_LAYOUT = 1
+
+
+def diretorio():
+    """Pasta dos PDFs (COMPROVANTES_ROOT)."""
+    return Path(settings.COMPROVANTES_ROOT)
+
+
+def _versao(consulta):
+    return f'{int(consulta.atualizado_em.timestamp() * 1_000_000)}-v{VERSAO_LAYOUT}'
+
+
+def caminho(consulta, pasta=None):
+    return Path(pasta or diretorio()) / f'{consulta.id}-{_versao(consulta)}.pdf'
+
+
+def etag(consulta):
+    return f'"{consulta.id}-{_versao(consulta)}"'
+
+
+def nome_arquivo(consulta):
+    return f"consulta_{consulta.id:05d}_{consulta.data_hora.strftime('%Y%m%d')}.pdf"
+
+
+def desenhar(consulta, arquivo):
+    """Desenha o comprovante da consulta em `arquivo` (caminho ou arquivo binário)."""
+    p = canvas.Canvas(arquivo, pagesize=A4)
+    width, height = A4
+    
+    primary_color = HexColor('#1B325F')
+    accent_color = HexColor('#4C98D0')
+    
+    p.setFillColor(primary_color)
+    p.rect(0, height - 3*cm, width, 3*cm, fill=True, stroke=False)
+    
+    p.setFillColor(HexColor('#FFFFFF'))
+    p.setFont("Helvetica-Bold", 24)
+    p.drawString(2*cm, height - 2*cm, "SIMED")
+    p.setFont("Helvetica", 12)
+    p.drawString(2*cm, height - 2.6*cm, "Servico Integrado de Medicina")
+    
+    p.setFillColor(primary_color)
+    p.setFont("Helvetica-Bold", 18)
+    p.drawString(2*cm, height - 5*cm, "Comprovante de Consulta")
+    
+    p.setFillColor(accent_color)
+    p.rect(2*cm, height - 5.3*cm, 6*cm, 0.1*cm, fill=True, stroke=False)
+    
+    y_pos = height - 7*cm
+    p.setFillColor(HexColor('#333333'))
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(2*cm, y_pos, "Dados do Paciente")
+    y_pos -= 0.7*cm
+    
+    p.setFont("Helvetica", 11)
+    p.drawString(2*cm, y_pos, f"Nome: {consulta.paciente.username} {consulta.paciente.last_name}")
+    y_pos -= 0.5*cm
+    p.drawString(2*cm, y_pos, f"Email: {consulta.paciente.email}")
+    y_pos -= 1*cm
+    
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(2*cm, y_pos, "Dados da Consulta")
+    y_pos -= 0.7*cm
+    
+    p.setFont("Helvetica", 11)
+    medico_nome = f"{consulta.medico.username} {consulta.medico.last_name}"
+    if consulta.profissional:
+        medico_nome = consulta.profissional.nome
+        if consulta.profissional.especialidade:
+            medico_nome += f" - {consulta.profissional.especialidade.nome}"
+    
+    p.drawString(2*cm, y_pos, f"Medico(a): Dr(a). {medico_nome}")
+    y_pos -= 0.5*cm
+    p.drawString(2*cm, y_pos, f"Data: {consulta.data_hora.strftime('%d/%m/%Y')}")
+    y_pos -= 0.5*cm
+    p.drawString(2*cm, y_pos, f"Horario: {consulta.data_hora.strftime('%H:%M')}")
+    y_pos -= 0.5*cm
+    p.drawString(2*cm, y_pos, f"Status: {consulta.get_status_display()}")
+    y_pos -= 0.5*cm
+    p.drawString(2*cm, y_pos, f"Codigo: #{consulta.id:05d}")
+    y_pos -= 1.5*cm
+    
+    p.setFillColor(accent_color)
+    p.rect(2*cm, y_pos, width - 4*cm, 0.05*cm, fill=True, stroke=False)
+    y_pos -= 1*cm
+    
+    p.setFillColor(HexColor('#666666'))
+    p.setFont("Helvetica", 9)
+    p.drawString(2*cm, y_pos, "Este documento e um comprovante de agendamento.")
+    y_pos -= 0.4*cm
+    p.drawString(2*cm, y_pos, "Apresente-o no dia da consulta.")
+    y_pos -= 0.8*cm
+    p.drawString(2*cm, y_pos, f"Documento gerado em: {timezone.now().strftime('%d/%m/%Y as %H:%M')}")
+    
+    p.setFillColor(primary_color)
+    p.rect(0, 0, width, 1.5*cm, fill=True, stroke=False)
+    p.setFillColor(HexColor('#FFFFFF'))
+    p.setFont("Helvetica", 8)
+    p.drawCentredString(width/2, 0.6*cm, "SIMED - Servico Integrado de Medicina | www.simed.com.br")
+    
+    p.showPage()
+    p.save()
+
+
+def obter(consulta, pasta=None):
+    """
+    Caminho do PDF da versão atual da consulta, desenhando-o se ainda não
+    existir. A gravação vai para um temporário renomeado no fim, então duas
+    requisições simultâneas nunca leem um arquivo pela metade. `pasta`
+    substitui COMPROVANTES_ROOT (processos que não herdam as configurações
+    alteradas em tempo de execução, como os do lote_pdf).
+    """
+    destino = caminho(consulta, pasta)
+    if destino.exists():
+        return destino
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            desenhar(consulta, arquivo)
+        os.replace(temporario, destino)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+    _apagar(consulta.id, manter=destino)
+    return destino
+
+
+def _apagar(consulta_id, manter=None):
+    pasta = manter.parent if manter else diretorio()
+    for antigo in pasta.glob(f'{consulta_id}-*.pdf'):
+        if antigo != manter:
+            antigo.unlink(missing_ok=True)
+
+
+def remover(consulta_id):
+    """Apaga os PDFs da consulta após o commit (consulta excluída)."""
+    transaction.on_commit(lambda: _apagar(consulta_id))
@@ -0,0 +1,77 @@
+# pessoas/contadores.py
+
+"""
+Contadores de acertos e faltas dos caches (pessoas/cache_disponibilidade.py
+e pessoas/cache_paginas.py).
+
+Contar um acerto não pode custar mais que o próprio acerto, então contar()
+só soma em memória. Cada processo grava o que acumulou na tabela
+ContadorCache no máximo a cada INTERVALO segundos, com UPDATE ... valor + n
+(atômico entre os workers, ao contrário de cache.incr, que lê e regrava).
+valores() grava antes o que o processo atual tem pendente; o que os outros
+workers contaram aparece com até INTERVALO segundos de atraso.
+"""
+
+import threading
+import time
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Case, F, Value, When
+from .models import ContadorCache
+
+# Segundos entre as gravações de um processo
+INTERVALO = 60
+
+_pendentes = Counter()
+_trava = threading.Lock()
+_ultima_gravacao = time.monotonic()
+
+
+def contar(nome):
+    """Soma 1 ao contador; grava os pendentes se o INTERVALO já passou."""
+    with _trava:
+        _pendentes[nome] += 1
+        vencido = time.monotonic() - _ultima_gravacao >= INTERVALO
+    if vencido:
+        gravar()
+
+
+def gravar():
+    """Soma os contadores pendentes deste processo aos da tabela."""
+    global _ultima_gravacao
+    with _trava:
+        pendentes = dict(_pendentes)
+        _pendentes.clear()
+        _ultima_gravacao = time.monotonic()
+    if not pendentes:
+        return
+    # Um UPDATE para todos os contadores; só os que ainda não têm linha seguem adiante
+    somados = ContadorCache.objects.filter(nome__in=pendentes).update(valor=F('valor') + Case(
+        *(When(nome=nome, then=Value(valor)) for nome, valor in pendentes.items()),
+        output_field=BigIntegerField(),
+    ))
+    if somados == len(pendentes):
+        return
+    existentes = set(ContadorCache.objects.filter(nome__in=pendentes).values_list('nome', flat=True))
+    novos = [ContadorCache(nome=nome, valor=pendentes[nome]) for nome in pendentes.keys() - existentes]
+    try:
+        with transaction.atomic():
+            ContadorCache.objects.bulk_create(novos)
+    except IntegrityError:
+        # Outro worker criou alguma das linhas entre o UPDATE e o INSERT
+        for novo in novos:
+            ContadorCache.objects.get_or_create(nome=novo.nome)
+            ContadorCache.objects.filter(nome=novo.nome).update(valor=F('valor') + novo.valor)
+
+
+def valores(nomes):
+    """{nome: valor} dos contadores informados, com os pendentes deste processo."""
+    gravar()
+    return dict(ContadorCache.objects.filter(nome__in=nomes).values_list('nome', 'valor'))
+
+
+def zerar(nomes):
+    with _trava:
+        for nome in nomes:
+            _pendentes.pop(nome, None)
+    ContadorCache.objects.filter(nome__in=nomes).delete()
@@ -18,6 +18,13 @@ def get_user_role(user):
     except:
         return 'paciente'
 
+def get_request_role(request):
+    # Papel resolvido pelo PapelMiddleware (sessão); sem o middleware, calcula na hora
+    papel = getattr(request, 'papel', None)
+    if papel is None:
+        return get_user_role(request.user)
+    return str(papel)
+
 def get_role_level(role):
     return ROLE_HIERARCHY.get(role, 0)
 
@@ -29,7 +36,7 @@ def role_required(*allowed_roles, redirect_url='home'):
                 messages.warning(request, 'Faça login para acessar esta página.')
                 return redirect('login')
             
-            user_role = get_user_role(request.user)
+            user_role = get_request_role(request)
             
             if user_role in allowed_roles or user_role == 'admin':
                 return view_func(request, *args, **kwargs)
@@ -47,7 +54,7 @@ def min_role_required(min_role, redirect_url='home'):
                 messages.warning(request, 'Faça login para acessar esta página.')
                 return redirect('login')
             
-            user_role = get_user_role(request.user)
+            user_role = get_request_role(request)
             user_level = get_role_level(user_role)
             required_level = get_role_level(min_role)
             
@@ -66,15 +73,9 @@ def admin_required(view_func):
             messages.warning(request, 'Faça login para acessar esta página.')
             return redirect('login')
         
-        if request.user.is_superuser or request.user.is_staff:
+        if get_request_role(request) == 'admin':
             return view_func(request, *args, **kwargs)
         
-        try:
-            if request.user.perfil.tipo_usuario == 'admin':
-                return view_func(request, *args, **kwargs)
-        except:
-            pass
-        
         messages.error(request, 'Acesso restrito a administradores.')
         return redirect('home')
     return wrapper
@@ -86,7 +87,7 @@ def medico_required(view_func):
             messages.warning(request, 'Faça login para acessar esta página.')
             return redirect('login')
         
-        user_role = get_user_role(request.user)
+        user_role = get_request_role(request)
         
         if user_role in ['admin', 'medico']:
             return view_func(request, *args, **kwargs)
@@ -102,7 +103,7 @@ def atendente_required(view_func):
             messages.warning(request, 'Faça login para acessar esta página.')
             return redirect('login')
         
-        user_role = get_user_role(request.user)
+        user_role = get_request_role(request)
         
         if user_role in ['admin', 'medico', 'atendente']:
             return view_func(request, *args, **kwargs)
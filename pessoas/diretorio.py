@@ -0,0 +1,93 @@
+# pessoas/diretorio.py
+
+"""
+Diretório de médicos e profissionais, compartilhado pelo painel do paciente,
+pela página de profissionais e pelos formulários de agendamento.
+
+Cada lista é montada com uma única consulta (com os JOINs necessários) e
+guardada no cache; os signals de Profissional, Especialidade, Perfil e User
+apagam as chaves após o commit. Assim, abrir o painel do paciente deixa de
+custar duas queries por médico.
+"""
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from .models import Especialidade, Profissional
+from . import imagens
+
+# Validade das entradas; limita o tempo de vida de algo que escape da invalidação
+TIMEOUT = 60 * 60
+
+# Largura da foto usada nos cartões de médico (a variante mais próxima)
+LARGURA_FOTO_CARTAO = 160
+
+CHAVE_MEDICOS = 'diretorio:medicos'
+CHAVE_PROFISSIONAIS = 'diretorio:profissionais'
+CHAVE_ESPECIALIDADES = 'diretorio:especialidades'
+CHAVES = [CHAVE_MEDICOS, CHAVE_PROFISSIONAIS, CHAVE_ESPECIALIDADES]
+
+ESPECIALIDADE_PADRAO = 'Clínica Geral'
+
+
+def _do_cache(chave, calcular):
+    valor = cache.get(chave)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave, valor, TIMEOUT)
+    return valor
+
+
+def _calcular_medicos():
+    armazenamento = Profissional._meta.get_field('foto').storage
+    linhas = User.objects.filter(perfil__tipo_usuario='medico').order_by('id').values_list(
+        'id', 'username', 'last_name', 'profissional__foto', 'profissional__foto_variantes',
+        'profissional__especialidade__nome'
+    )
+
+    def url_foto(foto, variantes):
+        if not foto:
+            return ''
+        item = imagens.variante(variantes, LARGURA_FOTO_CARTAO) if (variantes or {}).get('nome') == foto else None
+        return armazenamento.url(item['webp'] if item else foto)
+
+    return [
+        {
+            'id': medico_id,
+            'usuario': username,
+            'nome': f"Dr(a). {username} {last_name}",
+            'foto': url_foto(foto, variantes),
+            'especialidade': especialidade or ESPECIALIDADE_PADRAO,
+            'inicial': username[:1].upper() if username else 'M',
+        }
+        for medico_id, username, last_name, foto, variantes, especialidade in linhas
+    ]
+
+
+def medicos():
+    """
+    Cartões dos usuários médicos, na ordem de cadastro: id, usuario, nome,
+    foto (URL), especialidade e inicial.
+    """
+    return _do_cache(CHAVE_MEDICOS, _calcular_medicos)
+
+
+def opcoes_medicos():
+    """Opções (id, username) do campo de médico dos formulários de agendamento."""
+    return [('', '---------')] + [(medico['id'], medico['usuario']) for medico in medicos()]
+
+
+def profissionais():
+    """Profissionais ativos, com a especialidade já carregada."""
+    return _do_cache(CHAVE_PROFISSIONAIS, lambda: list(
+        Profissional.objects.filter(ativo=True).select_related('especialidade')
+    ))
+
+
+def especialidades():
+    return _do_cache(CHAVE_ESPECIALIDADES, lambda: list(Especialidade.objects.all()))
+
+
+def invalidar():
+    """Apaga o diretório após o commit da transação atual."""
+    transaction.on_commit(lambda: cache.delete_many(CHAVES))
@@ -0,0 +1,275 @@
+# pessoas/disponibilidade.py
+
+"""
+Grade de horários de atendimento e índice materializado de disponibilidade
+(SlotAgenda).
+
+Este é o único lugar que decide quais horários um médico oferece: a grade
+de cada dia da semana vem de HorarioTrabalho (calculada uma vez como máscara
+de bits em AgendaDia e reaproveitada para todas as datas daquele dia) e,
+para médicos sem horário cadastrado, da GRADE_PADRAO. Views e formulários
+usam as funções daqui para listar, oferecer e validar horários.
+
+Os horários de cada profissional são gerados uma única vez por dia e depois
+mantidos pelos signals de Consulta e HorarioTrabalho, de modo que consultar
+a agenda de um dia vira uma leitura indexada em vez de um loop com uma nova
+query em Consulta.
+"""
+
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+from django.db.models import Q
+from django.utils import timezone
+from .agenda_bits import AgendaDia
+from .models import Consulta, Profissional, SlotAgenda, STATUS_ATIVOS
+
+# Status de consulta que ocupam o horário do profissional
+STATUS_OCUPADOS = STATUS_ATIVOS
+
+# Quantos dias à frente o comando gerar_slots_agenda deixa pré-calculados
+HORIZONTE_DIAS = 60
+
+
+# Grade de quem ainda não tem HorarioTrabalho: 08:00 às 18:00, de 15 em 15 minutos
+GRADE_PADRAO = AgendaDia.dos_horarios([
+    SimpleNamespace(hora_inicio=time(8, 0), hora_fim=time(18, 0), intervalo_minutos=15)
+])
+
+
+def grades_semanais(horarios):
+    """
+    {dia_semana: AgendaDia} a partir de HorarioTrabalho. Blocos do mesmo dia
+    são unidos em uma única grade, calculada uma vez por dia da semana.
+    """
+    por_dia = {}
+    for horario in horarios:
+        por_dia.setdefault(horario.dia_semana, []).append(horario)
+    grades = {}
+    for dia_semana, blocos in por_dia.items():
+        agenda = AgendaDia.dos_horarios(blocos)
+        if agenda:
+            grades[dia_semana] = agenda
+    return grades
+
+
+def _horarios_ativos(profissional):
+    # Usa os horários pré-carregados (Prefetch com to_attr) quando disponíveis
+    horarios = getattr(profissional, 'horarios_ativos', None)
+    if horarios is None:
+        horarios = profissional.horarios.filter(ativo=True)
+    return horarios
+
+
+def materializar_dias(profissional, datas):
+    """
+    Gera os slots das datas informadas a partir dos horários de trabalho
+    ativos do profissional, já marcando os ocupados por consultas existentes.
+    Retorna None se o profissional não tem nenhum horário configurado.
+    """
+    grades = grades_semanais(_horarios_ativos(profissional))
+    if not grades:
+        return None
+    horas_por_dia = {dia_semana: agenda.horarios() for dia_semana, agenda in grades.items()}
+
+    datas = sorted(set(datas))
+    slots = []
+    for data in datas:
+        for hora in horas_por_dia.get(data.weekday(), ()):
+            slots.append(SlotAgenda(
+                profissional=profissional,
+                medico_id=profissional.usuario_id,
+                data=data,
+                hora=hora,
+                data_hora=timezone.make_aware(datetime.combine(data, hora)),
+            ))
+    if not slots:
+        return []
+
+    if profissional.usuario_id:
+        ocupadas = dict(Consulta.objects.ativas().entre(datas[0], datas[-1]).filter(
+            medico_id=profissional.usuario_id
+        ).values_list('data_hora', 'id'))
+        for slot in slots:
+            slot.consulta_id = ocupadas.get(slot.data_hora)
+
+    # ignore_conflicts: duas requisições podem materializar o mesmo dia ao mesmo tempo
+    SlotAgenda.objects.bulk_create(slots, ignore_conflicts=True)
+    return slots
+
+
+def materializar_periodo(profissional, inicio, fim):
+    """Materializa os dias de [inicio, fim] que ainda não estão no índice."""
+    existentes = set(SlotAgenda.objects.filter(
+        profissional=profissional,
+        data__gte=inicio,
+        data__lte=fim
+    ).values_list('data', flat=True).distinct())
+    faltantes = []
+    data = inicio
+    while data <= fim:
+        if data not in existentes:
+            faltantes.append(data)
+        data += timedelta(days=1)
+    if not faltantes:
+        return []
+    return materializar_dias(profissional, faltantes) or []
+
+
+def mapa_periodo(profissionais, inicio, fim, reservados=()):
+    """
+    Disponibilidade de vários profissionais em um intervalo de datas, com um
+    número fixo de queries. Os profissionais devem vir com os horários ativos
+    pré-carregados em `horarios_ativos`; `reservados` é um conjunto
+    {(medico_id, data, hora)} de horários a omitir. Retorna
+    {profissional_id: {'AAAA-MM-DD': ['HH:MM', ...]}}, apenas com os dias
+    em que o profissional atende.
+    """
+    ids = [p.id for p in profissionais]
+    existentes = set(SlotAgenda.objects.filter(
+        profissional_id__in=ids,
+        data__gte=inicio,
+        data__lte=fim
+    ).values_list('profissional_id', 'data').distinct())
+
+    dias = [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+    for profissional in profissionais:
+        faltantes = [dia for dia in dias if (profissional.id, dia) not in existentes]
+        if faltantes:
+            materializar_dias(profissional, faltantes)
+
+    mapa = {profissional_id: {} for profissional_id in ids}
+    slots = SlotAgenda.objects.filter(
+        profissional_id__in=ids,
+        data__gte=inicio,
+        data__lte=fim
+    ).order_by('profissional_id', 'data', 'hora').values_list(
+        'profissional_id', 'medico_id', 'data', 'hora', 'consulta_id'
+    )
+    for profissional_id, medico_id, data, hora, consulta_id in slots:
+        livres = mapa[profissional_id].setdefault(data.isoformat(), [])
+        if consulta_id is None and (medico_id, data, hora) not in reservados:
+            livres.append(hora.strftime('%H:%M'))
+    return mapa
+
+
+def slots_do_dia(profissional, data):
+    """
+    Retorna a lista [(hora, ocupado)] do profissional na data, em ordem.
+    O dia é materializado na primeira leitura; retorna None se o
+    profissional não tem horários de trabalho configurados.
+    """
+    slots = list(SlotAgenda.objects.filter(
+        profissional=profissional,
+        data=data
+    ).order_by('hora').values_list('hora', 'consulta_id'))
+    if slots:
+        return [(hora, consulta_id is not None) for hora, consulta_id in slots]
+
+    gerados = materializar_dias(profissional, [data])
+    if gerados is None:
+        return None
+    return sorted((slot.hora, slot.consulta_id is not None) for slot in gerados)
+
+
+def horarios_livres(profissional, data):
+    """Horários livres (time) do profissional na data, ou None sem agenda configurada."""
+    slots = slots_do_dia(profissional, data)
+    if slots is None:
+        return None
+    return [hora for hora, ocupado in slots if not ocupado]
+
+
+def profissional_do_medico(medico_id):
+    """Profissional vinculado ao usuário médico, se existir."""
+    return Profissional.objects.filter(usuario_id=medico_id).first()
+
+
+def grade_do_medico(medico_id, data):
+    """
+    Grade (AgendaDia) do médico na data, com todos os horários livres; None
+    se ele não atende naquele dia. Médicos sem profissional vinculado ou sem
+    horários de trabalho usam a GRADE_PADRAO.
+    """
+    profissional = profissional_do_medico(medico_id)
+    if profissional:
+        grades = grades_semanais(_horarios_ativos(profissional))
+        if grades:
+            return grades.get(data.weekday())
+    return GRADE_PADRAO
+
+
+def horarios_do_medico(medico_id, data):
+    """Todos os horários (time) que o médico oferece na data, ocupados ou não."""
+    agenda = grade_do_medico(medico_id, data)
+    return agenda.horarios() if agenda else []
+
+
+def horarios_livres_do_medico(medico_id, data):
+    """
+    Horários livres (time) do médico na data, sem considerar reservas
+    temporárias. Com horário de trabalho, lê o índice de slots; sem, aplica
+    as consultas ativas do dia sobre a GRADE_PADRAO.
+    """
+    profissional = profissional_do_medico(medico_id)
+    if profissional:
+        livres = horarios_livres(profissional, data)
+        if livres is not None:
+            return livres
+
+    agenda = GRADE_PADRAO.copia()
+    fuso = timezone.get_current_timezone()
+    agenda.ocupar_todos(
+        data_hora.astimezone(fuso).time()
+        for data_hora in Consulta.objects.ativas().do_dia(data).filter(
+            medico_id=medico_id
+        ).values_list('data_hora', flat=True)
+    )
+    return agenda.horarios_livres()
+
+
+def sincronizar_consulta(consulta):
+    """
+    Reflete no índice a criação, o cancelamento ou a remarcação de uma consulta.
+    """
+    ativa = consulta.status in STATUS_OCUPADOS
+
+    # Slots que apontam para a consulta mas não valem mais (cancelada ou remarcada)
+    antigos = SlotAgenda.objects.filter(consulta=consulta)
+    if ativa:
+        antigos = antigos.exclude(data_hora=consulta.data_hora)
+    for slot in antigos:
+        outra = Consulta.objects.ativas().filter(
+            medico_id=consulta.medico_id,
+            data_hora=slot.data_hora
+        ).exclude(pk=consulta.pk).values_list('id', flat=True).first()
+        SlotAgenda.objects.filter(pk=slot.pk).update(consulta_id=outra)
+
+    if ativa:
+        filtro = Q(medico_id=consulta.medico_id)
+        if consulta.profissional_id:
+            filtro |= Q(profissional_id=consulta.profissional_id)
+        SlotAgenda.objects.filter(
+            filtro,
+            data_hora=consulta.data_hora,
+            consulta__isnull=True
+        ).update(consulta=consulta)
+
+
+def descartar_dia_semana(profissional_id, dia_semana):
+    """
+    Remove os slots futuros de um dia da semana após mudança no horário de
+    trabalho; eles são gerados novamente na próxima leitura.
+    """
+    SlotAgenda.objects.filter(
+        profissional_id=profissional_id,
+        data__gte=timezone.localdate(),
+        data__iso_week_day=dia_semana + 1
+    ).delete()
+
+
+def sincronizar_profissional(profissional):
+    """Descarta slots futuros gerados com outro usuário médico vinculado."""
+    SlotAgenda.objects.filter(
+        profissional=profissional,
+        data__gte=timezone.localdate()
+    ).exclude(medico=profissional.usuario).delete()
@@ -0,0 +1,195 @@
+# pessoas/estaticos.py
+
+"""
+Storage dos arquivos estáticos: o CompressedManifestStaticFilesStorage do
+WhiteNoise com uma otimização antes do hash.
+
+No collectstatic, depois da cópia para STATIC_ROOT e antes de calcular os
+nomes com hash, cada arquivo copiado é otimizado no lugar:
+
+- PNG é recomprimido sem perda (Pillow, optimize); JPEG fica como está,
+  porque regravá-lo perderia qualidade;
+- PNG e JPEG ganham uma alternativa WebP (<nome>.<ext>.webp) quando ela é
+  menor que o original;
+- CSS e JS são minificados (rcssmin/rjsmin).
+
+Em seguida (com as WebP já gravadas), os blocos {% estilo %} dos templates
+viram arquivos em css/paginas/ (pessoas/estilos.py) e passam pela mesma
+minificação.
+
+Os arquivos são otimizados em um pool de threads (o Pillow libera o GIL
+ao codificar).
+
+A versão otimizada (e a WebP) é o que recebe o hash, entra no manifesto e
+é comprimida em gzip/brotli pelo WhiteNoise. O relatório com os bytes
+economizados por arquivo fica em STATIC_ROOT/RELATORIO.
+
+Sem manifesto (desenvolvimento e testes sem collectstatic), ou para um
+arquivo que não está nele, o nome original é usado em vez de falhar.
+"""
+
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.base import ContentFile
+from PIL import Image
+from rcssmin import cssmin
+from rjsmin import jsmin
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+from . import estilos
+
+logger = logging.getLogger(__name__)
+
+RELATORIO = 'otimizacao-estaticos.json'
+
+QUALIDADE_WEBP = 85
+# method=6 comprime ~2% a mais e leva 15x mais tempo nas imagens grandes
+METODO_WEBP = 4
+
+IMAGENS = ('.png', '.jpg', '.jpeg')
+
+
+def _extensao(nome):
+    return '.' + nome.rsplit('.', 1)[-1].lower() if '.' in nome else ''
+
+
+def nome_webp(nome):
+    """Nome da alternativa WebP de uma imagem estática."""
+    return f'{nome}.webp'
+
+
+def _png_sem_perda(conteudo):
+    imagem = Image.open(io.BytesIO(conteudo))
+    saida = io.BytesIO()
+    imagem.save(saida, 'PNG', optimize=True)
+    return saida.getvalue()
+
+
+def _webp(conteudo):
+    imagem = Image.open(io.BytesIO(conteudo))
+    transparente = imagem.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagem.info
+    imagem = imagem.convert('RGBA' if transparente else 'RGB')
+    saida = io.BytesIO()
+    imagem.save(saida, 'WEBP', quality=QUALIDADE_WEBP, method=METODO_WEBP)
+    return saida.getvalue()
+
+
+def otimizar(nome, conteudo):
+    """
+    (conteúdo otimizado, WebP ou None) de um arquivo estático. Cada versão
+    só é usada se ficar menor que o original.
+    """
+    extensao = _extensao(nome)
+    otimizado, webp = conteudo, None
+    if extensao == '.css':
+        otimizado = cssmin(conteudo.decode('utf-8')).encode('utf-8')
+    elif extensao == '.js':
+        otimizado = jsmin(conteudo.decode('utf-8')).encode('utf-8')
+    elif extensao in IMAGENS:
+        if extensao == '.png':
+            otimizado = _png_sem_perda(conteudo)
+        webp = _webp(conteudo)
+        if len(webp) >= min(len(otimizado), len(conteudo)):
+            webp = None
+    if len(otimizado) >= len(conteudo):
+        otimizado = conteudo
+    return otimizado, webp
+
+
+class EstaticosOtimizadosStorage(CompressedManifestStaticFilesStorage):
+    """Backend 'staticfiles' de STORAGES."""
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Arquivo ausente do collectstatic (um template aponta para uma
+            # imagem que não está no repositório, ou o WhiteNoise testando
+            # nomes sem hash): o link quebrado não derruba a página
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = dict(paths)
+            relatorio = self._otimizar(paths, [
+                nome for nome in sorted(paths)
+                if _extensao(nome) in IMAGENS or _extensao(nome) in ('.css', '.js')
+            ])
+            relatorio.update(self._otimizar(paths, self._gerar_estilos(paths)))
+            self._gravar_relatorio(relatorio)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def _otimizar(self, paths, nomes):
+        """
+        Otimiza as cópias em STATIC_ROOT e aponta o pós-processamento do
+        manifesto para elas (por padrão ele relê os arquivos de origem).
+        A leitura é sempre da origem: o collectstatic lista também os
+        arquivos que não copiou de novo, e a cópia deles já está otimizada.
+        Retorna as entradas do relatório.
+        """
+        with ThreadPoolExecutor() as executor:
+            resultados = executor.map(lambda nome: self._otimizar_arquivo(nome, *paths[nome]), nomes)
+            relatorio = {nome: entrada for nome, entrada in zip(nomes, resultados) if entrada}
+        for nome, entrada in relatorio.items():
+            if entrada['otimizado'] < entrada['original']:
+                paths[nome] = (self, nome)
+            if 'webp' in entrada:
+                paths[nome_webp(nome)] = (self, nome_webp(nome))
+        return relatorio
+
+    def _gerar_estilos(self, paths):
+        """
+        Grava os CSS dos blocos {% estilo %} dos templates (pessoas/estilos.py)
+        e os inclui no pós-processamento. Durante a renderização o manifesto
+        é provisório, sem hash: {% static %} dá o nome original e o hash entra
+        depois, na reescrita das url() do CSS.
+        """
+        self.hashed_files = {nome: nome for nome in paths}
+        try:
+            arquivos = estilos.gerar()
+        finally:
+            self.hashed_files = {}
+        for nome, css in arquivos.items():
+            self._substituir(nome, css.encode('utf-8'))
+            paths[nome] = (self, nome)
+        return sorted(arquivos)
+
+    def _gravar_relatorio(self, relatorio):
+        total_original = sum(entrada['original'] for entrada in relatorio.values())
+        total_economizado = sum(entrada['economizado'] for entrada in relatorio.values())
+        with open(self.path(RELATORIO), 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                'arquivos': relatorio,
+                'total_original': total_original,
+                'total_economizado': total_economizado,
+            }, arquivo, indent=2, sort_keys=True)
+        logger.info(
+            'Estáticos otimizados: %d arquivos, %d de %d bytes economizados (relatório em %s)',
+            len(relatorio), total_economizado, total_original, RELATORIO,
+        )
+
+    def _otimizar_arquivo(self, nome, origem, caminho):
+        """Grava em STATIC_ROOT as versões otimizadas de um arquivo; retorna a entrada do relatório."""
+        with origem.open(caminho) as arquivo:
+            conteudo = arquivo.read()
+        try:
+            otimizado, webp = otimizar(nome, conteudo)
+        except (OSError, ValueError, UnicodeDecodeError) as erro:
+            logger.warning('Arquivo estático não otimizado %s: %s', nome, erro)
+            return None
+        entrada = {'original': len(conteudo), 'otimizado': len(otimizado)}
+        if otimizado is not conteudo:
+            self._substituir(nome, otimizado)
+        if webp:
+            self._substituir(nome_webp(nome), webp)
+            entrada['webp'] = len(webp)
+        entrada['economizado'] = len(conteudo) - min(len(otimizado), entrada.get('webp', len(otimizado)))
+        return entrada
+
+    def _substituir(self, nome, conteudo):
+        if self.exists(nome):
+            self.delete(nome)
+        self._save(nome, ContentFile(conteudo))
@@ -0,0 +1,206 @@
+# pessoas/estilos.py
+
+"""
+Folhas de estilo das páginas, tiradas dos templates no collectstatic.
+
+O CSS de cada página continua no template, dentro de {% estilo "nome" %}
+(templatetags/estilos.py). No collectstatic, o storage de estáticos
+(pessoas/estaticos.py) chama gerar(): cada bloco é renderizado e gravado em
+css/paginas/<nome>.css, que passa pela minificação, recebe hash e entra no
+manifesto como qualquer estático. Com o manifesto, a tag vira um <link> para
+esse arquivo, que o navegador guarda em cache; sem ele (desenvolvimento e
+testes), o CSS continua inline.
+
+Nos blocos marcados com `critico`, gerar() também grava
+css/paginas/<nome>.critico.css: só as regras cujos seletores aparecem na
+marcação do template antes de {% dobra %}. Esse CSS vai inline e o arquivo
+completo é carregado sem bloquear a renderização.
+
+Templates diferentes podem usar o mesmo nome (as páginas de serviço
+compartilham um arquivo) desde que o CSS seja o mesmo.
+"""
+
+import logging
+import re
+from pathlib import Path
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template import Context, TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+
+logger = logging.getLogger(__name__)
+
+PASTA = 'css/paginas'
+
+# Elementos que a página sempre tem (base.html) ou que as tags de imagem geram
+TAGS_SEMPRE = {'html', 'body', 'main', 'img', 'picture'}
+
+_BLOCO = re.compile(r'{%\s*estilo\b.*?{%\s*endestilo\s*%}', re.S)
+_DOBRA = re.compile(r'{%\s*dobra\s*%}')
+_TAG_TEMPLATE = re.compile(r'{%.*?%}|{{.*?}}', re.S)
+
+# Cache dos CSS críticos lidos do STATIC_ROOT, por nome com hash
+_criticos = {}
+
+
+def arquivo(nome):
+    return f'{PASTA}/{nome}.css'
+
+
+def arquivo_critico(nome):
+    return f'{PASTA}/{nome}.critico.css'
+
+
+def publicado(nome):
+    """O collectstatic gerou o arquivo do bloco (está no manifesto)."""
+    return arquivo(nome) in getattr(staticfiles_storage, 'hashed_files', {})
+
+
+def critico(nome):
+    """CSS crítico do bloco, lido uma vez por processo ('' se não houver)."""
+    caminho = arquivo_critico(nome)
+    if caminho not in staticfiles_storage.hashed_files:
+        return ''
+    armazenado = staticfiles_storage.stored_name(caminho)
+    if armazenado not in _criticos:
+        with staticfiles_storage.open(armazenado) as css:
+            _criticos[armazenado] = css.read().decode('utf-8')
+    return _criticos[armazenado]
+
+
+# --- CSS crítico ---
+
+def _remover_style(css):
+    return re.sub(r'</?style[^>]*>', '', css)
+
+
+def _regras(css):
+    """(prelúdio, corpo) das regras de nível superior; corpo None em @import e afins."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    regras, i = [], 0
+    while True:
+        abre = css.find('{', i)
+        if abre == -1:
+            break
+        fim = css.find(';', i)
+        if 0 <= fim < abre and css[i:fim].strip().startswith('@'):
+            regras.append((css[i:fim].strip(), None))
+            i = fim + 1
+            continue
+        nivel, j = 1, abre + 1
+        while j < len(css) and nivel:
+            nivel += {'{': 1, '}': -1}.get(css[j], 0)
+            j += 1
+        regras.append((css[i:abre].strip(), css[abre + 1:j - 1]))
+        i = j
+    return regras
+
+
+def presentes(marcacao):
+    """Classes, ids e tags que aparecem na marcação de um template."""
+    classes, ids = set(), set()
+    for valor in re.findall(r'class\s*=\s*"([^"]*)"', marcacao):
+        classes.update(_TAG_TEMPLATE.sub(' ', valor).split())
+    for valor in re.findall(r'id\s*=\s*"([^"]*)"', marcacao):
+        ids.update(_TAG_TEMPLATE.sub(' ', valor).split())
+    tags = {tag.lower() for tag in re.findall(r'<([a-zA-Z][\w-]*)', marcacao)} | TAGS_SEMPRE
+    return classes, ids, tags
+
+
+def _seletor_visivel(seletor, encontrados):
+    classes, ids, tags = encontrados
+    # Pseudo-classes e atributos não mudam o elemento; se ele está na página, entra
+    seletor = re.sub(r'\[[^\]]*\]', '', seletor)
+    seletor = re.sub(r'::?[\w-]+(\([^)]*\))?', '', seletor)
+    return (
+        set(re.findall(r'\.([\w-]+)', seletor)) <= classes
+        and set(re.findall(r'#([\w-]+)', seletor)) <= ids
+        and {tag.lower() for tag in re.findall(r'(?:^|[\s>+~])([a-zA-Z][\w-]*)', seletor)} <= tags
+    )
+
+
+def extrair_critico(css, encontrados):
+    """
+    Regras de `css` que se aplicam a algum elemento de `encontrados`
+    (presentes()), com as @media correspondentes, as @font-face e as
+    @keyframes usadas por elas.
+    """
+    saida, animacoes = [], []
+    for preludio, corpo in _regras(css):
+        if corpo is None:
+            if preludio.startswith('@import'):
+                saida.append(preludio + ';')
+        elif preludio.startswith(('@media', '@supports')):
+            interno = extrair_critico(corpo, encontrados)
+            if interno:
+                saida.append(f'{preludio}{{{interno}}}')
+        elif preludio.startswith('@font-face'):
+            saida.append(f'{preludio}{{{corpo}}}')
+        elif preludio.startswith(('@keyframes', '@-webkit-keyframes')):
+            animacoes.append((preludio.split()[-1], f'{preludio}{{{corpo}}}'))
+        elif not preludio.startswith('@') and any(
+            _seletor_visivel(seletor, encontrados) for seletor in preludio.split(',')
+        ):
+            saida.append(f'{preludio}{{{corpo}}}')
+    usado = '\n'.join(saida)
+    saida += [regra for nome, regra in animacoes if re.search(rf'\b{re.escape(nome)}\b', usado)]
+    return '\n'.join(saida)
+
+
+# --- Geração no collectstatic ---
+
+def _templates():
+    """Nomes dos templates (.html) que usam {% estilo %}."""
+    pastas = []
+    for engine in engines.all():
+        if hasattr(engine, 'engine'):
+            pastas += [Path(pasta) for pasta in engine.engine.dirs]
+    pastas += [Path(pasta) for pasta in get_app_template_dirs('templates')]
+    nomes = set()
+    for pasta in pastas:
+        for caminho in pasta.rglob('*.html'):
+            if '{% estilo' in caminho.read_text(encoding='utf-8'):
+                nomes.add(caminho.relative_to(pasta).as_posix())
+    return sorted(nomes)
+
+
+def gerar():
+    """
+    {arquivo estático: CSS} de todos os blocos {% estilo %} dos templates.
+    Chamada pelo storage de estáticos com um manifesto provisório, para que
+    {% static %} dentro dos blocos dê os nomes sem hash (o hash é aplicado
+    depois, nas url() do arquivo gerado).
+    """
+    from .templatetags.estilos import EstiloNode
+
+    blocos, origens, marcacoes = {}, {}, {}
+    for nome_template in _templates():
+        try:
+            template = engines['django'].get_template(nome_template).template
+        except TemplateSyntaxError as erro:
+            # A página já não renderiza; o build não deve parar por ela
+            logger.warning('Estilos de %s não gerados: %s', nome_template, erro)
+            continue
+        fonte = _BLOCO.sub('', template.source)
+        marcacao = _DOBRA.split(fonte, 1)[0]
+        for no in template.nodelist.get_nodes_by_type(EstiloNode):
+            css = _remover_style(no.nodelist.render(Context())).strip() + '\n'
+            if no.nome in blocos and blocos[no.nome] != css:
+                raise ValueError(
+                    f'O estilo "{no.nome}" tem CSS diferente em {origens[no.nome]} e {nome_template}'
+                )
+            blocos[no.nome], origens[no.nome] = css, nome_template
+            if no.critico:
+                marcacoes.setdefault(no.nome, []).append(marcacao)
+
+    arquivos = {arquivo(nome): css for nome, css in blocos.items()}
+    for nome, lista in marcacoes.items():
+        classes, ids, tags = set(), set(), set()
+        for marcacao in lista:
+            encontrados = presentes(marcacao)
+            classes |= encontrados[0]
+            ids |= encontrados[1]
+            tags |= encontrados[2]
+        css = extrair_critico(blocos[nome], (classes, ids, tags))
+        if css:
+            arquivos[arquivo_critico(nome)] = css + '\n'
+    return arquivos
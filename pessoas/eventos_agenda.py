@@ -0,0 +1,143 @@
+# pessoas/eventos_agenda.py
+
+"""
+Eventos da agenda do dia para o painel do atendente (Server-Sent Events).
+
+Os signals de Consulta gravam cada mudança em EventoAgenda, na mesma
+transação da consulta: um evento só aparece depois do commit e some se a
+alteração for desfeita. O id do evento é o cursor do stream; o navegador o
+reenvia no cabeçalho Last-Event-ID ao reconectar e nada se perde entre
+conexões.
+
+O stream é um gerador assíncrono: sob ASGI (cadastro_pessoas/asgi.py) cada
+cliente conectado é só uma corrotina esperando o próximo intervalo, sem
+ocupar uma thread. Sob WSGI, a view devolve apenas os eventos pendentes e
+pede ao navegador que reconecte, como um polling curto.
+"""
+
+import asyncio
+import json
+from datetime import timedelta
+from django.utils import timezone
+from .models import EventoAgenda
+
+# Segundos entre duas leituras do registro de eventos
+INTERVALO = 2
+
+# Comentário enviado para manter a conexão aberta em proxies
+INTERVALO_PING = 15
+
+# Tempo máximo de uma conexão; o navegador reconecta sozinho com o Last-Event-ID
+DURACAO_MAXIMA = 5 * 60
+
+# Espera pedida ao navegador antes de reconectar (ms)
+RETRY_MS = 3000
+
+# Eventos mais antigos que isso são removidos por limpar_eventos_agenda
+RETENCAO_DIAS = 7
+
+
+def _nome(usuario):
+    return usuario.get_full_name() or usuario.username
+
+
+def _dados(consulta):
+    local = timezone.localtime(consulta.data_hora)
+    return {
+        'id': consulta.id,
+        'data_hora': local.isoformat(),
+        'hora': local.strftime('%H:%M'),
+        'data_hora_exibicao': local.strftime('%d/%m/%Y, %H:%M'),
+        'status': consulta.status,
+        'status_exibicao': consulta.get_status_display(),
+        'paciente': _nome(consulta.paciente),
+        'medico': _nome(consulta.medico),
+    }
+
+
+def registrar(consulta, anterior=None):
+    """
+    Grava o evento de uma consulta salva. `anterior` são os valores do
+    banco antes do save (None na criação). Uma remarcação para outro dia vira
+    'removida' no dia antigo e 'criada' no novo; gravações que não mudam
+    horário, médico nem status (o relatório, por exemplo) não geram evento.
+    """
+    data = timezone.localtime(consulta.data_hora).date()
+    if anterior is None:
+        eventos = [('criada', data)]
+    else:
+        data_anterior = timezone.localtime(anterior['data_hora']).date()
+        mudou = (
+            anterior['data_hora'] != consulta.data_hora
+            or anterior['medico_id'] != consulta.medico_id
+            or anterior['status'] != consulta.status
+        )
+        if not mudou:
+            return
+        if data_anterior != data:
+            eventos = [('removida', data_anterior), ('criada', data)]
+        else:
+            eventos = [('alterada', data)]
+    dados = _dados(consulta)
+    EventoAgenda.objects.bulk_create([
+        EventoAgenda(data=dia, tipo=tipo, consulta_id=consulta.id, dados=dados)
+        for tipo, dia in eventos
+    ])
+
+
+def registrar_remocao(consulta):
+    EventoAgenda.objects.create(
+        data=timezone.localtime(consulta.data_hora).date(),
+        tipo='removida',
+        consulta_id=consulta.id,
+        dados={'id': consulta.id},
+    )
+
+
+def ultimo_id():
+    """Id do evento mais recente; a página renderizada já reflete até ele."""
+    return EventoAgenda.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def formatar(evento):
+    """Um evento no formato text/event-stream."""
+    dados = json.dumps({'tipo': evento['tipo'], **evento['dados']}, ensure_ascii=False)
+    return f'id: {evento["id"]}\nevent: consulta\ndata: {dados}\n\n'
+
+
+async def pendentes(data, apos):
+    """Eventos do dia com id maior que `apos`, em ordem."""
+    return [
+        evento async for evento in EventoAgenda.objects.filter(
+            data=data, id__gt=apos
+        ).order_by('id').values('id', 'tipo', 'dados')
+    ]
+
+
+async def stream(data, apos, duracao=None):
+    """
+    Gerador assíncrono do text/event-stream: lê os eventos novos do dia a
+    cada INTERVALO segundos, envia um ping a cada INTERVALO_PING e termina
+    após `duracao` segundos (o navegador reconecta de onde parou).
+    """
+    laco = asyncio.get_running_loop()
+    fim = laco.time() + (duracao or DURACAO_MAXIMA)
+    proximo_ping = laco.time() + INTERVALO_PING
+    yield f'retry: {RETRY_MS}\n\n'
+    while True:
+        for evento in await pendentes(data, apos):
+            apos = evento['id']
+            yield formatar(evento)
+        agora = laco.time()
+        if agora >= fim:
+            return
+        if agora >= proximo_ping:
+            proximo_ping = agora + INTERVALO_PING
+            yield ': ping\n\n'
+        await asyncio.sleep(INTERVALO)
+
+
+def limpar(dias=RETENCAO_DIAS):
+    """Remove eventos de dias anteriores a `dias` atrás; retorna quantos."""
+    limite = timezone.localdate() - timedelta(days=dias)
+    return EventoAgenda.objects.filter(data__lt=limite).delete()[0]
@@ -0,0 +1,188 @@
+# pessoas/exportacao.py
+
+"""
+Exportação de consultas e pacientes em CSV ou JSON Lines.
+
+As linhas saem de projeções values_list() lidas com iterator(chunk_size),
+sem instanciar modelos nem carregar o resultado inteiro, e são escritas uma a
+uma em um StreamingHttpResponse: a memória fica constante e o download
+começa assim que o primeiro bloco é lido do banco.
+
+Sob ASGI, o Django junta um iterador síncrono em uma lista antes de enviar
+qualquer byte. Por isso, lá, a resposta recebe um iterador assíncrono que
+pede ao gerador síncrono um bloco por vez, na thread da requisição (onde
+está a conexão com o banco).
+"""
+
+import csv
+import json
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import Consulta, Perfil
+
+# Linhas buscadas do banco por vez
+TAMANHO_BLOCO = 2000
+
+# Caracteres acumulados antes de cada envio ao cliente
+TAMANHO_ENVIO = 64 * 1024
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Coluna do arquivo -> caminho na projeção values_list()
+COLUNAS_CONSULTAS = {
+    'id': 'id',
+    'data_hora': 'data_hora',
+    'status': 'status',
+    'paciente_id': 'paciente_id',
+    'paciente_usuario': 'paciente__username',
+    'paciente_nome': 'paciente__first_name',
+    'paciente_sobrenome': 'paciente__last_name',
+    'paciente_email': 'paciente__email',
+    'medico_id': 'medico_id',
+    'medico_usuario': 'medico__username',
+    'medico_nome': 'medico__first_name',
+    'medico_sobrenome': 'medico__last_name',
+    'profissional_id': 'exp_profissional_id',
+    'profissional_nome': 'exp_profissional_nome',
+    'profissional_crm': 'exp_profissional_crm',
+    'especialidade': 'exp_especialidade',
+    'observacoes': 'observacoes',
+    'criado_em': 'criado_em',
+    'atualizado_em': 'atualizado_em',
+}
+
+COLUNAS_PACIENTES = {
+    'id': 'usuario_id',
+    'usuario': 'usuario__username',
+    'nome': 'usuario__first_name',
+    'sobrenome': 'usuario__last_name',
+    'email': 'usuario__email',
+    'data_nascimento': 'data_nascimento',
+    'rg': 'rg',
+    'telefone': 'telefone',
+    'endereco': 'endereco',
+    'cadastrado_em': 'usuario__date_joined',
+}
+
+
+# Campos convertidos para ISO 8601 (data/hora no fuso local)
+CAMPOS_DATA_HORA = {'data_hora', 'criado_em', 'atualizado_em', 'usuario__date_joined'}
+CAMPOS_DATA = {'data_nascimento'}
+
+
+def consultas(inicio=None, fim=None):
+    """
+    Projeção das consultas (mais antigas primeiro), opcionalmente entre duas
+    datas. Sem profissional na consulta, usa o vinculado ao médico.
+    """
+    consultas = Consulta.objects.all()
+    if inicio and fim:
+        consultas = consultas.entre(inicio, fim)
+    return consultas.annotate(
+        exp_profissional_id=Coalesce('profissional_id', 'medico__profissional__id'),
+        exp_profissional_nome=Coalesce('profissional__nome', 'medico__profissional__nome'),
+        exp_profissional_crm=Coalesce('profissional__crm', 'medico__profissional__crm'),
+        exp_especialidade=Coalesce(
+            'profissional__especialidade__nome', 'medico__profissional__especialidade__nome'
+        ),
+    ).order_by('data_hora', 'id').values_list(*COLUNAS_CONSULTAS.values())
+
+
+def pacientes():
+    """Projeção dos perfis de paciente, na ordem de cadastro."""
+    return Perfil.objects.filter(tipo_usuario='paciente').order_by(
+        'usuario_id'
+    ).values_list(*COLUNAS_PACIENTES.values())
+
+
+def _formatar(linhas, colunas):
+    """
+    Converte as datas das tuplas para texto ISO. Só as posições que são
+    data/hora passam por conversão; o resto segue como veio do banco.
+    """
+    fuso = timezone.get_current_timezone()
+    caminhos = list(colunas.values())
+    com_hora = [i for i, caminho in enumerate(caminhos) if caminho in CAMPOS_DATA_HORA]
+    sem_hora = [i for i, caminho in enumerate(caminhos) if caminho in CAMPOS_DATA]
+    for linha in linhas:
+        linha = list(linha)
+        for i in com_hora:
+            if linha[i] is not None:
+                linha[i] = linha[i].astimezone(fuso).isoformat()
+        for i in sem_hora:
+            if linha[i] is not None:
+                linha[i] = linha[i].isoformat()
+        yield linha
+
+
+class _Eco:
+    """Arquivo falso para o csv.writer: write() devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(linhas, colunas):
+    escritor = csv.writer(_Eco())
+    # BOM para o Excel reconhecer o UTF-8
+    yield '\ufeff' + escritor.writerow(list(colunas))
+    for linha in _formatar(linhas, colunas):
+        yield escritor.writerow(linha)
+
+
+def linhas_jsonl(linhas, colunas):
+    nomes = list(colunas)
+    codificar = json.JSONEncoder(ensure_ascii=False).encode
+    for linha in _formatar(linhas, colunas):
+        yield codificar(dict(zip(nomes, linha))) + '\n'
+
+
+def _em_blocos(partes, tamanho):
+    """
+    Junta as linhas em blocos de ~`tamanho` caracteres antes de enviá-las,
+    para não fazer uma escrita no socket por linha. A primeira parte (o
+    cabeçalho, no CSV) sai imediatamente.
+    """
+    partes = iter(partes)
+    primeira = next(partes, None)
+    if primeira is None:
+        return
+    yield primeira
+    bloco, total = [], 0
+    for parte in partes:
+        bloco.append(parte)
+        total += len(parte)
+        if total >= tamanho:
+            yield ''.join(bloco)
+            bloco, total = [], 0
+    if bloco:
+        yield ''.join(bloco)
+
+
+async def _assincrono(partes):
+    """Percorre o gerador síncrono `partes` sem bloquear o loop de eventos."""
+    proxima = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (parte := await proxima(partes, None)) is not None:
+            yield parte
+    finally:
+        # Cliente desconectado: fecha o cursor na mesma thread
+        await sync_to_async(partes.close, thread_sensitive=True)()
+
+
+def resposta(request, queryset, colunas, formato, nome_arquivo):
+    """StreamingHttpResponse com o queryset exportado no formato pedido."""
+    linhas = queryset.iterator(chunk_size=TAMANHO_BLOCO)
+    gerar = linhas_csv if formato == 'csv' else linhas_jsonl
+    partes = _em_blocos(gerar(linhas, colunas), TAMANHO_ENVIO)
+    if isinstance(request, ASGIRequest):
+        partes = _assincrono(partes)
+    response = StreamingHttpResponse(partes, content_type=FORMATOS[formato])
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    return response
@@ -3,24 +3,34 @@
 from django import forms
 from django.contrib.auth.models import User
 from .models import Medicamento, Perfil, Consulta
+from .agendamento import MENSAGEM_HORARIO_OCUPADO
+from . import disponibilidade, diretorio
 from django.contrib.auth import authenticate
-from datetime import time, datetime, timedelta
+from datetime import date, time, datetime
 from django.utils import timezone
 
-def gerar_todos_horarios_possiveis():
-    """Gera uma lista de todos os horários de 15 em 15 minutos entre 08:00 e 17:45."""
+def gerar_todos_horarios_possiveis(medico_id=None, data=None):
+    """
+    Opções do campo de hora: todos os horários que o médico oferece na data,
+    segundo a grade de disponibilidade. Sem médico ou data, só a opção vazia
+    (o formulário preenche o resto via AJAX).
+    """
     horarios = [('', '---------')]
-    hora_inicio = datetime.strptime("08:00", "%H:%M").time()
-    hora_fim = datetime.strptime("18:00", "%H:%M").time()
-    intervalo = timedelta(minutes=15)
-
-    current_time = datetime.combine(datetime.min, hora_inicio)
-    while current_time.time() < hora_fim:
-        hora = current_time.time()
-        horarios.append((hora.isoformat(timespec='minutes'), hora.strftime("%H:%M")))
-        current_time += intervalo
+    if medico_id and data:
+        for hora in disponibilidade.horarios_do_medico(medico_id, data):
+            horarios.append((hora.isoformat(timespec='minutes'), hora.strftime("%H:%M")))
     return horarios
 
+
+def _horarios_do_formulario(form):
+    """Opções de hora a partir do médico e da data enviados no formulário."""
+    try:
+        medico_id = int(form.data.get(form.add_prefix('medico')))
+        data = date.fromisoformat(form.data.get(form.add_prefix('data')))
+    except (TypeError, ValueError):
+        return gerar_todos_horarios_possiveis()
+    return gerar_todos_horarios_possiveis(medico_id, data)
+
 class LoginUsuarioForm(forms.Form):
     username = forms.CharField(
         max_length=150,
@@ -125,7 +135,9 @@ class PerfilForm(forms.ModelForm):
 class AgendarConsultaForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['hora'].choices = gerar_todos_horarios_possiveis()
+        # Opções do diretório em cache, em vez de uma query por formulário
+        self.fields['medico'].choices = diretorio.opcoes_medicos()
+        self.fields['hora'].choices = _horarios_do_formulario(self)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -141,23 +153,19 @@ class AgendarConsultaForm(forms.ModelForm):
             except ValueError:
                 raise forms.ValidationError("Formato de hora inválido.")
 
-            # 1. Restrição de horário de funcionamento (8h às 18h)
-            if not (time(8, 0) <= hora < time(18, 0)):
-                raise forms.ValidationError("O horário de agendamento deve ser entre 08:00 e 18:00.")
-
-            # 2. Espaçamento mínimo de 15 minutos (já garantido pela geração de choices, mas bom ter)
-            if hora.minute % 15 != 0:
-                raise forms.ValidationError("O agendamento deve ser feito em intervalos de 15 minutos.")
+            # 1. O horário precisa estar na grade de atendimento do médico naquele dia
+            if hora not in disponibilidade.horarios_do_medico(medico.id, data):
+                raise forms.ValidationError("O médico não atende neste horário. Escolha um dos horários disponíveis.")
 
-            # 3. Verifica se o horário está ocupado (redundante se a lista for gerada corretamente, mas é uma segurança)
-            consulta_existente = Consulta.objects.filter(
+            # 2. Verifica se o horário está ocupado (validação amigável; a garantia
+            #    contra agendamentos simultâneos é a restrição única no banco)
+            consulta_existente = Consulta.objects.ativas().filter(
                 medico=medico,
-                data_hora=data_hora,
-                status='agendada'
+                data_hora=data_hora
             ).exists()
 
             if consulta_existente:
-                raise forms.ValidationError("Este horário já está ocupado. Por favor, escolha outro.")
+                raise forms.ValidationError(MENSAGEM_HORARIO_OCUPADO)
 
             # Adiciona o campo data_hora completo para ser usado na view
             cleaned_data['data_hora'] = data_hora
@@ -176,7 +184,9 @@ class AgendarConsultaForm(forms.ModelForm):
 class AgendarConsultaAtendenteForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['hora'].choices = gerar_todos_horarios_possiveis()
+        # Opções do diretório em cache, em vez de uma query por formulário
+        self.fields['medico'].choices = diretorio.opcoes_medicos()
+        self.fields['hora'].choices = _horarios_do_formulario(self)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -192,23 +202,19 @@ class AgendarConsultaAtendenteForm(forms.ModelForm):
             except ValueError:
                 raise forms.ValidationError("Formato de hora inválido.")
 
-            # 1. Restrição de horário de funcionamento (8h às 18h)
-            if not (time(8, 0) <= hora < time(18, 0)):
-                raise forms.ValidationError("O horário de agendamento deve ser entre 08:00 e 18:00.")
+            # 1. O horário precisa estar na grade de atendimento do médico naquele dia
+            if hora not in disponibilidade.horarios_do_medico(medico.id, data):
+                raise forms.ValidationError("O médico não atende neste horário. Escolha um dos horários disponíveis.")
 
-            # 2. Espaçamento mínimo de 15 minutos (já garantido pela geração de choices, mas bom ter)
-            if hora.minute % 15 != 0:
-                raise forms.ValidationError("O agendamento deve ser feito em intervalos de 15 minutos.")
-
-            # 3. Verifica se o horário está ocupado (redundante se a lista for gerada corretamente, mas é uma segurança)
-            consulta_existente = Consulta.objects.filter(
+            # 2. Verifica se o horário está ocupado (validação amigável; a garantia
+            #    contra agendamentos simultâneos é a restrição única no banco)
+            consulta_existente = Consulta.objects.ativas().filter(
                 medico=medico,
-                data_hora=data_hora,
-                status='agendada'
+                data_hora=data_hora
             ).exists()
 
             if consulta_existente:
-                raise forms.ValidationError("Este horário já está ocupado. Por favor, escolha outro.")
+                raise forms.ValidationError(MENSAGEM_HORARIO_OCUPADO)
 
             # Adiciona o campo data_hora completo para ser usado na view
             cleaned_data['data_hora'] = data_hora
@@ -258,3 +264,8 @@ class MedicamentoForm(forms.ModelForm):
             'valor': forms.NumberInput(attrs={'class': 'form-control'}),
             'necessita_receita': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
+
+class ImportacaoCSVForm(forms.Form):
+    arquivo = forms.FileField(label='Arquivo CSV', help_text='UTF-8, com cabeçalho na primeira linha.')
+    lote = forms.IntegerField(label='Linhas por lote', min_value=1, max_value=10000, initial=1000)
+    so_validar = forms.BooleanField(label='Apenas validar, sem gravar', required=False)
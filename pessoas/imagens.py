@@ -0,0 +1,175 @@
+# pessoas/imagens.py
+
+"""
+Versões reduzidas das fotos de Profissional e Medicamento.
+
+Para cada foto enviada são gravadas cópias em algumas larguras fixas, no
+formato original (JPEG, ou PNG se houver transparência) e em WebP, em
+<pasta>/derivadas/. O resultado fica no campo foto_variantes do registro e a
+tag {% imagem %} (templatetags/midia.py) monta o srcset a partir dele, sem
+tocar no storage durante a renderização. Enquanto as variantes não existem,
+a tag usa a foto original.
+
+O processamento roda fora da requisição: o signal de post_save agenda a
+foto após o commit em um pool de threads do processo, e o comando
+gerar_variantes_imagens processa em lotes o que já estava no storage.
+"""
+
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+from . import cache_paginas, diretorio
+from .models import Medicamento, Profissional
+
+logger = logging.getLogger(__name__)
+
+# Larguras geradas, em pixels; a foto nunca é ampliada
+LARGURAS = (160, 320, 640)
+
+QUALIDADE_JPEG = 82
+QUALIDADE_WEBP = 80
+
+MODELOS = (Profissional, Medicamento)
+
+TAMANHO_LOTE = 100
+
+# Poucas threads: o Pillow libera o GIL no redimensionamento, mas a CPU é
+# do servidor web
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagens')
+
+
+def pendente(instancia):
+    """A foto atual ainda não tem variantes (ou as que tem são de outra foto)."""
+    foto = instancia.foto
+    return bool(foto) and (instancia.foto_variantes or {}).get('nome') != foto.name
+
+
+def _nome_variante(nome, largura, extensao):
+    caminho = PurePosixPath(nome)
+    return str(caminho.parent / 'derivadas' / f'{caminho.stem}-{largura}.{extensao}')
+
+
+def _codificar(imagem, formato, **opcoes):
+    saida = io.BytesIO()
+    imagem.save(saida, formato, **opcoes)
+    return ContentFile(saida.getvalue())
+
+
+def gerar(foto):
+    """
+    Grava as variantes da foto e retorna a descrição para foto_variantes:
+    nome da foto de origem e, por largura, dimensões e arquivos gerados.
+    """
+    armazenamento = foto.storage
+    with armazenamento.open(foto.name, 'rb') as arquivo:
+        original = Image.open(arquivo)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    transparente = original.mode in ('RGBA', 'LA') or (original.mode == 'P' and 'transparency' in original.info)
+    if transparente:
+        original = original.convert('RGBA')
+        formato, extensao, opcoes = 'PNG', 'png', {'optimize': True}
+    else:
+        original = original.convert('RGB')
+        formato, extensao, opcoes = 'JPEG', 'jpg', {'quality': QUALIDADE_JPEG, 'optimize': True, 'progressive': True}
+
+    # Fotos menores que a maior largura ganham também uma cópia no tamanho original
+    larguras = [largura for largura in LARGURAS if largura < original.width]
+    if original.width < LARGURAS[-1]:
+        larguras.append(original.width)
+    itens = []
+    for largura in larguras:
+        reduzida = original.copy()
+        reduzida.thumbnail((largura, largura * 4), Image.LANCZOS)
+        itens.append({
+            'largura': reduzida.width,
+            'altura': reduzida.height,
+            'arquivo': armazenamento.save(
+                _nome_variante(foto.name, largura, extensao), _codificar(reduzida, formato, **opcoes)
+            ),
+            'webp': armazenamento.save(
+                _nome_variante(foto.name, largura, 'webp'),
+                _codificar(reduzida, 'WEBP', quality=QUALIDADE_WEBP, method=4),
+            ),
+        })
+    return {'nome': foto.name, 'itens': itens}
+
+
+def remover(variantes, armazenamento):
+    """Apaga do storage os arquivos de uma descrição de variantes."""
+    for item in (variantes or {}).get('itens', []):
+        for chave in ('arquivo', 'webp'):
+            armazenamento.delete(item[chave])
+
+
+def processar(instancia):
+    """
+    Gera as variantes da foto atual da instância, apaga as da foto anterior
+    e grava foto_variantes com update(), sem disparar os signals de novo.
+    Se a foto mudou enquanto isso, descarta o que gerou.
+    """
+    if not pendente(instancia):
+        return False
+    foto = instancia.foto
+    variantes = gerar(foto)
+    gravados = type(instancia).objects.filter(pk=instancia.pk, foto=foto.name).update(foto_variantes=variantes)
+    if not gravados:
+        remover(variantes, foto.storage)
+        return False
+    remover(instancia.foto_variantes, foto.storage)
+    instancia.foto_variantes = variantes
+    if isinstance(instancia, Profissional):
+        diretorio.invalidar()
+        cache_paginas.invalidar()
+    return True
+
+
+def _processar_em_segundo_plano(modelo, pk):
+    try:
+        instancia = modelo.objects.filter(pk=pk).first()
+        if instancia is not None:
+            processar(instancia)
+    except Exception:
+        logger.exception('Falha ao gerar as variantes da foto de %s %s', modelo.__name__, pk)
+    finally:
+        # A conexão é desta thread do pool; não fica aberta entre tarefas
+        connections.close_all()
+
+
+def agendar(instancia):
+    """Processa a foto da instância em segundo plano, após o commit."""
+    modelo, pk = type(instancia), instancia.pk
+    transaction.on_commit(lambda: _executor.submit(_processar_em_segundo_plano, modelo, pk))
+
+
+def descartar(instancia, excluida=False):
+    """
+    Apaga, após o commit, as variantes de uma foto removida do registro (ou
+    do registro excluído) e limpa foto_variantes.
+    """
+    variantes, armazenamento = instancia.foto_variantes, instancia.foto.storage
+    if not variantes:
+        return
+    transaction.on_commit(lambda: remover(variantes, armazenamento))
+    if not excluida:
+        type(instancia).objects.filter(pk=instancia.pk).update(foto_variantes={})
+        instancia.foto_variantes = {}
+
+
+def com_foto(modelo):
+    """Registros do modelo que têm foto, em ordem de pk (o comando filtra os pendentes)."""
+    return modelo.objects.exclude(foto='').exclude(foto__isnull=True).order_by('pk')
+
+
+def variante(variantes, largura):
+    """O item de foto_variantes mais próximo de `largura` sem ficar abaixo dela (ou o maior)."""
+    itens = (variantes or {}).get('itens') or []
+    if not itens:
+        return None
+    maiores = [item for item in itens if item['largura'] >= largura]
+    return min(maiores, key=lambda item: item['largura']) if maiores else max(itens, key=lambda item: item['largura'])
@@ -0,0 +1,403 @@
+# pessoas/importacao.py
+
+"""
+Importação em massa de usuários (User + Perfil) e profissionais a partir
+de CSV, usada pelo comando importar_cadastros e pelo upload no admin.
+
+O arquivo é lido duas vezes, linha a linha: a primeira passada só valida
+(guardando apenas as chaves já vistas, para achar duplicatas) e a segunda
+grava as linhas válidas em lotes com bulk_create. Como bulk_create não
+dispara signals nem Model.save(), os Perfis são montados aqui no mesmo lote
+dos usuários e os slugs dos profissionais são calculados de antemão contra
+os já existentes.
+
+Cada lote é gravado em uma transação própria. Se um lote falhar no banco, ele
+é refeito linha a linha para isolar as linhas com problema, e o restante do
+arquivo continua. Registros que já existem (usuário pelo username,
+profissional pelo CRM ou, sem CRM, pelo nome) são pulados, então basta rodar
+o mesmo arquivo de novo para retomar uma importação interrompida.
+"""
+
+import csv
+import time
+from datetime import datetime
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+from .models import Especialidade, Perfil, Profissional
+from . import cache_paginas, diretorio, ocupacao
+
+# Linhas gravadas por transação
+TAMANHO_LOTE = 1000
+
+# Mesmos nomes de coluna da exportação, para que o CSV exportado possa ser reimportado
+COLUNAS = {
+    'usuarios': (
+        'usuario', 'email', 'nome', 'sobrenome', 'senha', 'tipo_usuario',
+        'data_nascimento', 'rg', 'telefone', 'endereco',
+    ),
+    'profissionais': (
+        'nome', 'especialidade', 'crm', 'email', 'telefone', 'usuario',
+        'ativo', 'destaque', 'biografia',
+    ),
+}
+OBRIGATORIAS = {
+    'usuarios': ('usuario',),
+    'profissionais': ('nome',),
+}
+
+TIPOS = tuple(COLUNAS)
+
+TAMANHOS = {
+    'usuarios': {'nome': 150, 'sobrenome': 150, 'rg': 20, 'telefone': 20, 'endereco': 255},
+    'profissionais': {'nome': 200, 'especialidade': 100, 'crm': 20, 'telefone': 20},
+}
+
+VERDADEIROS = {'1', 'sim', 's', 'true', 'verdadeiro', 'x'}
+FALSOS = {'0', 'nao', 'não', 'n', 'false', 'falso'}
+
+_validar_username = UnicodeUsernameValidator()
+
+
+class ErroImportacao(Exception):
+    """Arquivo que não pode ser importado (tipo desconhecido, colunas faltando)."""
+
+
+class Relatorio:
+    """Contadores de uma importação e erros por número de linha do arquivo."""
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.lidas = 0
+        self.criados = 0
+        self.existentes = 0
+        self.erros = []
+        self.especialidades_novas = []
+        self.ultima_linha = 0
+        self.inicio = time.monotonic()
+        self.fim = None
+
+    def erro(self, linha, mensagem):
+        self.erros.append((linha, mensagem))
+
+    def encerrar(self):
+        self.fim = time.monotonic()
+
+    @property
+    def segundos(self):
+        return (self.fim or time.monotonic()) - self.inicio
+
+    @property
+    def linhas_por_segundo(self):
+        return round(self.lidas / self.segundos) if self.segundos else 0
+
+
+def _linhas(arquivo, tipo, a_partir_da_linha=0):
+    """
+    Gera (número da linha, {coluna: valor}) a partir do início do arquivo,
+    com os valores sem espaços nas pontas e as colunas desconhecidas ignoradas.
+    """
+    arquivo.seek(0)
+    leitor = csv.DictReader(arquivo)
+    cabecalho = [coluna.strip() for coluna in leitor.fieldnames or []]
+    faltando = [coluna for coluna in OBRIGATORIAS[tipo] if coluna not in cabecalho]
+    if faltando:
+        raise ErroImportacao(f'Colunas obrigatórias ausentes: {", ".join(faltando)}.')
+    leitor.fieldnames = cabecalho
+    colunas = [coluna for coluna in COLUNAS[tipo] if coluna in cabecalho]
+    for linha in leitor:
+        if leitor.line_num < a_partir_da_linha:
+            continue
+        yield leitor.line_num, {coluna: (linha.get(coluna) or '').strip() for coluna in colunas}
+
+
+def _data(valor):
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    raise ValidationError('data inválida (use AAAA-MM-DD ou DD/MM/AAAA)')
+
+
+def _booleano(valor, padrao):
+    if not valor:
+        return padrao
+    if valor.lower() in VERDADEIROS:
+        return True
+    if valor.lower() in FALSOS:
+        return False
+    raise ValidationError(f'valor "{valor}" não é sim/não')
+
+
+def _limpar(tipo, dados):
+    """Valida uma linha e converte os valores; levanta ValidationError com as mensagens."""
+    erros = []
+    for coluna in OBRIGATORIAS[tipo]:
+        if not dados.get(coluna):
+            erros.append(f'{coluna} é obrigatório')
+    for coluna, tamanho in TAMANHOS[tipo].items():
+        if len(dados.get(coluna, '')) > tamanho:
+            erros.append(f'{coluna} passa de {tamanho} caracteres')
+
+    limpos = dict(dados)
+    if dados.get('email'):
+        try:
+            validate_email(dados['email'])
+        except ValidationError:
+            erros.append('email inválido')
+
+    if tipo == 'usuarios':
+        if dados.get('usuario'):
+            try:
+                _validar_username(dados['usuario'])
+            except ValidationError:
+                erros.append('usuario aceita apenas letras, números e @/./+/-/_')
+        tipo_usuario = dados.get('tipo_usuario') or 'paciente'
+        if tipo_usuario not in dict(Perfil.TIPOS_USUARIO):
+            erros.append(f'tipo_usuario "{tipo_usuario}" desconhecido')
+        limpos['tipo_usuario'] = tipo_usuario
+        if dados.get('data_nascimento'):
+            try:
+                limpos['data_nascimento'] = _data(dados['data_nascimento'])
+            except ValidationError as erro:
+                erros.extend(erro.messages)
+    else:
+        for coluna, padrao in (('ativo', True), ('destaque', False)):
+            try:
+                limpos[coluna] = _booleano(dados.get(coluna, ''), padrao)
+            except ValidationError as erro:
+                erros.append(f'{coluna}: {erro.messages[0]}')
+
+    if erros:
+        raise ValidationError(erros)
+    return limpos
+
+
+def _chave(tipo, dados):
+    """Chave que identifica o registro dentro do arquivo (e no banco)."""
+    if tipo == 'usuarios':
+        return dados['usuario']
+    return ('crm', dados['crm']) if dados.get('crm') else ('nome', dados['nome'])
+
+
+def validar(arquivo, tipo, a_partir_da_linha=0):
+    """
+    Primeira passada: valida todas as linhas sem gravar nada. Retorna o
+    relatório (com os erros e as especialidades ainda inexistentes) e o
+    conjunto de linhas inválidas, que a gravação pula.
+    """
+    if tipo not in COLUNAS:
+        raise ErroImportacao(f'Tipo "{tipo}" desconhecido; use {" ou ".join(TIPOS)}.')
+    relatorio = Relatorio(tipo)
+    invalidas = set()
+    vistas = {}
+    especialidades = set()
+    for numero, dados in _linhas(arquivo, tipo, a_partir_da_linha):
+        relatorio.lidas += 1
+        try:
+            limpos = _limpar(tipo, dados)
+        except ValidationError as erro:
+            relatorio.erro(numero, '; '.join(erro.messages))
+            invalidas.add(numero)
+            continue
+        chave = _chave(tipo, limpos)
+        if chave in vistas:
+            relatorio.erro(numero, f'duplicada com a linha {vistas[chave]}')
+            invalidas.add(numero)
+            continue
+        vistas[chave] = numero
+        if limpos.get('especialidade'):
+            especialidades.add(limpos['especialidade'])
+
+    existentes = {nome.lower() for nome in Especialidade.objects.values_list('nome', flat=True)}
+    relatorio.especialidades_novas = sorted(
+        nome for nome in especialidades if nome.lower() not in existentes
+    )
+    return relatorio, invalidas
+
+
+def _slug_unico(nome, usados):
+    """Mesmo slug que Profissional.save() geraria, com sufixo -2, -3... se já usado."""
+    base = slugify(nome) or 'profissional'
+    slug, n = base, 1
+    while slug in usados:
+        n += 1
+        slug = f'{base}-{n}'
+    usados.add(slug)
+    return slug
+
+
+def _gravar_usuarios(lote, contexto, relatorio):
+    existentes = set(User.objects.filter(
+        username__in=[dados['usuario'] for _, dados in lote]
+    ).values_list('username', flat=True))
+    novos = [(numero, dados) for numero, dados in lote if dados['usuario'] not in existentes]
+    if not novos:
+        return 0, len(lote)
+
+    User.objects.bulk_create([
+        User(
+            username=dados['usuario'],
+            email=dados.get('email', ''),
+            first_name=dados.get('nome', ''),
+            last_name=dados.get('sobrenome', ''),
+            # Sem senha no arquivo, a conta entra pelo Google ou por redefinição de senha
+            password=make_password(dados.get('senha') or None),
+        )
+        for _, dados in novos
+    ])
+    # Relido pelo username: nem todo banco devolve os ids do bulk_create
+    ids = dict(User.objects.filter(
+        username__in=[dados['usuario'] for _, dados in novos]
+    ).values_list('username', 'id'))
+    Perfil.objects.bulk_create([
+        Perfil(
+            usuario_id=ids[dados['usuario']],
+            tipo_usuario=dados['tipo_usuario'],
+            data_nascimento=dados.get('data_nascimento') or None,
+            rg=dados.get('rg') or None,
+            telefone=dados.get('telefone') or None,
+            endereco=dados.get('endereco') or None,
+        )
+        for _, dados in novos
+    ])
+    return len(novos), len(lote) - len(novos)
+
+
+def _gravar_profissionais(lote, contexto, relatorio):
+    crms = {dados['crm'] for _, dados in lote if dados.get('crm')}
+    nomes = {dados['nome'] for _, dados in lote if not dados.get('crm')}
+    crms_existentes = set(Profissional.objects.filter(crm__in=crms).values_list('crm', flat=True))
+    nomes_existentes = set(Profissional.objects.filter(
+        Q(crm=None) | Q(crm=''), nome__in=nomes
+    ).values_list('nome', flat=True))
+
+    usernames = {dados['usuario'] for _, dados in lote if dados.get('usuario')}
+    usuarios = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    vinculados = set(Profissional.objects.filter(
+        usuario_id__in=usuarios.values()
+    ).values_list('usuario_id', flat=True))
+
+    novos, existentes, rejeitados = [], 0, []
+    for numero, dados in lote:
+        if (dados['crm'] in crms_existentes) if dados.get('crm') else (dados['nome'] in nomes_existentes):
+            existentes += 1
+            continue
+        usuario_id = None
+        if dados.get('usuario'):
+            usuario_id = usuarios.get(dados['usuario'])
+            if usuario_id is None:
+                rejeitados.append((numero, f'usuario "{dados["usuario"]}" não existe'))
+                continue
+            if usuario_id in vinculados:
+                rejeitados.append((numero, f'usuario "{dados["usuario"]}" já tem profissional'))
+                continue
+            vinculados.add(usuario_id)
+        novos.append(Profissional(
+            nome=dados['nome'],
+            especialidade_id=contexto['especialidades'].get(dados.get('especialidade', '').lower()),
+            crm=dados.get('crm') or None,
+            email=dados.get('email') or None,
+            telefone=dados.get('telefone') or None,
+            usuario_id=usuario_id,
+            ativo=dados['ativo'],
+            destaque=dados['destaque'],
+            biografia=dados.get('biografia') or None,
+        ))
+
+    # Slugs de um lote que falhou continuam reservados: um deles pode ter
+    # sido a causa (gravado por outro processo), e o refazer usa os seguintes
+    for profissional in novos:
+        profissional.slug = _slug_unico(profissional.nome, contexto['slugs'])
+    Profissional.objects.bulk_create(novos)
+    for numero, mensagem in rejeitados:
+        relatorio.erro(numero, mensagem)
+    return len(novos), existentes
+
+
+GRAVAR = {
+    'usuarios': _gravar_usuarios,
+    'profissionais': _gravar_profissionais,
+}
+
+
+def _gravar_lote(tipo, lote, contexto, relatorio):
+    gravar = GRAVAR[tipo]
+    try:
+        with transaction.atomic():
+            criados, existentes = gravar(lote, contexto, relatorio)
+    except DatabaseError:
+        # Refaz linha a linha para gravar as boas e apontar as que falharam
+        criados = existentes = 0
+        for item in lote:
+            try:
+                with transaction.atomic():
+                    c, e = gravar([item], contexto, relatorio)
+            except DatabaseError as erro:
+                relatorio.erro(item[0], f'erro no banco: {erro}')
+                continue
+            criados += c
+            existentes += e
+    relatorio.criados += criados
+    relatorio.existentes += existentes
+    relatorio.ultima_linha = lote[-1][0]
+
+
+def _contexto(tipo, relatorio):
+    if tipo == 'usuarios':
+        return {}
+    if relatorio.especialidades_novas:
+        Especialidade.objects.bulk_create(
+            [Especialidade(nome=nome) for nome in relatorio.especialidades_novas],
+            ignore_conflicts=True,
+        )
+    return {
+        'especialidades': {
+            nome.lower(): pk for nome, pk in Especialidade.objects.values_list('nome', 'id')
+        },
+        'slugs': set(Profissional.objects.exclude(slug=None).values_list('slug', flat=True)),
+    }
+
+
+def importar(arquivo, tipo, lote=TAMANHO_LOTE, a_partir_da_linha=0, so_validar=False, progresso=None):
+    """
+    Valida e importa o CSV aberto em `arquivo` (modo texto, com seek). Com
+    `so_validar`, para depois da validação. `progresso(relatorio)` é chamado
+    após cada lote gravado. Retorna o Relatorio.
+    """
+    relatorio, invalidas = validar(arquivo, tipo, a_partir_da_linha)
+    if so_validar:
+        relatorio.encerrar()
+        return relatorio
+
+    contexto = _contexto(tipo, relatorio)
+    pendentes = []
+    for numero, dados in _linhas(arquivo, tipo, a_partir_da_linha):
+        if numero in invalidas:
+            continue
+        pendentes.append((numero, _limpar(tipo, dados)))
+        if len(pendentes) >= lote:
+            _gravar_lote(tipo, pendentes, contexto, relatorio)
+            pendentes = []
+            if progresso:
+                progresso(relatorio)
+    if pendentes:
+        _gravar_lote(tipo, pendentes, contexto, relatorio)
+        if progresso:
+            progresso(relatorio)
+
+    if relatorio.criados:
+        # bulk_create não passa pelos signals que invalidam os caches
+        diretorio.invalidar()
+        cache_paginas.invalidar()
+        if tipo == 'profissionais':
+            ocupacao.invalidar_tudo()
+    relatorio.erros.sort()
+    relatorio.encerrar()
+    return relatorio
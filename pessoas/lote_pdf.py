@@ -0,0 +1,198 @@
+# pessoas/lote_pdf.py
+
+"""
+Geração em lote dos PDFs do dia: a agenda de cada médico seguida dos
+comprovantes das consultas dela, em um único PDF para imprimir ou em um ZIP.
+
+O ReportLab ocupa a CPU e segura o GIL, então as páginas são desenhadas em
+um ProcessPoolExecutor, um processo por núcleo. Os processos são iniciados
+com 'spawn' (seguro mesmo dentro de um servidor com threads) e rodam
+django.setup() antes da primeira tarefa. Cada tarefa recebe os objetos já
+carregados e só desenha: nenhum processo filho consulta o banco. Os
+comprovantes usam o cache em disco de pessoas.comprovantes, então o que já
+foi gerado não é desenhado de novo e o lote deixa os downloads do dia prontos.
+A pasta desse cache é lida no processo principal e passada às tarefas: os
+processos iniciados com 'spawn' carregam as configurações do zero e não
+veriam um COMPROVANTES_ROOT alterado em tempo de execução.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import groupby
+from pathlib import Path
+import django
+from django.utils import timezone
+from pypdf import PdfWriter
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+from . import comprovantes
+from .models import Consulta
+
+FORMATOS = ('pdf', 'zip')
+
+# Linhas da tabela da agenda por página
+LINHAS_POR_PAGINA = 30
+
+# Tarefas enviadas a um processo de cada vez
+TAREFAS_POR_ENVIO = 8
+
+
+class Relatorio:
+    """Arquivos e páginas gerados e a vazão do lote."""
+
+    def __init__(self):
+        self.agendas = 0
+        self.comprovantes = 0
+        self.paginas = 0
+        self.processos = 0
+        self.inicio = time.monotonic()
+        self.fim = None
+
+    def encerrar(self):
+        self.fim = time.monotonic()
+
+    @property
+    def segundos(self):
+        return (self.fim or time.monotonic()) - self.inicio
+
+    @property
+    def paginas_por_segundo(self):
+        return round(self.paginas / self.segundos, 1) if self.segundos else 0
+
+
+def consultas(data=None, medico=None):
+    """Consultas ativas do dia e/ou do médico, na ordem de impressão."""
+    consultas = Consulta.objects.ativas()
+    if data:
+        consultas = consultas.do_dia(data)
+    if medico:
+        consultas = consultas.filter(medico=medico)
+    return consultas
+
+
+def _nome(usuario):
+    return f'{usuario.username} {usuario.last_name}'.strip()
+
+
+def desenhar_agenda(arquivo, medico, data, linhas):
+    """
+    Agenda de um médico em um dia: uma tabela com horário, paciente e status,
+    quebrada em páginas. Retorna o número de páginas.
+    """
+    p = canvas.Canvas(arquivo, pagesize=A4)
+    width, height = A4
+    primary_color = HexColor('#1B325F')
+    paginas = [linhas[i:i + LINHAS_POR_PAGINA] for i in range(0, len(linhas), LINHAS_POR_PAGINA)] or [[]]
+
+    for numero, pagina in enumerate(paginas, start=1):
+        p.setFillColor(primary_color)
+        p.rect(0, height - 3*cm, width, 3*cm, fill=True, stroke=False)
+        p.setFillColor(HexColor('#FFFFFF'))
+        p.setFont("Helvetica-Bold", 18)
+        p.drawString(2*cm, height - 1.9*cm, f"Agenda - Dr(a). {medico}")
+        p.setFont("Helvetica", 11)
+        p.drawString(2*cm, height - 2.5*cm, f"{data.strftime('%d/%m/%Y')} - {len(linhas)} consultas")
+        p.drawRightString(width - 2*cm, height - 2.5*cm, f"Pagina {numero} de {len(paginas)}")
+
+        y_pos = height - 4.5*cm
+        p.setFillColor(HexColor('#333333'))
+        p.setFont("Helvetica-Bold", 11)
+        p.drawString(2*cm, y_pos, "Horario")
+        p.drawString(4.5*cm, y_pos, "Paciente")
+        p.drawString(14*cm, y_pos, "Status")
+        p.setFont("Helvetica", 10)
+        for hora, paciente, status in pagina:
+            y_pos -= 0.7*cm
+            p.drawString(2*cm, y_pos, hora)
+            p.drawString(4.5*cm, y_pos, paciente[:50])
+            p.drawString(14*cm, y_pos, status)
+        p.showPage()
+    p.save()
+    return len(paginas)
+
+
+def _renderizar(tarefa, pasta_comprovantes):
+    """Executada nos processos do pool. Retorna (caminho do PDF, páginas)."""
+    tipo, dados = tarefa
+    if tipo == 'comprovante':
+        return str(comprovantes.obter(dados, pasta_comprovantes)), 1
+    caminho = dados.pop('caminho')
+    return caminho, desenhar_agenda(caminho, **dados)
+
+
+def _tarefas(consultas, pasta):
+    """Para cada médico e dia: a agenda e, em seguida, os comprovantes."""
+    consultas = consultas.select_related(
+        'paciente', 'medico', 'profissional__especialidade'
+    ).order_by('medico__username', 'data_hora', 'id')
+    tarefas = []
+
+    def grupo(consulta):
+        return consulta.medico_id, timezone.localtime(consulta.data_hora).date()
+
+    for (medico_id, data), do_grupo in groupby(consultas, key=grupo):
+        do_grupo = list(do_grupo)
+        medico = _nome(do_grupo[0].medico)
+        tarefas.append(('agenda', {
+            'caminho': str(Path(pasta) / f'agenda_{do_grupo[0].medico.username}_{data:%Y%m%d}.pdf'),
+            'medico': medico,
+            'data': data,
+            'linhas': [
+                (timezone.localtime(c.data_hora).strftime('%H:%M'), _nome(c.paciente), c.get_status_display())
+                for c in do_grupo
+            ],
+        }))
+        tarefas.extend(('comprovante', consulta) for consulta in do_grupo)
+    return tarefas
+
+
+def gerar(consultas, destino, formato='pdf', processos=None):
+    """
+    Desenha as agendas e os comprovantes de `consultas` em paralelo e grava
+    o pacote em `destino` (arquivo binário aberto): um PDF com todas as
+    páginas, na ordem de impressão, ou um ZIP com um arquivo por documento.
+    """
+    relatorio = Relatorio()
+    pasta = tempfile.mkdtemp(prefix='simed-lote-')
+    try:
+        tarefas = _tarefas(consultas, pasta)
+        # Mais processos que tarefas só custaria inicializações do Django
+        relatorio.processos = max(1, min(processos or os.cpu_count() or 1, len(tarefas)))
+        with ProcessPoolExecutor(
+            max_workers=relatorio.processos,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as executor:
+            renderizar = partial(_renderizar, pasta_comprovantes=str(comprovantes.diretorio()))
+            resultados = list(executor.map(renderizar, tarefas, chunksize=TAREFAS_POR_ENVIO))
+
+        for (tipo, dados), (caminho, paginas) in zip(tarefas, resultados):
+            relatorio.paginas += paginas
+            if tipo == 'agenda':
+                relatorio.agendas += 1
+            else:
+                relatorio.comprovantes += 1
+
+        if formato == 'zip':
+            # PDFs já são comprimidos; o ZIP só agrupa
+            with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as pacote:
+                for (tipo, dados), (caminho, paginas) in zip(tarefas, resultados):
+                    nome = comprovantes.nome_arquivo(dados) if tipo == 'comprovante' else Path(caminho).name
+                    pacote.write(caminho, nome)
+        else:
+            escritor = PdfWriter()
+            for caminho, paginas in resultados:
+                escritor.append(caminho)
+            escritor.write(destino)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    relatorio.encerrar()
+    return relatorio
@@ -0,0 +1,108 @@
+# pessoas/management/commands/benchmark_disponibilidade.py
+
+import random
+import time as cronometro
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from pessoas.agenda_bits import AgendaDia
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o cálculo de horários livres com o loop atual (set de time) '
+        'e com o motor de máscaras de bits, sobre dados sintéticos em memória.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profissionais', type=int, default=1000)
+        parser.add_argument('--dias', type=int, default=90)
+        parser.add_argument('--ocupacao', type=float, default=0.4, help='Fração de slots ocupados.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        total_profissionais = options['profissionais']
+        total_dias = options['dias']
+        inicio = date.today()
+        horario = SimpleNamespace(hora_inicio=time(8, 0), hora_fim=time(18, 0), intervalo_minutos=30)
+        grade = [
+            (datetime.combine(date.min, horario.hora_inicio) + timedelta(minutes=30 * i)).time()
+            for i in range(20)
+        ]
+
+        # Consultas ocupadas por (profissional, dia), como datetimes vindos do banco
+        ocupadas = {}
+        for p in range(total_profissionais):
+            for d in range(total_dias):
+                dia = inicio + timedelta(days=d)
+                ocupadas[(p, d)] = [
+                    datetime.combine(dia, hora) for hora in grade if rng.random() < options['ocupacao']
+                ]
+
+        self.stdout.write(
+            f'{total_profissionais} profissionais x {total_dias} dias '
+            f'({total_profissionais * total_dias} agendas, {len(grade)} slots/dia)'
+        )
+
+        # Loop atual: gera a grade com datetime e testa pertinência em um set de time
+        t0 = cronometro.perf_counter()
+        total_loop = 0
+        for (p, d), consultas in ocupadas.items():
+            dia = inicio + timedelta(days=d)
+            horarios_ocupados = {dt.time() for dt in consultas}
+            atual = datetime.combine(dia, horario.hora_inicio)
+            fim = datetime.combine(dia, horario.hora_fim)
+            intervalo = timedelta(minutes=horario.intervalo_minutos)
+            livres = []
+            while atual < fim:
+                if atual.time() not in horarios_ocupados:
+                    livres.append(atual.time())
+                atual += intervalo
+            total_loop += len(livres)
+        tempo_loop = cronometro.perf_counter() - t0
+
+        # Motor de bits: monta a máscara do dia e extrai os livres
+        modelo = AgendaDia.dos_horarios([horario])
+        t0 = cronometro.perf_counter()
+        agendas = {}
+        for chave, consultas in ocupadas.items():
+            agenda = modelo.copia()
+            agenda.ocupar_todos([dt.time() for dt in consultas])
+            agendas[chave] = agenda
+        tempo_montagem = cronometro.perf_counter() - t0
+
+        t0 = cronometro.perf_counter()
+        total_bits = 0
+        for agenda in agendas.values():
+            total_bits += len(agenda.horarios_livres())
+        tempo_livres = cronometro.perf_counter() - t0
+
+        t0 = cronometro.perf_counter()
+        for agenda in agendas.values():
+            agenda.primeiro_livre()
+        tempo_primeiro = cronometro.perf_counter() - t0
+
+        manha = modelo.mascara_restricoes([(time(8, 0), time(12, 0))])
+        t0 = cronometro.perf_counter()
+        for agenda in agendas.values():
+            agenda.total_livres(manha)
+        tempo_intersecao = cronometro.perf_counter() - t0
+
+        if total_loop != total_bits:
+            self.stderr.write(self.style.ERROR(f'Resultados divergentes: {total_loop} != {total_bits}'))
+            return
+
+        linhas = [
+            ('Loop atual (livres)', tempo_loop),
+            ('Bits: montagem das máscaras', tempo_montagem),
+            ('Bits: livres', tempo_livres),
+            ('Bits: primeiro livre', tempo_primeiro),
+            ('Bits: interseção com janela da manhã', tempo_intersecao),
+        ]
+        for nome, tempo in linhas:
+            self.stdout.write(f'  {nome:<40} {tempo * 1000:10.1f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_bits} horários livres; livres via bits {tempo_loop / tempo_livres:.1f}x mais rápido '
+            f'que o loop (ou {tempo_loop / (tempo_montagem + tempo_livres):.1f}x contando a montagem).'
+        ))
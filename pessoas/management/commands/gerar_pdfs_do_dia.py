@@ -0,0 +1,50 @@
+# pessoas/management/commands/gerar_pdfs_do_dia.py
+
+from datetime import datetime
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from pessoas import lote_pdf
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera em paralelo a agenda de cada médico e os comprovantes das consultas '
+        'de um dia (ou de um médico) em um único PDF para impressão ou em um ZIP.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Dia no formato AAAA-MM-DD (padrão: hoje).')
+        parser.add_argument('--medico', help='Usuário do médico; sem ele, todos os médicos.')
+        parser.add_argument('--formato', choices=lote_pdf.FORMATOS, default='pdf')
+        parser.add_argument('--saida', help='Arquivo gerado (padrão: pdfs_AAAAMMDD.<formato>).')
+        parser.add_argument(
+            '--processos',
+            type=int,
+            help='Processos desenhando em paralelo (padrão: um por núcleo).'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            data = datetime.strptime(options['data'], '%Y-%m-%d').date() if options['data'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('Data inválida; use AAAA-MM-DD.')
+        medico = None
+        if options['medico']:
+            medico = User.objects.filter(username=options['medico']).first()
+            if medico is None:
+                raise CommandError(f'Médico "{options["medico"]}" não encontrado.')
+
+        consultas = lote_pdf.consultas(data, medico)
+        if not consultas.exists():
+            raise CommandError(f'Nenhuma consulta ativa em {data:%d/%m/%Y}.')
+
+        saida = options['saida'] or f'pdfs_{data:%Y%m%d}.{options["formato"]}'
+        with open(saida, 'wb') as destino:
+            relatorio = lote_pdf.gerar(consultas, destino, options['formato'], options['processos'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{relatorio.agendas} agendas e {relatorio.comprovantes} comprovantes '
+            f'({relatorio.paginas} páginas) em {relatorio.segundos:.1f}s com '
+            f'{relatorio.processos} processos ({relatorio.paginas_por_segundo} páginas/s): {saida}'
+        ))
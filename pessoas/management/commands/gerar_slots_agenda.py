@@ -0,0 +1,29 @@
+# pessoas/management/commands/gerar_slots_agenda.py
+
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pessoas.models import Profissional
+from pessoas import disponibilidade
+
+
+class Command(BaseCommand):
+    help = 'Pré-calcula o índice de slots (SlotAgenda) dos profissionais ativos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=disponibilidade.HORIZONTE_DIAS,
+            help='Quantidade de dias a partir de hoje (padrão: %(default)s).'
+        )
+
+    def handle(self, *args, **options):
+        inicio = timezone.localdate()
+        fim = inicio + timedelta(days=options['dias'] - 1)
+        total = 0
+        for profissional in Profissional.objects.filter(ativo=True):
+            total += len(disponibilidade.materializar_periodo(profissional, inicio, fim))
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} slots gerados de {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}.'
+        ))
@@ -0,0 +1,42 @@
+# pessoas/management/commands/gerar_variantes_imagens.py
+
+from django.core.management.base import BaseCommand
+from pessoas import imagens
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera as versões reduzidas (larguras fixas, formato original e WebP) das fotos '
+        'de profissionais e medicamentos que ainda não as têm, em lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=imagens.TAMANHO_LOTE,
+            help='Registros lidos do banco por vez (padrão: %(default)s).'
+        )
+
+    def handle(self, *args, **options):
+        for modelo in imagens.MODELOS:
+            geradas = falhas = 0
+            ultimo = 0
+            while True:
+                # Lotes por pk, para não segurar um cursor aberto enquanto processa
+                lote = list(imagens.com_foto(modelo).filter(pk__gt=ultimo)[:options['lote']])
+                if not lote:
+                    break
+                for instancia in lote:
+                    try:
+                        geradas += imagens.processar(instancia)
+                    except (OSError, ValueError) as erro:
+                        falhas += 1
+                        self.stdout.write(self.style.WARNING(
+                            f'{modelo.__name__} {instancia.pk} ({instancia.foto.name}): {erro}'
+                        ))
+                ultimo = lote[-1].pk
+                self.stdout.write(f'  {modelo._meta.verbose_name_plural}: até o id {ultimo}, {geradas} processadas')
+            self.stdout.write(self.style.SUCCESS(
+                f'{modelo._meta.verbose_name_plural}: {geradas} fotos processadas, {falhas} com erro.'
+            ))
@@ -0,0 +1,69 @@
+# pessoas/management/commands/importar_cadastros.py
+
+from django.core.management.base import BaseCommand, CommandError
+from pessoas import importacao
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa usuários (User + Perfil) ou profissionais de um CSV em lotes. '
+        'Registros já existentes são pulados, então rodar o mesmo arquivo de novo '
+        'retoma uma importação interrompida.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=importacao.TIPOS)
+        parser.add_argument('arquivo', help='Caminho do CSV (UTF-8, com cabeçalho).')
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=importacao.TAMANHO_LOTE,
+            help='Linhas gravadas por transação (padrão: %(default)s).'
+        )
+        parser.add_argument(
+            '--a-partir-da-linha',
+            type=int,
+            default=0,
+            help='Ignora as linhas do arquivo antes desta.'
+        )
+        parser.add_argument(
+            '--validar',
+            action='store_true',
+            help='Apenas valida o arquivo, sem gravar.'
+        )
+
+    def handle(self, *args, **options):
+        def progresso(relatorio):
+            self.stdout.write(
+                f'  linha {relatorio.ultima_linha}: {relatorio.criados} criados, '
+                f'{relatorio.existentes} já existentes'
+            )
+
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                relatorio = importacao.importar(
+                    arquivo,
+                    options['tipo'],
+                    lote=options['lote'],
+                    a_partir_da_linha=options['a_partir_da_linha'],
+                    so_validar=options['validar'],
+                    progresso=progresso,
+                )
+        except (OSError, UnicodeDecodeError, importacao.ErroImportacao) as erro:
+            raise CommandError(str(erro))
+
+        for linha, mensagem in relatorio.erros:
+            self.stdout.write(self.style.WARNING(f'Linha {linha}: {mensagem}'))
+        if relatorio.especialidades_novas:
+            acao = 'Serão criadas' if options['validar'] else 'Criadas'
+            self.stdout.write(f'{acao} as especialidades: {", ".join(relatorio.especialidades_novas)}')
+        if options['validar']:
+            self.stdout.write(self.style.SUCCESS(
+                f'{relatorio.lidas} linhas validadas, {len(relatorio.erros)} com erro.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'{relatorio.lidas} linhas em {relatorio.segundos:.1f}s '
+            f'({relatorio.linhas_por_segundo} linhas/s): {relatorio.criados} criados, '
+            f'{relatorio.existentes} já existentes, {len(relatorio.erros)} com erro.'
+        ))
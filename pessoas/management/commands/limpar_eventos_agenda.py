@@ -0,0 +1,20 @@
+# pessoas/management/commands/limpar_eventos_agenda.py
+
+from django.core.management.base import BaseCommand
+from pessoas import eventos_agenda
+
+
+class Command(BaseCommand):
+    help = 'Remove os eventos antigos da agenda ao vivo do painel do atendente.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=eventos_agenda.RETENCAO_DIAS,
+            help='Mantém os eventos dos últimos N dias (padrão: %(default)s).'
+        )
+
+    def handle(self, *args, **options):
+        removidos = eventos_agenda.limpar(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'{removidos} eventos da agenda removidos.'))
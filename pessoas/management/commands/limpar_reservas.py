@@ -0,0 +1,20 @@
+# pessoas/management/commands/limpar_reservas.py
+
+from django.core.management.base import BaseCommand
+from pessoas import reservas
+
+
+class Command(BaseCommand):
+    help = 'Remove em lotes as reservas temporárias de horário já vencidas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=reservas.TAMANHO_LOTE,
+            help='Quantidade de reservas apagadas por DELETE (padrão: %(default)s).'
+        )
+
+    def handle(self, *args, **options):
+        total = reservas.limpar_vencidas(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{total} reservas vencidas removidas.'))
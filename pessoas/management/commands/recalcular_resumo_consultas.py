@@ -0,0 +1,15 @@
+# pessoas/management/commands/recalcular_resumo_consultas.py
+
+from django.core.management.base import BaseCommand
+from pessoas import metricas
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstrói o resumo diário e os totais de consultas usados pelo dashboard. Necessário '
+        'apenas se consultas forem alteradas sem passar pelos signals (QuerySet.update, SQL).'
+    )
+
+    def handle(self, *args, **options):
+        total = metricas.recalcular()
+        self.stdout.write(self.style.SUCCESS(f'Resumo diário recalculado: {total} linhas.'))
@@ -0,0 +1,144 @@
+# pessoas/metricas.py
+
+"""
+Métricas do dashboard de consultas a partir de ResumoDiarioConsultas e
+TotaisConsultas.
+
+Cada criação, alteração ou exclusão de Consulta ajusta com F() a linha do
+seu dia/médico e a linha de totais do médico. Não há linha de total geral:
+ela seria gravada por todo agendamento, de qualquer médico, e viraria o
+ponto de disputa do caminho de agendamento. O dashboard soma as linhas de
+totais (uma por médico, independente do histórico) e lê a do médico com
+mais consultas agendadas; o total do dia soma o resumo, limitado às linhas
+daquele dia. recalcular()
+refaz o resumo a partir de Consulta em uma única consulta com agregação
+condicional (para a carga inicial ou depois de QuerySet.update()), inteiro
+ou só para alguns médicos e dias, e os totais a partir do resumo.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import Consulta, ResumoDiarioConsultas, TotaisConsultas
+
+# Coluna do resumo que conta cada status de consulta
+COLUNA_POR_STATUS = {
+    'agendada': 'agendadas',
+    'confirmada': 'confirmadas',
+    'concluida': 'concluidas',
+    'cancelada': 'canceladas',
+}
+
+COLUNAS = ('total', *COLUNA_POR_STATUS.values())
+
+
+def chave(consulta):
+    """(data local, medico_id, status) de uma consulta, como contado no resumo."""
+    data = consulta.data_hora.astimezone(timezone.get_current_timezone()).date()
+    return data, consulta.medico_id, consulta.status
+
+
+def _ajustar(data, medico_id, status, delta):
+    valores = {'total': F('total') + delta}
+    coluna = COLUNA_POR_STATUS.get(status)
+    if coluna:
+        valores[coluna] = F(coluna) + delta
+    atualizadas = ResumoDiarioConsultas.objects.filter(data=data, medico_id=medico_id).update(**valores)
+    # Sem linha para descontar: o resumo do médico já foi apagado junto com ele
+    if not atualizadas and delta > 0:
+        ResumoDiarioConsultas.objects.get_or_create(data=data, medico_id=medico_id)
+        ResumoDiarioConsultas.objects.filter(data=data, medico_id=medico_id).update(**valores)
+
+    totais = TotaisConsultas.objects.filter(medico_id=medico_id)
+    if not totais.update(**valores) and delta > 0:
+        # Primeira consulta do médico
+        TotaisConsultas.objects.get_or_create(medico_id=medico_id)
+        totais.update(**valores)
+
+
+def registrar(anterior, atual):
+    """
+    Move a contagem de uma consulta da chave `anterior` para a `atual`
+    (qualquer uma pode ser None, na criação e na exclusão).
+    """
+    if anterior == atual:
+        return
+    with transaction.atomic():
+        if anterior:
+            _ajustar(*anterior, -1)
+        if atual:
+            _ajustar(*atual, 1)
+
+
+def recalcular(medico_ids=None, datas=None):
+    """
+    Reconstrói o resumo a partir de Consulta e retorna quantas linhas gerou.
+    Com `medico_ids` e `datas`, refaz só as linhas desses médicos nessas
+    datas (depois de uma remoção em lote, por exemplo). Os totais dos
+    médicos afetados são refeitos em seguida.
+    """
+    contagens = {
+        coluna: Count('id', filter=Q(status=status))
+        for status, coluna in COLUNA_POR_STATUS.items()
+    }
+    linhas = Consulta.objects.annotate(
+        data=TruncDate('data_hora', tzinfo=timezone.get_current_timezone())
+    )
+    resumos = ResumoDiarioConsultas.objects.all()
+    if medico_ids is not None:
+        linhas = linhas.filter(medico_id__in=medico_ids, data__in=datas)
+        resumos = resumos.filter(medico_id__in=medico_ids, data__in=datas)
+    linhas = linhas.values('data', 'medico_id').annotate(total=Count('id'), **contagens).order_by()
+
+    with transaction.atomic():
+        resumos.delete()
+        resumos = ResumoDiarioConsultas.objects.bulk_create(
+            [ResumoDiarioConsultas(**linha) for linha in linhas],
+            batch_size=1000
+        )
+        _recalcular_totais(medico_ids)
+    return len(resumos)
+
+
+def _recalcular_totais(medico_ids=None):
+    """Refaz os totais dos médicos (todos, sem `medico_ids`) a partir do resumo diário."""
+    somas = {coluna: Sum(coluna, default=0) for coluna in COLUNAS}
+    linhas = ResumoDiarioConsultas.objects.values('medico_id').annotate(**somas).order_by()
+    totais = TotaisConsultas.objects.all()
+    if medico_ids is not None:
+        linhas = linhas.filter(medico_id__in=medico_ids)
+        totais = totais.filter(medico_id__in=medico_ids)
+    totais.delete()
+    TotaisConsultas.objects.bulk_create(
+        [TotaisConsultas(**linha) for linha in linhas],
+        batch_size=1000
+    )
+
+
+def resumo_geral(hoje=None):
+    """
+    Totais por status, somados nas linhas de TotaisConsultas (uma por
+    médico), e total do dia `hoje`, somado só nas linhas do resumo daquele dia.
+    """
+    hoje = hoje or timezone.localdate()
+    return {
+        **TotaisConsultas.objects.aggregate(
+            total_consultas=Sum('total', default=0),
+            total_agendadas=Sum('agendadas', default=0),
+            total_confirmadas=Sum('confirmadas', default=0),
+            total_concluidas=Sum('concluidas', default=0),
+            total_canceladas=Sum('canceladas', default=0),
+        ),
+        **ResumoDiarioConsultas.objects.filter(data=hoje).aggregate(total_hoje=Sum('total', default=0)),
+    }
+
+
+def medico_mais_ocupado():
+    """Médico com mais consultas agendadas ({'medico__first_name', 'medico__last_name', 'total'}) ou None."""
+    linha = TotaisConsultas.objects.filter(
+        agendadas__gt=0
+    ).order_by('-agendadas').values('medico__first_name', 'medico__last_name', 'agendadas').first()
+    if linha:
+        linha['total'] = linha.pop('agendadas')
+    return linha
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0008_comentariopaciente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('hora', models.TimeField()),
+                ('data_hora', models.DateTimeField()),
+                ('consulta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='pessoas.consulta')),
+                ('medico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='slots_agenda', to=settings.AUTH_USER_MODEL)),
+                ('profissional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='pessoas.profissional')),
+            ],
+            options={
+                'verbose_name': 'Slot de Agenda',
+                'verbose_name_plural': 'Slots de Agenda',
+                'ordering': ['profissional', 'data_hora'],
+                'indexes': [models.Index(fields=['profissional', 'data', 'hora'], name='slot_prof_data_idx'), models.Index(fields=['medico', 'data', 'hora'], name='slot_medico_data_idx')],
+                'unique_together': {('profissional', 'data_hora')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def cancelar_consultas_duplicadas(apps, schema_editor):
+    """
+    Antes de criar a restrição, cancela as consultas ativas em duplicidade
+    (mesmo médico e horário), mantendo a agendada primeiro.
+    """
+    Consulta = apps.get_model('pessoas', 'Consulta')
+    duplicados = (
+        Consulta.objects.filter(status__in=('agendada', 'confirmada'))
+        .values('medico_id', 'data_hora')
+        .annotate(total=models.Count('id'), primeira=models.Min('id'))
+        .filter(total__gt=1)
+    )
+    for grupo in duplicados:
+        Consulta.objects.filter(
+            medico_id=grupo['medico_id'],
+            data_hora=grupo['data_hora'],
+            status__in=('agendada', 'confirmada')
+        ).exclude(pk=grupo['primeira']).update(status='cancelada')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0009_slotagenda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancelar_consultas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='consulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ('agendada', 'confirmada'))), fields=('medico', 'data_hora'), name='consulta_unica_por_horario', violation_error_message='Este horário já está ocupado. Por favor, escolha outro.'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0010_consulta_unica_por_horario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_hora', models.DateTimeField()),
+                ('expira_em', models.DateTimeField(db_index=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_como_medico', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_horario', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reserva de Horário',
+                'verbose_name_plural': 'Reservas de Horário',
+                'unique_together': {('medico', 'data_hora')},
+            },
+        ),
+    ]
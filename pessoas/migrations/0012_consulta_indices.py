@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0011_reservahorario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['medico', 'data_hora', 'status'], name='consulta_medico_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['paciente', 'data_hora'], name='consulta_paciente_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['status', 'data_hora'], name='consulta_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['data_hora'], name='consulta_data_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def preencher_resumo(apps, schema_editor):
+    """Gera o resumo diário das consultas já existentes."""
+    Consulta = apps.get_model('pessoas', 'Consulta')
+    ResumoDiarioConsultas = apps.get_model('pessoas', 'ResumoDiarioConsultas')
+    colunas = {
+        'agendadas': 'agendada',
+        'confirmadas': 'confirmada',
+        'concluidas': 'concluida',
+        'canceladas': 'cancelada',
+    }
+    linhas = Consulta.objects.annotate(
+        data=TruncDate('data_hora', tzinfo=timezone.get_current_timezone())
+    ).values('data', 'medico_id').annotate(
+        total=models.Count('id'),
+        **{coluna: models.Count('id', filter=models.Q(status=status)) for coluna, status in colunas.items()}
+    ).order_by()
+    ResumoDiarioConsultas.objects.bulk_create(
+        [ResumoDiarioConsultas(**linha) for linha in linhas],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0012_consulta_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiarioConsultas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('agendadas', models.IntegerField(default=0)),
+                ('confirmadas', models.IntegerField(default=0)),
+                ('concluidas', models.IntegerField(default=0)),
+                ('canceladas', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário de Consultas',
+                'verbose_name_plural': 'Resumos Diários de Consultas',
+                'ordering': ['-data'],
+                'unique_together': {('data', 'medico')},
+            },
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
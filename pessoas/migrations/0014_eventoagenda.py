@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0013_resumodiarioconsultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(help_text='Dia da agenda afetado, no fuso local')),
+                ('tipo', models.CharField(choices=[('criada', 'Criada'), ('alterada', 'Alterada'), ('removida', 'Removida')], max_length=10)),
+                ('consulta_id', models.IntegerField()),
+                ('dados', models.JSONField(default=dict)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Evento da Agenda',
+                'verbose_name_plural': 'Eventos da Agenda',
+                'indexes': [models.Index(fields=['data', 'id'], name='evento_agenda_data_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:15
+
+import django.db.models.deletion
+import pessoas.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0014_eventoagenda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssinaturaCalendario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=pessoas.models.gerar_token_calendario, max_length=64, unique=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('paciente', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='assinatura_calendario', to=settings.AUTH_USER_MODEL)),
+                ('profissional', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='assinatura_calendario', to='pessoas.profissional')),
+            ],
+            options={
+                'verbose_name': 'Assinatura de Calendário',
+                'verbose_name_plural': 'Assinaturas de Calendário',
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('paciente__isnull', True), ('profissional__isnull', False)), models.Q(('paciente__isnull', False), ('profissional__isnull', True)), _connector='OR'), name='assinatura_calendario_um_dono')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0015_assinaturacalendario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicamento',
+            name='foto_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versões reduzidas da foto (pessoas/imagens.py)'),
+        ),
+        migrations.AddField(
+            model_name='profissional',
+            name='foto_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versões reduzidas da foto (pessoas/imagens.py)'),
+        ),
+    ]
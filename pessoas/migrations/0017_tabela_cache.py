@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:40
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def criar_tabela_cache(apps, schema_editor):
+    # Tabela do DatabaseCache (settings.CACHES), compartilhada pelos workers
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+def remover_tabela_cache(apps, schema_editor):
+    schema_editor.execute('DROP TABLE IF EXISTS simed_cache')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0016_foto_variantes'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_tabela_cache, remover_tabela_cache),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def preencher_totais(apps, schema_editor):
+    """Gera os totais por médico e o geral a partir do resumo diário."""
+    ResumoDiarioConsultas = apps.get_model('pessoas', 'ResumoDiarioConsultas')
+    TotaisConsultas = apps.get_model('pessoas', 'TotaisConsultas')
+    somas = {
+        coluna: models.Sum(coluna, default=0)
+        for coluna in ('total', 'agendadas', 'confirmadas', 'concluidas', 'canceladas')
+    }
+    linhas = ResumoDiarioConsultas.objects.values('medico_id').annotate(**somas).order_by()
+    TotaisConsultas.objects.bulk_create(
+        [TotaisConsultas(**linha) for linha in linhas],
+        batch_size=1000
+    )
+    TotaisConsultas.objects.create(medico=None, **ResumoDiarioConsultas.objects.aggregate(**somas))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0017_tabela_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TotaisConsultas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('agendadas', models.IntegerField(default=0)),
+                ('confirmadas', models.IntegerField(default=0)),
+                ('concluidas', models.IntegerField(default=0)),
+                ('canceladas', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('medico', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='totais_consultas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Totais de Consultas',
+                'verbose_name_plural': 'Totais de Consultas',
+                'indexes': [models.Index(fields=['-agendadas'], name='totais_agendadas_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0018_totaisconsultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=150, unique=True)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de Cache',
+                'verbose_name_plural': 'Contadores de Cache',
+            },
+        ),
+    ]
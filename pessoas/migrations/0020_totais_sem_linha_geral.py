@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def apagar_linha_geral(apps, schema_editor):
+    """O total geral passa a ser a soma das linhas dos médicos."""
+    TotaisConsultas = apps.get_model('pessoas', 'TotaisConsultas')
+    TotaisConsultas.objects.filter(medico=None).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0019_contadorcache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(apagar_linha_geral, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='totaisconsultas',
+            name='medico',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='totais_consultas', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,7 +1,9 @@
 # pessoas/models.py
 
-from datetime import timedelta
+import secrets
+from datetime import datetime, time, timedelta
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 
@@ -83,6 +85,7 @@ class Profissional(models.Model):
     especialidade = models.ForeignKey(Especialidade, on_delete=models.SET_NULL, null=True, blank=True)
     crm = models.CharField(max_length=20, blank=True, null=True, verbose_name='CRM/CRO')
     foto = models.ImageField(upload_to='profissionais/', blank=True, null=True)
+    foto_variantes = models.JSONField(default=dict, blank=True, editable=False, help_text='Versões reduzidas da foto (pessoas/imagens.py)')
     biografia = models.TextField(blank=True, null=True, help_text='Descrição do profissional')
     formacao = models.TextField(blank=True, null=True, help_text='Formação acadêmica')
     certificacoes = models.TextField(blank=True, null=True, help_text='Certificações e especializações')
@@ -109,6 +112,36 @@ class Profissional(models.Model):
         ordering = ['nome']
 
 
+# Status em que a consulta ocupa o horário do médico
+STATUS_ATIVOS = ('agendada', 'confirmada')
+
+
+class ConsultaQuerySet(models.QuerySet):
+    """
+    Filtros de período sobre data_hora escritos como intervalos
+    (data_hora >= início AND data_hora < fim), que usam os índices
+    compostos; data_hora__date envolve a coluna em uma função e não usa.
+    """
+
+    def ativas(self):
+        return self.filter(status__in=STATUS_ATIVOS)
+
+    def entre(self, inicio, fim):
+        """Consultas das datas inicio a fim (inclusive), no fuso local."""
+        return self.filter(
+            data_hora__gte=timezone.make_aware(datetime.combine(inicio, time.min)),
+            data_hora__lt=timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min)),
+        )
+
+    def do_dia(self, data):
+        return self.entre(data, data)
+
+    def da_semana(self, data):
+        """Consultas da semana (segunda a domingo) que contém a data."""
+        segunda = data - timedelta(days=data.weekday())
+        return self.entre(segunda, segunda + timedelta(days=6))
+
+
 class Consulta(models.Model):
     """
     Modelo para armazenar as consultas agendadas
@@ -129,6 +162,8 @@ class Consulta(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
+    objects = ConsultaQuerySet.as_manager()
+
     def __str__(self):
         return f'Consulta de {self.paciente.username} com Dr(a). {self.medico.last_name} em {self.data_hora.strftime("%d/%m/%Y %H:%M")}'
 
@@ -137,7 +172,8 @@ class Consulta(models.Model):
         if self.profissional:
             return self.profissional
         try:
-            return Profissional.objects.get(usuario=self.medico)
+            # Usa o relacionamento reverso, já carregado quando a view faz select_related
+            return self.medico.profissional
         except Profissional.DoesNotExist:
             return None
 
@@ -167,6 +203,21 @@ class Consulta(models.Model):
         ordering = ['-data_hora']
         verbose_name = 'Consulta'
         verbose_name_plural = 'Consultas'
+        constraints = [
+            # Garante no banco que um médico não tenha duas consultas ativas no mesmo horário
+            models.UniqueConstraint(
+                fields=['medico', 'data_hora'],
+                condition=models.Q(status__in=STATUS_ATIVOS),
+                name='consulta_unica_por_horario',
+                violation_error_message='Este horário já está ocupado. Por favor, escolha outro.',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['medico', 'data_hora', 'status'], name='consulta_medico_data_idx'),
+            models.Index(fields=['paciente', 'data_hora'], name='consulta_paciente_data_idx'),
+            models.Index(fields=['status', 'data_hora'], name='consulta_status_data_idx'),
+            models.Index(fields=['data_hora'], name='consulta_data_idx'),
+        ]
 
 
 class HorarioTrabalho(models.Model):
@@ -200,6 +251,156 @@ class HorarioTrabalho(models.Model):
         unique_together = ['profissional', 'dia_semana', 'hora_inicio']
 
 
+class SlotAgenda(models.Model):
+    """
+    Índice materializado dos horários de atendimento de cada profissional.
+    Gerado a partir de HorarioTrabalho e atualizado a cada consulta
+    criada, cancelada ou remarcada (ver pessoas/disponibilidade.py)
+    """
+    profissional = models.ForeignKey(Profissional, on_delete=models.CASCADE, related_name='slots')
+    medico = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='slots_agenda')
+    data = models.DateField()
+    hora = models.TimeField()
+    data_hora = models.DateTimeField()
+    consulta = models.ForeignKey(Consulta, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    def __str__(self):
+        situacao = 'ocupado' if self.consulta_id else 'livre'
+        return f'{self.profissional.nome} - {self.data_hora.strftime("%d/%m/%Y %H:%M")} ({situacao})'
+
+    @property
+    def ocupado(self):
+        return self.consulta_id is not None
+
+    class Meta:
+        verbose_name = 'Slot de Agenda'
+        verbose_name_plural = 'Slots de Agenda'
+        ordering = ['profissional', 'data_hora']
+        unique_together = ['profissional', 'data_hora']
+        indexes = [
+            models.Index(fields=['profissional', 'data', 'hora'], name='slot_prof_data_idx'),
+            models.Index(fields=['medico', 'data', 'hora'], name='slot_medico_data_idx'),
+        ]
+
+
+class ReservaHorario(models.Model):
+    """
+    Reserva temporária de um horário enquanto o paciente (ou o atendente)
+    preenche o agendamento. Reservas vencidas são ignoradas e removidas em
+    lote pelo comando limpar_reservas (ver pessoas/reservas.py)
+    """
+    medico = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_como_medico')
+    data_hora = models.DateTimeField()
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_horario')
+    expira_em = models.DateTimeField(db_index=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Reserva de {self.usuario.username} em {self.data_hora.strftime("%d/%m/%Y %H:%M")} até {self.expira_em.strftime("%H:%M")}'
+
+    class Meta:
+        verbose_name = 'Reserva de Horário'
+        verbose_name_plural = 'Reservas de Horário'
+        unique_together = ['medico', 'data_hora']
+
+
+class ResumoDiarioConsultas(models.Model):
+    """
+    Contagem de consultas por dia (no fuso local), médico e status, mantida
+    pelos signals de Consulta. O dashboard de consultas soma esta tabela em
+    vez de percorrer todas as consultas (ver pessoas/metricas.py)
+    """
+    data = models.DateField()
+    medico = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resumos_diarios')
+    agendadas = models.IntegerField(default=0)
+    confirmadas = models.IntegerField(default=0)
+    concluidas = models.IntegerField(default=0)
+    canceladas = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.data.strftime("%d/%m/%Y")} - {self.medico.username}: {self.total} consulta(s)'
+
+    class Meta:
+        verbose_name = 'Resumo Diário de Consultas'
+        verbose_name_plural = 'Resumos Diários de Consultas'
+        unique_together = ['data', 'medico']
+        ordering = ['-data']
+
+
+class TotaisConsultas(models.Model):
+    """
+    Totais acumulados de consultas por status, uma linha por médico,
+    ajustados pelos mesmos signals que mantêm ResumoDiarioConsultas. Os
+    cartões do dashboard somam uma linha por médico em vez do resumo
+    inteiro (ver pessoas/metricas.py)
+    """
+    medico = models.OneToOneField(User, on_delete=models.CASCADE, related_name='totais_consultas')
+    agendadas = models.IntegerField(default=0)
+    confirmadas = models.IntegerField(default=0)
+    concluidas = models.IntegerField(default=0)
+    canceladas = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.medico.username}: {self.total} consulta(s)'
+
+    class Meta:
+        verbose_name = 'Totais de Consultas'
+        verbose_name_plural = 'Totais de Consultas'
+        indexes = [
+            models.Index(fields=['-agendadas'], name='totais_agendadas_idx'),
+        ]
+
+
+class ContadorCache(models.Model):
+    """
+    Acertos e faltas dos caches de disponibilidade e de páginas, somados por
+    todos os workers. Cada processo conta em memória e grava aqui de tempos
+    em tempos (ver pessoas/contadores.py)
+    """
+    nome = models.CharField(max_length=150, unique=True)
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.nome}: {self.valor}'
+
+    class Meta:
+        verbose_name = 'Contador de Cache'
+        verbose_name_plural = 'Contadores de Cache'
+
+
+class EventoAgenda(models.Model):
+    """
+    Registro das mudanças de consultas (criação, alteração de status ou
+    horário, remoção), gravado pelos signals de Consulta na mesma transação.
+    O id crescente é o cursor do stream de eventos do painel do atendente;
+    registros antigos são removidos pelo comando limpar_eventos_agenda
+    (ver pessoas/eventos_agenda.py)
+    """
+    TIPOS = (
+        ('criada', 'Criada'),
+        ('alterada', 'Alterada'),
+        ('removida', 'Removida'),
+    )
+
+    data = models.DateField(help_text='Dia da agenda afetado, no fuso local')
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    consulta_id = models.IntegerField()
+    dados = models.JSONField(default=dict)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Consulta {self.consulta_id} {self.tipo} ({self.data.strftime("%d/%m/%Y")})'
+
+    class Meta:
+        verbose_name = 'Evento da Agenda'
+        verbose_name_plural = 'Eventos da Agenda'
+        indexes = [
+            models.Index(fields=['data', 'id'], name='evento_agenda_data_idx'),
+        ]
+
+
 class Medicamento(models.Model):
     """
     Este modelo armazena o cadastro de medicamentos da clínica.
@@ -216,6 +417,7 @@ class Medicamento(models.Model):
         null=True, 
         help_text='Foto da embalagem do medicamento.'
     )
+    foto_variantes = models.JSONField(default=dict, blank=True, editable=False, help_text='Versões reduzidas da foto (pessoas/imagens.py)')
     valor = models.DecimalField(
         max_digits=10, 
         decimal_places=2, 
@@ -282,3 +484,41 @@ class ComentarioPaciente(models.Model):
         ordering = ['-criado_em']
         verbose_name = 'Comentario de Paciente'
         verbose_name_plural = 'Comentarios de Pacientes'
+
+
+def gerar_token_calendario():
+    return secrets.token_urlsafe(32)
+
+
+class AssinaturaCalendario(models.Model):
+    """
+    Token secreto do feed de calendário (webcal) de um profissional ou de um
+    paciente. Quem tem a URL vê a agenda, por isso o token pode ser trocado,
+    o que invalida a URL antiga (ver pessoas/calendario_ics.py)
+    """
+    token = models.CharField(max_length=64, unique=True, default=gerar_token_calendario)
+    profissional = models.OneToOneField(
+        Profissional, on_delete=models.CASCADE, null=True, blank=True, related_name='assinatura_calendario'
+    )
+    paciente = models.OneToOneField(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='assinatura_calendario'
+    )
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def renovar(self):
+        self.token = gerar_token_calendario()
+        self.save(update_fields=['token'])
+
+    def __str__(self):
+        return f'Calendário de {self.profissional or self.paciente}'
+
+    class Meta:
+        verbose_name = 'Assinatura de Calendário'
+        verbose_name_plural = 'Assinaturas de Calendário'
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(profissional__isnull=False, paciente__isnull=True)
+                | models.Q(profissional__isnull=True, paciente__isnull=False),
+                name='assinatura_calendario_um_dono',
+            ),
+        ]
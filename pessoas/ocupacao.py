@@ -0,0 +1,224 @@
+# pessoas/ocupacao.py
+
+"""
+Mapa de ocupação (profissional x dia da semana x faixa de horário).
+
+Para cada semana, a capacidade vem da grade de HorarioTrabalho e os
+horários ocupados das consultas ativas, lidas em uma única consulta pelo
+índice (data_hora). Cada profissional tem dois vetores planos de
+7 * FAIXAS_POR_DIA posições (capacidade e ocupados), indexados por
+dia_semana * FAIXAS_POR_DIA + faixa. O resultado de cada semana fica em
+cache; períodos de várias semanas somam os vetores das semanas.
+"""
+
+import uuid
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from .models import Consulta, HorarioTrabalho, Profissional
+from .disponibilidade import grades_semanais
+
+# Largura de cada faixa de horário do mapa
+PASSO_MINUTOS = 30
+FAIXAS_POR_DIA = 24 * 60 // PASSO_MINUTOS
+CELULAS = 7 * FAIXAS_POR_DIA
+
+# Maior período aceito pelo mapa, em semanas
+MAX_SEMANAS = 12
+
+TIMEOUT = 60 * 60
+CHAVE_VERSAO = 'ocupacao:versao'
+
+DIAS_SEMANA = ('Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom')
+
+
+def segunda_da_semana(data):
+    return data - timedelta(days=data.weekday())
+
+
+def _versao():
+    # A versão muda quando horários de trabalho ou profissionais mudam, o que
+    # afeta a capacidade de todas as semanas de uma vez. É um token aleatório
+    # sem expiração, como em pessoas/papeis.py: uma versão que expirasse e
+    # voltasse a um valor já usado traria de volta os mapas antigos
+    atual = cache.get(CHAVE_VERSAO)
+    if atual is None:
+        cache.add(CHAVE_VERSAO, uuid.uuid4().hex, None)
+        atual = cache.get(CHAVE_VERSAO)
+    return atual
+
+
+def _chave_semana(segunda):
+    return f'ocupacao:v{_versao()}:{segunda.isoformat()}'
+
+
+def _faixa(hora):
+    return (hora.hour * 60 + hora.minute) // PASSO_MINUTOS
+
+
+def calcular_semana(segunda):
+    """
+    Vetores de capacidade e ocupação da semana que começa na `segunda`:
+    {profissional_id: {'nome': str, 'capacidade': [int], 'ocupados': [int]}}.
+    """
+    profissionais = list(Profissional.objects.filter(ativo=True).only(
+        'id', 'nome', 'usuario_id'
+    ).prefetch_related(
+        Prefetch('horarios', queryset=HorarioTrabalho.objects.filter(ativo=True), to_attr='horarios_ativos')
+    ).order_by('nome'))
+
+    semana = {}
+    por_usuario = {}
+    for profissional in profissionais:
+        capacidade = [0] * CELULAS
+        for dia_semana, agenda in grades_semanais(profissional.horarios_ativos).items():
+            base = dia_semana * FAIXAS_POR_DIA
+            for hora in agenda.horarios():
+                capacidade[base + _faixa(hora)] += 1
+        semana[profissional.id] = {
+            'nome': profissional.nome,
+            'capacidade': capacidade,
+            'ocupados': [0] * CELULAS,
+        }
+        if profissional.usuario_id:
+            por_usuario[profissional.usuario_id] = profissional.id
+
+    fuso = timezone.get_current_timezone()
+    consultas = Consulta.objects.ativas().entre(segunda, segunda + timedelta(days=6)).values_list(
+        'profissional_id', 'medico_id', 'data_hora'
+    )
+    for profissional_id, medico_id, data_hora in consultas:
+        linha = semana.get(profissional_id) or semana.get(por_usuario.get(medico_id))
+        if linha is None:
+            continue
+        local = data_hora.astimezone(fuso)
+        linha['ocupados'][local.weekday() * FAIXAS_POR_DIA + _faixa(local)] += 1
+    return semana
+
+
+def semana(segunda):
+    """Vetores da semana, do cache quando possível."""
+    chave = _chave_semana(segunda)
+    dados = cache.get(chave)
+    if dados is None:
+        dados = calcular_semana(segunda)
+        cache.set(chave, dados, TIMEOUT)
+    return dados
+
+
+def mapa_ocupacao(inicio, semanas=1, dia_semana=None):
+    """
+    Soma as semanas a partir da semana de `inicio` e devolve o mapa pronto
+    para exibição, recortado às faixas em que há capacidade ou consultas.
+    O detalhe por profissional ('dias') traz pares [capacidade, ocupados] por
+    faixa de cada dia da semana, ou só de `dia_semana` se informado.
+    """
+    segunda = segunda_da_semana(inicio)
+    total = {}
+    for i in range(semanas):
+        for profissional_id, linha in semana(segunda + timedelta(weeks=i)).items():
+            acumulado = total.setdefault(profissional_id, {
+                'nome': linha['nome'],
+                'capacidade': [0] * CELULAS,
+                'ocupados': [0] * CELULAS,
+            })
+            acumulado['capacidade'] = [a + b for a, b in zip(acumulado['capacidade'], linha['capacidade'])]
+            acumulado['ocupados'] = [a + b for a, b in zip(acumulado['ocupados'], linha['ocupados'])]
+
+    # Faixas do dia usadas por algum profissional em algum dia
+    usadas = [False] * FAIXAS_POR_DIA
+    for linha in total.values():
+        for celula in range(CELULAS):
+            if linha['capacidade'][celula] or linha['ocupados'][celula]:
+                usadas[celula % FAIXAS_POR_DIA] = True
+    faixas = [f for f in range(FAIXAS_POR_DIA) if usadas[f]]
+    if faixas:
+        faixas = list(range(faixas[0], faixas[-1] + 1))
+
+    profissionais = []
+    capacidade_dia = [[0] * len(faixas) for _ in range(7)]
+    ocupados_dia = [[0] * len(faixas) for _ in range(7)]
+    for profissional_id, linha in total.items():
+        capacidade, ocupados = linha['capacidade'], linha['ocupados']
+        dias = {}
+        for dia in range(7):
+            base = dia * FAIXAS_POR_DIA
+            celulas = []
+            for j, faixa in enumerate(faixas):
+                cap, ocu = capacidade[base + faixa], ocupados[base + faixa]
+                capacidade_dia[dia][j] += cap
+                ocupados_dia[dia][j] += ocu
+                celulas.append([cap, ocu])
+            if dia_semana is None or dia == dia_semana:
+                dias[dia] = celulas
+        soma_capacidade, soma_ocupados = sum(capacidade), sum(ocupados)
+        profissionais.append({
+            'id': profissional_id,
+            'nome': linha['nome'],
+            'capacidade': soma_capacidade,
+            'ocupados': soma_ocupados,
+            'taxa': _taxa(soma_ocupados, soma_capacidade),
+            'dias': dias,
+        })
+
+    capacidade_total = sum(p['capacidade'] for p in profissionais)
+    ocupados_total = sum(p['ocupados'] for p in profissionais)
+    return {
+        'inicio': segunda.isoformat(),
+        'fim': (segunda + timedelta(weeks=semanas, days=-1)).isoformat(),
+        'semanas': semanas,
+        'passo_minutos': PASSO_MINUTOS,
+        'faixas': [f'{f * PASSO_MINUTOS // 60:02d}:{f * PASSO_MINUTOS % 60:02d}' for f in faixas],
+        'dias_semana': list(DIAS_SEMANA),
+        'capacidade': capacidade_total,
+        'ocupados': ocupados_total,
+        'taxa': _taxa(ocupados_total, capacidade_total),
+        'clinica': [
+            [_taxa(ocu, cap) for cap, ocu in zip(capacidade_dia[d], ocupados_dia[d])]
+            for d in range(7)
+        ],
+        'profissionais': profissionais,
+    }
+
+
+def _taxa(ocupados, capacidade):
+    return round(ocupados / capacidade, 3) if capacidade else None
+
+
+def invalidar_semana(data):
+    """Descarta o mapa em cache da semana que contém a data, após o commit."""
+    chave = _chave_semana(segunda_da_semana(data))
+    transaction.on_commit(lambda: cache.delete(chave))
+
+
+def invalidar_tudo():
+    """Descarta todas as semanas (mudança de capacidade) trocando a versão das chaves."""
+    transaction.on_commit(lambda: cache.set(CHAVE_VERSAO, uuid.uuid4().hex, None))
+
+
+def nivel(taxa):
+    """Faixa de cor (0 a 5) de uma taxa de ocupação; None sem capacidade."""
+    if taxa is None:
+        return None
+    return min(5, int(taxa * 5 + 0.999)) if taxa > 0 else 0
+
+
+def linhas_do_dia(mapa, dia_semana):
+    """
+    Linhas prontas para o template: uma para a clínica inteira e uma por
+    profissional, com (capacidade, ocupados, taxa, nível) por faixa.
+    """
+    linhas = []
+    for profissional in mapa['profissionais']:
+        celulas = []
+        for capacidade, ocupados in profissional['dias'].get(dia_semana, []):
+            taxa = _taxa(ocupados, capacidade)
+            celulas.append((capacidade, ocupados, taxa, nivel(taxa)))
+        linhas.append({
+            'nome': profissional['nome'],
+            'taxa': profissional['taxa'],
+            'celulas': celulas,
+        })
+    return linhas
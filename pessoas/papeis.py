@@ -0,0 +1,78 @@
+# pessoas/papeis.py
+
+"""
+Papel (admin, médico, atendente, paciente) do usuário da requisição,
+resolvido uma vez e guardado na sessão.
+
+A sessão guarda o papel junto com a versão do usuário, que fica no cache
+compartilhado entre os workers (DatabaseCache em settings.CACHES): a versão
+apagada por um processo deixa de valer em todos.
+Enquanto a versão não muda, autorizar uma requisição custa uma query: a
+leitura da versão na tabela do cache, feita uma vez por requisição, no lugar
+do Perfil lido a cada get_user_role (nos decorators, nas views e nos
+templates). Os signals de Perfil e User
+apagam a versão após o commit (gerenciar_cargos, Perfil.save, mudança de
+is_staff); a versão nova não bate com a da sessão e o papel é recalculado
+na próxima requisição. Se o cache perder a chave, o efeito é o mesmo.
+"""
+
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+from .decorators import get_user_role
+
+CHAVE_SESSAO = 'papel'
+
+# Sem expiração: a versão só deixa de valer quando o papel muda
+TIMEOUT = None
+
+
+def _chave_versao(usuario_id):
+    return f'papel:versao:{usuario_id}'
+
+
+def versao(usuario_id):
+    """Versão atual do papel do usuário; cria uma se o cache não tiver."""
+    chave = _chave_versao(usuario_id)
+    atual = cache.get(chave)
+    if atual is None:
+        cache.add(chave, uuid.uuid4().hex, TIMEOUT)
+        atual = cache.get(chave)
+    return atual
+
+
+def invalidar(usuario_id):
+    """Descarta o papel guardado nas sessões do usuário após o commit."""
+    transaction.on_commit(lambda: cache.delete(_chave_versao(usuario_id)))
+
+
+def resolver(request):
+    """
+    Papel do usuário da requisição. Usa o da sessão se a versão ainda for a
+    atual; senão calcula e guarda de novo. Anônimos não passam pela sessão.
+    """
+    usuario = request.user
+    if not usuario.is_authenticated:
+        return get_user_role(usuario)
+    atual = versao(usuario.pk)
+    guardado = request.session.get(CHAVE_SESSAO)
+    if guardado and guardado[0] == usuario.pk and guardado[1] == atual:
+        return guardado[2]
+    papel = get_user_role(usuario)
+    request.session[CHAVE_SESSAO] = [usuario.pk, atual, papel]
+    return papel
+
+
+class PapelMiddleware:
+    """
+    Define request.papel, calculado só quando lido (como request.user).
+    Deve vir depois de SessionMiddleware e AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.papel = SimpleLazyObject(lambda: resolver(request))
+        return self.get_response(request)
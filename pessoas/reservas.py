@@ -0,0 +1,117 @@
+# pessoas/reservas.py
+
+"""
+Reservas temporárias de horário (ReservaHorario).
+
+Quando o usuário escolhe um horário no formulário de agendamento, o horário
+fica reservado para ele por alguns minutos: as respostas de disponibilidade
+dos demais usuários deixam de mostrá-lo e o agendamento por outra pessoa é
+recusado. Cada usuário mantém no máximo uma reserva; reservas vencidas são
+ignoradas nas leituras e apagadas em lote por limpar_vencidas(). Só se
+reservam horários futuros que estejam na grade do médico.
+"""
+
+from datetime import datetime, time, timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from . import disponibilidade
+from .models import Consulta, ReservaHorario
+
+# Tempo de validade de uma reserva
+TTL_MINUTOS = 5
+
+# Quantidade de reservas vencidas apagadas por DELETE
+TAMANHO_LOTE = 500
+
+
+class HorarioInvalido(ValueError):
+    """O horário já passou ou não está na grade do médico."""
+
+
+def reservar(usuario, medico_id, data_hora):
+    """
+    Reserva (ou renova) o horário para o usuário, liberando a reserva que ele
+    tinha em outro horário. Retorna a reserva, ou None se o horário já está
+    ocupado por uma consulta ou reservado por outra pessoa. Levanta
+    HorarioInvalido se o horário já passou ou não é um horário do médico.
+    """
+    agora = timezone.now()
+    if data_hora <= agora:
+        raise HorarioInvalido('Este horário já passou.')
+    local = timezone.localtime(data_hora)
+    if local.time() not in disponibilidade.horarios_do_medico(medico_id, local.date()):
+        raise HorarioInvalido('O médico não atende neste horário.')
+    if Consulta.objects.ativas().filter(medico_id=medico_id, data_hora=data_hora).exists():
+        return None
+
+    with transaction.atomic():
+        ReservaHorario.objects.filter(medico_id=medico_id, data_hora=data_hora, expira_em__lte=agora).delete()
+        ReservaHorario.objects.filter(usuario=usuario).exclude(medico_id=medico_id, data_hora=data_hora).delete()
+        try:
+            reserva, criada = ReservaHorario.objects.get_or_create(
+                medico_id=medico_id,
+                data_hora=data_hora,
+                defaults={'usuario': usuario, 'expira_em': agora + timedelta(minutes=TTL_MINUTOS)}
+            )
+        except IntegrityError:
+            return None
+        if reserva.usuario_id != usuario.id:
+            return None
+        if not criada:
+            reserva.expira_em = agora + timedelta(minutes=TTL_MINUTOS)
+            reserva.save(update_fields=['expira_em'])
+    return reserva
+
+
+def liberar(usuario, medico_id=None, data_hora=None):
+    """Remove as reservas do usuário (opcionalmente só a de um horário)."""
+    reservas = ReservaHorario.objects.filter(usuario=usuario)
+    if medico_id and data_hora:
+        reservas = reservas.filter(medico_id=medico_id, data_hora=data_hora)
+    reservas.delete()
+
+
+def reservas_ativas(exceto_usuario=None):
+    """Reservas ainda válidas, sem as do próprio usuário (se informado)."""
+    reservas = ReservaHorario.objects.filter(expira_em__gt=timezone.now())
+    if exceto_usuario is not None and exceto_usuario.is_authenticated:
+        reservas = reservas.exclude(usuario=exceto_usuario)
+    return reservas
+
+
+def esta_reservado(medico_id, data_hora, exceto_usuario=None):
+    return reservas_ativas(exceto_usuario).filter(medico_id=medico_id, data_hora=data_hora).exists()
+
+
+def horarios_reservados(medico_ids, inicio, fim, exceto_usuario=None):
+    """
+    Conjunto {(medico_id, data, hora)} (em horário local) dos horários
+    reservados por outros usuários entre as datas inicio e fim (inclusive).
+    """
+    medico_ids = [medico_id for medico_id in medico_ids if medico_id]
+    if not medico_ids:
+        return set()
+    data_inicio = timezone.make_aware(datetime.combine(inicio, time.min))
+    data_fim = timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min))
+    fuso = timezone.get_current_timezone()
+    reservados = set()
+    for medico_id, data_hora in reservas_ativas(exceto_usuario).filter(
+        medico_id__in=medico_ids,
+        data_hora__gte=data_inicio,
+        data_hora__lt=data_fim
+    ).values_list('medico_id', 'data_hora'):
+        local = data_hora.astimezone(fuso)
+        reservados.add((medico_id, local.date(), local.time()))
+    return reservados
+
+
+def limpar_vencidas(tamanho_lote=TAMANHO_LOTE):
+    """Apaga as reservas vencidas em lotes e retorna quantas foram removidas."""
+    total = 0
+    while True:
+        ids = list(ReservaHorario.objects.filter(
+            expira_em__lte=timezone.now()
+        ).values_list('id', flat=True)[:tamanho_lote])
+        if not ids:
+            return total
+        total += ReservaHorario.objects.filter(id__in=ids).delete()[0]
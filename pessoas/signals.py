@@ -1,10 +1,14 @@
 # pessoas/signals.py
 
-from django.db.models.signals import post_save
+from types import SimpleNamespace
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.utils import timezone
 from allauth.socialaccount.signals import pre_social_login
-from .models import Perfil
+from .models import ComentarioPaciente, Perfil, Consulta, Especialidade, HorarioTrabalho, Medicamento, Profissional
+from .agendamento import removendo_em_lote
+from . import cache_paginas, comprovantes, disponibilidade, imagens, cache_disponibilidade, diretorio, eventos_agenda, metricas, ocupacao, papeis
 
 @receiver(post_save, sender=User)
 def criar_perfil_usuario(sender, instance, created, **kwargs):
@@ -33,3 +37,214 @@ def vincular_conta_social(sender, request, sociallogin, **kwargs):
             sociallogin.connect(request, user)
     except User.DoesNotExist:
         pass
+
+# Campos lidos do banco antes de salvar, para saber de onde o registro saiu
+CAMPOS_ANTERIORES = {
+    Consulta: ('data_hora', 'medico_id', 'status'),
+    HorarioTrabalho: ('dia_semana',),
+    ComentarioPaciente: ('status',),
+}
+
+@receiver(pre_save, sender=Consulta)
+@receiver(pre_save, sender=HorarioTrabalho)
+@receiver(pre_save, sender=ComentarioPaciente)
+def guardar_estado_anterior(sender, instance, **kwargs):
+    """
+    Guarda os valores salvos no banco antes da alteração, para invalidar o
+    dia antigo e tirar a consulta do resumo antigo quando ela muda de dia,
+    de médico ou de status, e para saber se um comentário deixou de estar
+    aprovado.
+    """
+    anterior = None
+    if instance.pk:
+        anterior = sender.objects.filter(pk=instance.pk).values(*CAMPOS_ANTERIORES[sender]).first()
+    instance._estado_anterior = anterior
+
+@receiver(post_save, sender=Consulta)
+@receiver(post_delete, sender=Consulta)
+def invalidar_cache_consulta(sender, instance, **kwargs):
+    """
+    Apaga do cache de disponibilidade os dias afetados pela consulta.
+    """
+    if removendo_em_lote():
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    cache_disponibilidade.invalidar_consulta(instance, anterior and anterior['data_hora'])
+    for data_hora in {instance.data_hora, anterior and anterior['data_hora']} - {None}:
+        ocupacao.invalidar_semana(timezone.localtime(data_hora).date())
+
+@receiver(post_save, sender=Consulta)
+def atualizar_resumo_consulta(sender, instance, **kwargs):
+    """
+    Mantém o resumo diário do dashboard: move a consulta da contagem antiga
+    (dia/médico/status antes da alteração) para a atual.
+    """
+    anterior = getattr(instance, '_estado_anterior', None)
+    if anterior:
+        anterior = metricas.chave(SimpleNamespace(**anterior))
+    metricas.registrar(anterior, metricas.chave(instance))
+
+@receiver(post_delete, sender=Consulta)
+def remover_do_resumo_consulta(sender, instance, **kwargs):
+    """
+    Desconta a consulta excluída do resumo diário.
+    """
+    if removendo_em_lote():
+        return
+    metricas.registrar(metricas.chave(instance), None)
+
+@receiver(post_delete, sender=Consulta)
+def remover_comprovante_consulta(sender, instance, **kwargs):
+    """
+    Apaga do disco os PDFs de comprovante da consulta excluída.
+    """
+    if removendo_em_lote():
+        return
+    comprovantes.remover(instance.id)
+
+@receiver(post_save, sender=Consulta)
+def registrar_evento_consulta(sender, instance, **kwargs):
+    """
+    Grava no registro de eventos da agenda a criação, a mudança de status
+    ou a remarcação da consulta, para o stream do painel do atendente.
+    """
+    eventos_agenda.registrar(instance, getattr(instance, '_estado_anterior', None))
+
+@receiver(post_delete, sender=Consulta)
+def registrar_remocao_consulta(sender, instance, **kwargs):
+    if removendo_em_lote():
+        return
+    eventos_agenda.registrar_remocao(instance)
+
+def _dias_semana_afetados(horario):
+    """Dia da semana do horário e, se ele mudou de dia, o dia antigo."""
+    dias = {horario.dia_semana}
+    anterior = getattr(horario, '_estado_anterior', None)
+    if anterior:
+        dias.add(anterior['dia_semana'])
+    return dias
+
+@receiver(post_save, sender=HorarioTrabalho)
+@receiver(post_delete, sender=HorarioTrabalho)
+def invalidar_cache_horario(sender, instance, **kwargs):
+    """
+    Apaga do cache de disponibilidade as próximas datas do dia da semana
+    alterado (e do dia antigo, se o horário mudou de dia).
+    """
+    for dia in _dias_semana_afetados(instance):
+        cache_disponibilidade.invalidar_dia_semana(instance.profissional_id, dia)
+    ocupacao.invalidar_tudo()
+
+@receiver(post_save, sender=Consulta)
+def atualizar_slots_consulta(sender, instance, **kwargs):
+    """
+    Mantém o índice de slots em dia quando uma consulta é criada,
+    cancelada ou remarcada.
+    """
+    disponibilidade.sincronizar_consulta(instance)
+
+@receiver(post_save, sender=HorarioTrabalho)
+@receiver(post_delete, sender=HorarioTrabalho)
+def atualizar_slots_horario(sender, instance, **kwargs):
+    """
+    Descarta os slots futuros do dia da semana alterado para que sejam
+    gerados de novo com o horário de trabalho atual.
+    """
+    for dia in _dias_semana_afetados(instance):
+        disponibilidade.descartar_dia_semana(instance.profissional_id, dia)
+
+@receiver(post_save, sender=Profissional)
+def atualizar_slots_profissional(sender, instance, created, **kwargs):
+    """
+    Refaz os slots futuros se o usuário médico vinculado ao profissional mudou.
+    """
+    if not created:
+        disponibilidade.sincronizar_profissional(instance)
+        cache_disponibilidade.invalidar_profissional(instance)
+
+@receiver(post_save, sender=Profissional)
+@receiver(post_delete, sender=Profissional)
+def invalidar_mapa_ocupacao(sender, instance, **kwargs):
+    """
+    Profissionais novos, removidos ou desativados mudam as linhas do mapa de
+    ocupação de todas as semanas.
+    """
+    ocupacao.invalidar_tudo()
+
+# Campos de User que aparecem no diretório de médicos
+CAMPOS_DIRETORIO_USUARIO = {'username', 'last_name'}
+
+@receiver(post_save, sender=Profissional)
+@receiver(post_delete, sender=Profissional)
+@receiver(post_save, sender=Especialidade)
+@receiver(post_delete, sender=Especialidade)
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def invalidar_diretorio(sender, instance, **kwargs):
+    """
+    Apaga o diretório de médicos e profissionais em cache quando um
+    profissional, uma especialidade ou um perfil (tipo de usuário) muda.
+    """
+    diretorio.invalidar()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_diretorio_usuario(sender, instance, update_fields=None, **kwargs):
+    """
+    Nome de usuário e sobrenome aparecem nos cartões dos médicos; gravações
+    que não tocam esses campos (como o last_login a cada login) são ignoradas.
+    """
+    if update_fields is not None and not CAMPOS_DIRETORIO_USUARIO & set(update_fields):
+        return
+    diretorio.invalidar()
+
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def invalidar_papel(sender, instance, **kwargs):
+    """
+    O papel fica guardado na sessão; mudar o tipo de usuário (gerenciar_cargos,
+    admin, Perfil.save) descarta a cópia de todas as sessões do usuário.
+    """
+    papeis.invalidar(instance.usuario_id)
+
+# Campos de User que definem o papel (staff e superusuário são admin)
+CAMPOS_PAPEL_USUARIO = {'is_staff', 'is_superuser'}
+
+@receiver(post_save, sender=User)
+def invalidar_papel_usuario(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not CAMPOS_PAPEL_USUARIO & set(update_fields)):
+        return
+    papeis.invalidar(instance.pk)
+
+@receiver(post_save, sender=Profissional)
+@receiver(post_save, sender=Medicamento)
+def gerar_variantes_foto(sender, instance, **kwargs):
+    """
+    Foto nova: as versões reduzidas são geradas em segundo plano após o
+    commit. Foto removida: as versões antigas são apagadas.
+    """
+    if imagens.pendente(instance):
+        imagens.agendar(instance)
+    elif not instance.foto:
+        imagens.descartar(instance)
+
+@receiver(post_delete, sender=Profissional)
+@receiver(post_delete, sender=Medicamento)
+def remover_variantes_foto(sender, instance, **kwargs):
+    imagens.descartar(instance, excluida=True)
+
+@receiver(post_save, sender=Profissional)
+@receiver(post_delete, sender=Profissional)
+@receiver(post_save, sender=Especialidade)
+@receiver(post_delete, sender=Especialidade)
+def invalidar_paginas(sender, instance, **kwargs):
+    """As páginas públicas em cache mostram profissionais e especialidades."""
+    cache_paginas.invalidar()
+
+@receiver(post_save, sender=ComentarioPaciente)
+@receiver(post_delete, sender=ComentarioPaciente)
+def invalidar_paginas_comentario(sender, instance, **kwargs):
+    """A home mostra os comentários aprovados; pendentes e reprovados não mudam nada."""
+    anterior = getattr(instance, '_estado_anterior', None) or {}
+    if 'aprovado' in (instance.status, anterior.get('status')):
+        cache_paginas.invalidar()
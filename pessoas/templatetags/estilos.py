@@ -0,0 +1,63 @@
+# pessoas/templatetags/estilos.py
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from pessoas import estilos
+
+register = template.Library()
+
+
+class EstiloNode(template.Node):
+
+    def __init__(self, nome, critico, nodelist):
+        self.nome = nome
+        self.critico = critico
+        self.nodelist = nodelist
+
+    def render(self, context):
+        if not estilos.publicado(self.nome):
+            return self.nodelist.render(context)
+        url = static(estilos.arquivo(self.nome))
+        css_critico = estilos.critico(self.nome) if self.critico else ''
+        if not css_critico:
+            return format_html('<link rel="stylesheet" href="{}">', url)
+        return format_html(
+            '<style>{}</style>'
+            '<link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+            '<noscript><link rel="stylesheet" href="{}"></noscript>',
+            mark_safe(css_critico), url, url,
+        )
+
+
+@register.tag
+def estilo(parser, token):
+    """
+    CSS de uma página, servido como arquivo estático com hash depois do
+    collectstatic (pessoas/estilos.py) e inline antes dele. Com `critico`,
+    as regras usadas antes de {% dobra %} vão inline e o resto carrega sem
+    bloquear a renderização.
+
+        {% load estilos %}
+        {% estilo "home" critico %}
+        <style>
+        ...
+        </style>
+        {% endestilo %}
+    """
+    partes = token.split_contents()
+    if len(partes) not in (2, 3) or (len(partes) == 3 and partes[2] != 'critico'):
+        raise template.TemplateSyntaxError('Uso: {% estilo "nome" [critico] %}')
+    nome = partes[1]
+    if not (nome[0] == nome[-1] and nome[0] in '"\''):
+        raise template.TemplateSyntaxError('O nome do estilo deve ser uma string literal')
+    nodelist = parser.parse(('endestilo',))
+    parser.delete_first_token()
+    return EstiloNode(nome[1:-1], len(partes) == 3, nodelist)
+
+
+@register.simple_tag
+def dobra():
+    """Marca o fim do conteúdo visível sem rolar, para o CSS crítico de {% estilo %}."""
+    return ''
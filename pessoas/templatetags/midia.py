@@ -0,0 +1,91 @@
+# pessoas/templatetags/midia.py
+
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html
+from pessoas import imagens
+from pessoas.estaticos import nome_webp
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagem(objeto, largura=320, alt='', classe='', sizes=None, carregamento='lazy', largura_fixa=None):
+    """
+    <img> da foto de um Profissional ou Medicamento com srcset das versões
+    reduzidas (WebP em um <source>, formato original no <img>) e carregamento
+    lazy. `largura` é a largura exibida, em CSS px; `largura_fixa` vira o
+    atributo width do <img>. Sem variantes, usa a foto original.
+
+        {% load midia %}
+        {% imagem prof largura=320 alt=prof.nome classe="profissional-img" %}
+    """
+    foto = objeto.foto
+    if not foto:
+        return ''
+    width = format_html(' width="{}"', largura_fixa) if largura_fixa else ''
+    variantes = objeto.foto_variantes if not imagens.pendente(objeto) else None
+    principal = imagens.variante(variantes, largura)
+    if principal is None:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}"{} loading="{}" decoding="async">',
+            foto.url, alt, classe, width, carregamento,
+        )
+
+    url = foto.storage.url
+    itens = sorted(variantes['itens'], key=lambda item: item['largura'])
+    sizes = sizes or f'{largura}px'
+    # display: contents deixa o <img> no layout como se o <picture> não existisse
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}"{} loading="{}" decoding="async">'
+        '</picture>',
+        ', '.join(f'{url(item["webp"])} {item["largura"]}w' for item in itens),
+        sizes,
+        url(principal['arquivo']),
+        ', '.join(f'{url(item["arquivo"])} {item["largura"]}w' for item in itens),
+        sizes,
+        alt, classe, width, carregamento,
+    )
+
+
+def _webp_estatico(caminho):
+    """Nome da alternativa WebP da imagem estática, se o collectstatic a gerou."""
+    alternativa = nome_webp(caminho)
+    if alternativa in getattr(staticfiles_storage, 'hashed_files', {}):
+        return alternativa
+    return None
+
+
+@register.simple_tag
+def static_webp(caminho):
+    """
+    URL da versão WebP de uma imagem estática (pessoas/estaticos.py), ou da
+    original quando não há WebP. Para imagens de fundo no CSS:
+
+        background: image-set(url("{% static_webp 'images/x.png' %}") type("image/webp"), ...);
+    """
+    return static(_webp_estatico(caminho) or caminho)
+
+
+@register.simple_tag
+def imagem_estatica(caminho, alt='', classe='', carregamento='lazy'):
+    """
+    <img> de uma imagem estática, dentro de um <picture> com a alternativa
+    WebP quando o collectstatic a gerou.
+
+        {% imagem_estatica 'images/amil.png' alt="Amil" %}
+    """
+    img = format_html(
+        '<img src="{}" alt="{}"{} loading="{}" decoding="async">',
+        static(caminho), alt, format_html(' class="{}"', classe) if classe else '', carregamento,
+    )
+    alternativa = _webp_estatico(caminho)
+    if alternativa is None:
+        return img
+    return format_html(
+        '<picture style="display: contents"><source type="image/webp" srcset="{}">{}</picture>',
+        static(alternativa), img,
+    )
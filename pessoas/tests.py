@@ -1,3 +1,1645 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time as cronometro
+import unittest
+import zipfile
+from datetime import datetime, time, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import Image
+from pypdf import PdfReader
+
+from cadastro_pessoas import asgi
+
+from . import (
+    agenda_paginada, cache_disponibilidade, cache_paginas, calendario_ics, comprovantes, contadores, diretorio,
+    disponibilidade, estaticos, estilos, eventos_agenda, exportacao, imagens, importacao, lote_pdf, metricas, ocupacao,
+    papeis, reservas, urls, views,
+)
+from .agenda_bits import MotorDisponibilidade
+from .agendamento import agendar_consulta, remover_consultas, HorarioIndisponivel, MENSAGEM_HORARIO_OCUPADO
+from .decorators import get_user_role
+from .forms import AgendarConsultaForm
+from .models import (
+    AssinaturaCalendario, ComentarioPaciente, Consulta, ContadorCache, Especialidade, EventoAgenda, HorarioTrabalho,
+    Medicamento, Perfil, Profissional, ReservaHorario, SlotAgenda, STATUS_ATIVOS, TotaisConsultas,
+)
+
+
+logger = logging.getLogger(__name__)
+
+TABELA_CACHE = settings.CACHES['default']['LOCATION']
+
+
+def pasta_temporaria_de_comprovantes(teste):
+    """
+    Aponta COMPROVANTES_ROOT para uma pasta temporária, apagada no fim do
+    teste, para não gravar nem apagar PDFs da pasta real.
+    """
+    pasta = tempfile.TemporaryDirectory()
+    teste.addCleanup(pasta.cleanup)
+    configuracao = override_settings(COMPROVANTES_ROOT=pasta.name)
+    configuracao.enable()
+    teste.addCleanup(configuracao.disable)
+    return Path(pasta.name)
+
+
+class AgendamentoConcorrenteTests(TransactionTestCase):
+    """
+    Dispara centenas de agendamentos simultâneos disputando poucos horários e
+    verifica que cada horário fica com exatamente uma consulta ativa. A
+    vazão vai para o log de pessoas.tests e tem um piso em VAZAO_MINIMA.
+    """
+    TOTAL_REQUISICOES = 200
+    TOTAL_HORARIOS = 20
+    # Agendamentos (confirmados ou recusados) por segundo
+    VAZAO_MINIMA = 20
+
+    def setUp(self):
+        self.medico = User.objects.create_user('medico_stress')
+        self.pacientes = [
+            User.objects.create_user(f'paciente_stress_{i}')
+            for i in range(self.TOTAL_REQUISICOES)
+        ]
+        amanha = timezone.localdate() + timedelta(days=1)
+        self.horarios = [
+            timezone.make_aware(datetime.combine(amanha, time(8, 0)) + timedelta(minutes=15 * i))
+            for i in range(self.TOTAL_HORARIOS)
+        ]
+
+    def test_sem_agendamento_duplo_sob_concorrencia(self):
+        largada = threading.Barrier(self.TOTAL_REQUISICOES)
+        resultados = {'ok': 0, 'conflito': 0, 'erro': []}
+        trava = threading.Lock()
+
+        def agendar(indice):
+            try:
+                largada.wait()
+                agendar_consulta(
+                    paciente=self.pacientes[indice],
+                    medico=self.medico,
+                    data_hora=self.horarios[indice % self.TOTAL_HORARIOS]
+                )
+                chave = 'ok'
+            except HorarioIndisponivel:
+                chave = 'conflito'
+            except Exception as erro:
+                with trava:
+                    resultados['erro'].append(repr(erro))
+                return
+            finally:
+                connection.close()
+            with trava:
+                resultados[chave] += 1
+
+        threads = [threading.Thread(target=agendar, args=(i,)) for i in range(self.TOTAL_REQUISICOES)]
+        for thread in threads:
+            thread.start()
+        inicio = cronometro.perf_counter()
+        for thread in threads:
+            thread.join()
+        vazao = self.TOTAL_REQUISICOES / (cronometro.perf_counter() - inicio)
+        logger.info('%d agendamentos simultâneos: %.0f por segundo', self.TOTAL_REQUISICOES, vazao)
+
+        self.assertEqual(resultados['erro'], [])
+        self.assertGreaterEqual(vazao, self.VAZAO_MINIMA)
+        self.assertEqual(resultados['ok'], self.TOTAL_HORARIOS)
+        self.assertEqual(resultados['conflito'], self.TOTAL_REQUISICOES - self.TOTAL_HORARIOS)
+        for data_hora in self.horarios:
+            ativas = Consulta.objects.filter(medico=self.medico, data_hora=data_hora, status__in=STATUS_ATIVOS)
+            self.assertEqual(ativas.count(), 1)
+
+
+class AgendamentoTests(TestCase):
+
+    def setUp(self):
+        self.medico = User.objects.create_user('medico')
+        self.paciente = User.objects.create_user('paciente')
+        self.data_hora = timezone.make_aware(
+            datetime.combine(timezone.localdate() + timedelta(days=1), time(9, 0))
+        )
+
+    def test_conflito_vira_horario_indisponivel(self):
+        agendar_consulta(self.paciente, self.medico, self.data_hora)
+        with self.assertRaises(HorarioIndisponivel):
+            agendar_consulta(self.paciente, self.medico, self.data_hora)
+
+    def test_horario_cancelado_pode_ser_reagendado(self):
+        consulta = agendar_consulta(self.paciente, self.medico, self.data_hora)
+        consulta.status = 'cancelada'
+        consulta.save()
+        agendar_consulta(self.paciente, self.medico, self.data_hora)
+        self.assertEqual(Consulta.objects.filter(data_hora=self.data_hora).count(), 2)
+
+    def test_remocao_em_lote_mantem_resumo_e_eventos(self):
+        outro = User.objects.create_user('outro_medico')
+        agendar_consulta(self.paciente, self.medico, self.data_hora)
+        agendar_consulta(self.paciente, self.medico, self.data_hora + timedelta(days=1))
+        agendar_consulta(self.paciente, outro, self.data_hora)
+        self.assertEqual(remover_consultas(Consulta.objects.filter(medico=self.medico)), 2)
+
+        self.assertEqual(metricas.resumo_geral()['total_consultas'], 1)
+        self.assertEqual(EventoAgenda.objects.filter(tipo='removida').count(), 2)
+
+    def test_totais_acompanham_os_signals(self):
+        outro = User.objects.create_user('outro_medico', first_name='Outro')
+        consulta = agendar_consulta(self.paciente, self.medico, self.data_hora)
+        agendar_consulta(self.paciente, outro, self.data_hora)
+        agendar_consulta(self.paciente, outro, self.data_hora + timedelta(hours=1))
+        consulta.status = 'confirmada'
+        consulta.save()
+        Consulta.objects.filter(medico=outro).first().delete()
+
+        with self.assertNumQueries(2):
+            resumo = metricas.resumo_geral()
+        with self.assertNumQueries(1):
+            mais_ocupado = metricas.medico_mais_ocupado()
+        self.assertEqual(resumo['total_consultas'], 2)
+        self.assertEqual(resumo['total_confirmadas'], 1)
+        self.assertEqual(mais_ocupado['medico__first_name'], 'Outro')
+        # Só as linhas dos dois médicos: nenhum agendamento grava um total geral
+        self.assertEqual(TotaisConsultas.objects.count(), 2)
+
+        metricas.recalcular()
+        self.assertEqual(metricas.resumo_geral(), resumo)
+        self.assertEqual(metricas.medico_mais_ocupado(), mais_ocupado)
+
+
+class AgendaBitsTests(TestCase):
+    """
+    O motor de máscaras de bits (agenda_bits) responde os mesmos horários
+    livres que o índice SlotAgenda, inclusive com restrições do paciente.
+    """
+
+    def setUp(self):
+        self.amanha = timezone.localdate() + timedelta(days=1)
+        self.medico = User.objects.create_user('medico_bits')
+        self.paciente = User.objects.create_user('paciente_bits')
+        self.profissional = Profissional.objects.create(nome='Dr. Bits', slug='dr-bits', usuario=self.medico)
+        # Blocos com intervalos diferentes dividem a mesma grade de 10 minutos
+        for inicio, fim, intervalo in ((time(8, 0), time(10, 0), 30), (time(14, 0), time(15, 0), 20)):
+            HorarioTrabalho.objects.create(
+                profissional=self.profissional, dia_semana=self.amanha.weekday(),
+                hora_inicio=inicio, hora_fim=fim, intervalo_minutos=intervalo,
+            )
+        for hora, status in ((time(8, 30), 'agendada'), (time(14, 20), 'confirmada'), (time(9, 0), 'cancelada')):
+            Consulta.objects.create(
+                paciente=self.paciente, medico=self.medico, status=status,
+                data_hora=timezone.make_aware(datetime.combine(self.amanha, hora)),
+            )
+
+    def motor(self):
+        return MotorDisponibilidade.carregar([self.profissional], self.amanha, self.amanha + timedelta(days=6))
+
+    def test_livres_iguais_aos_do_indice_de_slots(self):
+        motor = self.motor()
+        for dias in range(7):
+            data = self.amanha + timedelta(days=dias)
+            with self.subTest(data=data):
+                self.assertEqual(
+                    motor.horarios_livres(self.profissional.id, data),
+                    disponibilidade.horarios_livres(self.profissional, data),
+                )
+        self.assertEqual(
+            motor.horarios_livres(self.profissional.id, self.amanha),
+            [time(8, 0), time(9, 0), time(9, 30), time(14, 0), time(14, 40)],
+        )
+
+    def test_restricoes_do_paciente(self):
+        janelas = [(time(8, 15), time(9, 15)), (time(14, 10), time(16, 0))]
+        esperados = [
+            hora for hora in disponibilidade.horarios_livres(self.profissional, self.amanha)
+            if any(de <= hora < ate for de, ate in janelas)
+        ]
+        motor = self.motor()
+        self.assertEqual(motor.horarios_livres(self.profissional.id, self.amanha, janelas), esperados)
+        self.assertEqual(esperados, [time(9, 0), time(14, 40)])
+        self.assertEqual(motor.primeiro_livre(self.profissional.id, self.amanha, janelas), time(9, 0))
+        self.assertEqual(motor.primeiro_livre(self.profissional.id, self.amanha), time(8, 0))
+
+    def test_nova_consulta_ocupa_nos_dois(self):
+        Consulta.objects.create(
+            paciente=self.paciente, medico=self.medico,
+            data_hora=timezone.make_aware(datetime.combine(self.amanha, time(8, 0))),
+        )
+        livres = disponibilidade.horarios_livres(self.profissional, self.amanha)
+        self.assertEqual(self.motor().horarios_livres(self.profissional.id, self.amanha), livres)
+        self.assertNotIn(time(8, 0), livres)
+
+
+class GradeUnificadaTests(TestCase):
+    """
+    Formulários, AJAX e validação oferecem a mesma grade, vinda de
+    HorarioTrabalho (ou da GRADE_PADRAO), e tratam confirmadas como ocupadas.
+    """
+
+    def setUp(self):
+        self.amanha = timezone.localdate() + timedelta(days=1)
+        self.medico = User.objects.create_user('medico_grade')
+        self.medico.perfil.tipo_usuario = 'medico'
+        self.medico.perfil.save()
+        self.profissional = Profissional.objects.create(nome='Dr. Grade', slug='dr-grade', usuario=self.medico)
+        HorarioTrabalho.objects.create(
+            profissional=self.profissional, dia_semana=self.amanha.weekday(),
+            hora_inicio=time(9, 0), hora_fim=time(11, 0), intervalo_minutos=40,
+        )
+        self.paciente = User.objects.create_user('paciente_grade')
+        self.client.force_login(self.paciente)
+
+    def formulario(self, hora=''):
+        return AgendarConsultaForm(data={'medico': self.medico.id, 'data': self.amanha.isoformat(), 'hora': hora})
+
+    def horas_ajax(self):
+        resposta = self.client.get(
+            reverse('horarios_profissional_ajax', args=[self.profissional.id]), {'data': self.amanha.isoformat()}
+        )
+        return [horario['value'] for horario in resposta.json()['horarios']]
+
+    def test_formulario_e_ajax_oferecem_a_grade(self):
+        opcoes = [valor for valor, _ in self.formulario().fields['hora'].choices]
+        self.assertEqual(opcoes, ['', '09:00', '09:40', '10:20'])
+        self.assertEqual(self.horas_ajax(), opcoes[1:])
+        self.assertFalse(self.formulario('09:30').is_valid())
+
+    def test_confirmada_ocupa_o_horario(self):
+        Consulta.objects.create(
+            paciente=self.paciente, medico=self.medico, status='confirmada',
+            data_hora=timezone.make_aware(datetime.combine(self.amanha, time(9, 40))),
+        )
+        self.assertEqual(self.horas_ajax(), ['09:00', '10:20'])
+        self.assertEqual(
+            disponibilidade.horarios_livres_do_medico(self.medico.id, self.amanha), [time(9, 0), time(10, 20)]
+        )
+        formulario = self.formulario('09:40')
+        self.assertFalse(formulario.is_valid())
+        self.assertIn(MENSAGEM_HORARIO_OCUPADO, formulario.non_field_errors())
+
+    def test_medico_sem_horario_usa_a_grade_padrao(self):
+        outro = User.objects.create_user('medico_sem_grade')
+        horas = disponibilidade.horarios_do_medico(outro.id, self.amanha)
+        self.assertEqual((horas[0], horas[-1], len(horas)), (time(8, 0), time(17, 45), 40))
+
+
+class ReservasTests(TestCase):
+    """A reserva temporária só vale para horários futuros da grade do médico."""
+
+    def setUp(self):
+        self.medico = User.objects.create_user('medico_reserva')
+        self.paciente = User.objects.create_user('paciente_reserva')
+        self.amanha = timezone.localdate() + timedelta(days=1)
+        profissional = Profissional.objects.create(nome='Dr. Reserva', slug='dr-reserva', usuario=self.medico)
+        HorarioTrabalho.objects.create(
+            profissional=profissional, dia_semana=self.amanha.weekday(),
+            hora_inicio=time(8, 0), hora_fim=time(12, 0), intervalo_minutos=30,
+        )
+
+    def horario(self, hora, data=None):
+        return timezone.make_aware(datetime.combine(data or self.amanha, hora))
+
+    def test_reserva_horario_da_grade(self):
+        reserva = reservas.reservar(self.paciente, self.medico.id, self.horario(time(8, 30)))
+        self.assertEqual(reserva.usuario, self.paciente)
+
+    def test_recusa_horario_passado(self):
+        ontem = self.amanha - timedelta(days=2)
+        with self.assertRaises(reservas.HorarioInvalido):
+            reservas.reservar(self.paciente, self.medico.id, self.horario(time(8, 30), ontem))
+        self.assertFalse(ReservaHorario.objects.exists())
+
+    def test_recusa_horario_fora_da_grade(self):
+        for hora in (time(8, 10), time(13, 0)):
+            with self.assertRaises(reservas.HorarioInvalido):
+                reservas.reservar(self.paciente, self.medico.id, self.horario(hora))
+
+        self.client.force_login(self.paciente)
+        resposta = self.client.post(reverse('reservar_horario_ajax'), {
+            'medico_id': self.medico.id, 'data': self.amanha.isoformat(), 'hora': '08:10',
+        })
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(resposta.json()['reservado'])
+        self.assertFalse(ReservaHorario.objects.exists())
+
+
+class ConsultaIndicesTests(TestCase):
+    """
+    Confere pelo EXPLAIN que os filtros de período do ConsultaQuerySet
+    usam os índices compostos em vez de varrer a tabela.
+    """
+
+    def setUp(self):
+        self.medico = User.objects.create_user('medico_indices')
+        self.paciente = User.objects.create_user('paciente_indices')
+        self.hoje = timezone.localdate()
+
+    def consultas_testadas(self):
+        return {
+            'consulta_medico_data_idx': Consulta.objects.ativas().do_dia(self.hoje).filter(medico=self.medico),
+            'consulta_paciente_data_idx': Consulta.objects.da_semana(self.hoje).filter(paciente=self.paciente),
+            'consulta_status_data_idx': Consulta.objects.filter(status='agendada').entre(self.hoje, self.hoje),
+            'consulta_data_idx': Consulta.objects.do_dia(self.hoje),
+        }
+
+    def test_filtro_de_periodo_nao_envolve_a_coluna_em_funcao(self):
+        sql = str(Consulta.objects.do_dia(self.hoje).query)
+        self.assertNotIn('DATE(', sql.upper())
+        self.assertIn('"data_hora" >=', sql)
+        self.assertIn('"data_hora" <', sql)
+
+    def test_do_dia_respeita_o_fuso_local(self):
+        limite = timezone.make_aware(datetime.combine(self.hoje, time(23, 59)))
+        Consulta.objects.create(paciente=self.paciente, medico=self.medico, data_hora=limite)
+        Consulta.objects.create(paciente=self.paciente, medico=self.medico, data_hora=limite + timedelta(minutes=1))
+        self.assertEqual(Consulta.objects.do_dia(self.hoje).count(), 1)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'plano específico do SQLite')
+    def test_plano_sqlite_usa_indices(self):
+        for indice, consultas in self.consultas_testadas().items():
+            with self.subTest(indice=indice):
+                plano = consultas.explain()
+                self.assertIn(f'USING INDEX {indice}', plano)
+                self.assertNotIn('SCAN pessoas_consulta', plano)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'plano específico do PostgreSQL')
+    def test_plano_postgresql_usa_indices(self):
+        # Com a tabela quase vazia o planejador prefere seq scan; desligá-lo
+        # verifica se existe um índice utilizável para o filtro
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            for indice, consultas in self.consultas_testadas().items():
+                with self.subTest(indice=indice):
+                    plano = consultas.explain()
+                    self.assertIn('Index', plano)
+                    self.assertNotIn('Seq Scan', plano)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = on')
+
+
+class HorariosPeriodoTests(TestCase):
+    """
+    A API de horários por período exige login, limita os profissionais por
+    requisição e recusa ids desconhecidos antes de gerar slots.
+    """
+
+    def setUp(self):
+        self.profissional = Profissional.objects.create(nome='Dr. Periodo', slug='dr-periodo', crm='CRM-P')
+        HorarioTrabalho.objects.create(
+            profissional=self.profissional, dia_semana=0, hora_inicio=time(8, 0), hora_fim=time(12, 0)
+        )
+        self.client.force_login(User.objects.create_user('paciente_periodo'))
+        inicio = timezone.localdate()
+        self.parametros = {'inicio': inicio.isoformat(), 'fim': (inicio + timedelta(days=6)).isoformat()}
+
+    def pedir(self, ids):
+        return self.client.get(reverse('horarios_periodo_ajax'), {**self.parametros, 'profissional_id': ids})
+
+    def test_exige_login(self):
+        self.client.logout()
+        self.assertEqual(self.pedir(str(self.profissional.id)).status_code, 302)
+
+    def test_limita_os_profissionais(self):
+        ids = ','.join(str(self.profissional.id + i) for i in range(views.MAX_PROFISSIONAIS_PERIODO + 1))
+        self.assertEqual(self.pedir(ids).status_code, 400)
+
+    def test_recusa_id_desconhecido_sem_gerar_slots(self):
+        resposta = self.pedir(f'{self.profissional.id},{self.profissional.id + 1000}')
+        self.assertEqual(resposta.status_code, 404)
+        self.assertEqual(resposta.json()['profissional_id'], [self.profissional.id + 1000])
+        self.assertFalse(SlotAgenda.objects.exists())
+
+        resposta = self.pedir(str(self.profissional.id))
+        self.assertEqual(list(resposta.json()['profissionais']), [str(self.profissional.id)])
+
+
+class ProximosHorariosTests(TestCase):
+    """
+    A busca por especialidade combina periodo e de/ate pela interseção e só
+    oferece profissionais com usuário vinculado.
+    """
+
+    def setUp(self):
+        self.especialidade = Especialidade.objects.create(nome='Clínica Busca')
+        self.amanha = timezone.localdate() + timedelta(days=1)
+        self.com_usuario = Profissional.objects.create(
+            nome='Dr. Busca', slug='dr-busca', especialidade=self.especialidade,
+            usuario=User.objects.create_user('medico_busca'),
+        )
+        sem_usuario = Profissional.objects.create(
+            nome='Dr. Sem Usuario', slug='dr-sem-usuario', especialidade=self.especialidade,
+        )
+        for profissional in (self.com_usuario, sem_usuario):
+            HorarioTrabalho.objects.create(
+                profissional=profissional, dia_semana=self.amanha.weekday(),
+                hora_inicio=time(8, 0), hora_fim=time(20, 0), intervalo_minutos=60,
+            )
+
+    def buscar(self, **parametros):
+        resposta = self.client.get(
+            reverse('proximos_horarios_especialidade', args=[self.especialidade.id]),
+            {'inicio': self.amanha.isoformat(), 'fim': self.amanha.isoformat(), 'n': 50, **parametros},
+        )
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()['horarios']
+
+    def test_periodo_e_faixa_se_intersectam(self):
+        horarios = self.buscar(periodo='tarde', de='08:00', ate='14:00')
+        self.assertEqual([horario['hora'] for horario in horarios], ['12:00', '13:00'])
+
+        self.assertEqual(self.buscar(periodo='manha', de='13:00'), [])
+
+    def test_ignora_profissional_sem_usuario(self):
+        horarios = self.buscar()
+        self.assertEqual(len(horarios), 12)
+        self.assertEqual({horario['profissional']['id'] for horario in horarios}, {self.com_usuario.id})
+
+
+class EventosAgendaTests(TestCase):
+    """
+    Registro de eventos da agenda (pessoas/eventos_agenda.py) e o stream do
+    painel do atendente, sob WSGI (eventos pendentes) e ASGI (gerador).
+    """
+
+    def setUp(self):
+        self.medico = User.objects.create_user('medico_eventos')
+        self.paciente = User.objects.create_user('paciente_eventos')
+        self.atendente = User.objects.create_user('atendente_eventos')
+        self.atendente.perfil.tipo_usuario = 'atendente'
+        self.atendente.perfil.save()
+        self.data_hora = timezone.make_aware(datetime.combine(timezone.localdate(), time(23, 0)))
+
+    def test_remarcar_para_outro_dia_remove_e_cria(self):
+        consulta = agendar_consulta(self.paciente, self.medico, self.data_hora)
+        consulta.observacoes = 'Sem mudança de horário ou status'
+        consulta.save()
+        consulta.data_hora += timedelta(days=1)
+        consulta.save()
+        self.assertEqual(
+            list(EventoAgenda.objects.order_by('id').values_list('tipo', 'data')),
+            [
+                ('criada', timezone.localdate()),
+                ('removida', timezone.localdate()),
+                ('criada', timezone.localdate() + timedelta(days=1)),
+            ]
+        )
+
+    def test_wsgi_responde_os_eventos_pendentes(self):
+        consulta = agendar_consulta(self.paciente, self.medico, self.data_hora)
+        self.client.force_login(self.atendente)
+        resposta = self.client.get(reverse('agenda_eventos'))
+        corpo = b''.join(resposta.streaming_content).decode()
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        ultimo = EventoAgenda.objects.get().id
+        self.assertIn(f'id: {ultimo}\nevent: consulta\n', corpo)
+        self.assertIn(f'"id": {consulta.id}', corpo)
+
+        resposta = self.client.get(reverse('agenda_eventos'), headers={'Last-Event-ID': str(ultimo)})
+        self.assertEqual(b''.join(resposta.streaming_content).decode(), f'retry: {eventos_agenda.RETRY_MS}\n\n')
+
+    def test_paciente_nao_recebe_eventos(self):
+        self.client.force_login(self.paciente)
+        self.assertEqual(self.client.get(reverse('agenda_eventos')).status_code, 403)
+
+    async def test_stream_asgi_envia_pendentes_e_termina(self):
+        consulta = await sync_to_async(agendar_consulta)(self.paciente, self.medico, self.data_hora)
+        partes = [parte async for parte in eventos_agenda.stream(timezone.localdate(), 0, duracao=0.01)]
+        self.assertEqual(partes[0], f'retry: {eventos_agenda.RETRY_MS}\n\n')
+        self.assertEqual(len(partes), 2)
+        self.assertIn(f'"id": {consulta.id}', partes[1])
+
+
+class CacheDisponibilidadeTests(TestCase):
+    """
+    Um acerto no cache de disponibilidade custa só a leitura da chave: os
+    contadores ficam em memória e são gravados de tempos em tempos.
+    """
+
+    def setUp(self):
+        cache.clear()
+        cache_disponibilidade.zerar_estatisticas()
+        self.chave = cache_disponibilidade.chave_medico(1, timezone.localdate())
+
+    def test_acerto_so_le_a_chave(self):
+        cache_disponibilidade.obter(self.chave, lambda: [time(8, 0)])
+        with mock.patch.object(contadores, 'INTERVALO', 3600), CaptureQueriesContext(connection) as queries:
+            valor = cache_disponibilidade.obter(self.chave, lambda: self.fail('recalculou'))
+        self.assertEqual(valor, [time(8, 0)])
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('SELECT'))
+
+    def test_contadores_somam_por_update(self):
+        cache_disponibilidade.obter(self.chave, lambda: None)
+        cache_disponibilidade.obter(self.chave, lambda: None)
+        self.assertEqual(cache_disponibilidade.estatisticas(), {'acertos': 1, 'faltas': 1, 'taxa_acerto': 0.5})
+
+        cache_disponibilidade.obter(self.chave, lambda: None)
+        self.assertEqual(cache_disponibilidade.estatisticas()['acertos'], 2)
+        self.assertEqual(
+            ContadorCache.objects.get(nome=cache_disponibilidade.CHAVE_ACERTOS).valor, 2
+        )
+
+
+class OcupacaoTests(TestCase):
+    """
+    O mapa de ocupação compara a grade com as consultas da semana e é
+    recalculado quando a capacidade muda, mesmo depois do TIMEOUT padrão do
+    cache (a versão das chaves não expira).
+    """
+
+    def setUp(self):
+        cache.clear()
+        medico = User.objects.create_user('medico_ocupacao')
+        self.profissional = Profissional.objects.create(nome='Dr. Ocupacao', slug='dr-ocupacao', usuario=medico)
+        self.horario = HorarioTrabalho.objects.create(
+            profissional=self.profissional, dia_semana=0, hora_inicio=time(8, 0), hora_fim=time(10, 0),
+        )
+        self.segunda = ocupacao.segunda_da_semana(timezone.localdate()) + timedelta(weeks=1)
+        agendar_consulta(
+            User.objects.create_user('paciente_ocupacao'), medico,
+            timezone.make_aware(datetime.combine(self.segunda, time(8, 30))), profissional=self.profissional,
+        )
+
+    def linha(self):
+        mapa = ocupacao.mapa_ocupacao(self.segunda)
+        return mapa, next(p for p in mapa['profissionais'] if p['id'] == self.profissional.id)
+
+    def test_mapa_compara_grade_e_consultas(self):
+        mapa, linha = self.linha()
+        self.assertEqual(mapa['faixas'], ['08:00', '08:30', '09:00', '09:30'])
+        self.assertEqual((linha['capacidade'], linha['ocupados'], linha['taxa']), (4, 1, 0.25))
+        self.assertEqual(linha['dias'][0], [[1, 0], [1, 1], [1, 0], [1, 0]])
+
+    def test_mudanca_de_horario_descarta_as_semanas(self):
+        self.linha()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.horario.hora_fim = time(11, 0)
+            self.horario.save()
+        self.assertEqual(self.linha()[1]['capacidade'], 6)
+
+        # A versão nova não expira e não volta a um valor já usado
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT expires FROM {TABELA_CACHE} WHERE cache_key = %s', [cache.make_key(ocupacao.CHAVE_VERSAO)]
+            )
+            expira = cursor.fetchone()[0]
+        self.assertEqual(str(expira)[:4], '9999')
+
+
+class AgendaPaginadaTests(TestCase):
+    """
+    Os cursores (data_hora, id) da agenda não repetem nem pulam consultas
+    quando outras são criadas entre uma página e outra, e a view do médico
+    só lê a janela pedida.
+    """
+
+    def setUp(self):
+        self.amanha = timezone.localdate() + timedelta(days=1)
+        self.paciente = User.objects.create_user('paciente_paginas')
+        self.medicos = [User.objects.create_user(f'medico_paginas_{i}') for i in range(3)]
+        self.consultas = [
+            self.agendar(self.medicos[indice], hora)
+            for indice, hora in ((0, time(8, 0)), (0, time(9, 0)), (1, time(9, 0)), (0, time(10, 0)), (1, time(10, 0)))
+        ]
+
+    def agendar(self, medico, hora, data=None):
+        return Consulta.objects.create(
+            paciente=self.paciente, medico=medico,
+            data_hora=timezone.make_aware(datetime.combine(data or self.amanha, hora)),
+        )
+
+    def do_dia(self):
+        return Consulta.objects.entre(self.amanha, self.amanha)
+
+    def test_cursor_estavel_com_insercoes(self):
+        primeira, proximo, anterior = agenda_paginada.pagina(self.do_dia(), por_pagina=2)
+        self.assertEqual(primeira, self.consultas[:2])
+        self.assertIsNone(anterior)
+
+        # Uma antes do cursor e uma empatada com ele no horário, mas com id maior
+        self.agendar(self.medicos[1], time(7, 0))
+        empatada = self.agendar(self.medicos[2], time(9, 0))
+
+        vistas = list(primeira)
+        while proximo:
+            itens, proximo, anterior = agenda_paginada.pagina(self.do_dia(), apos=proximo, por_pagina=2)
+            vistas += itens
+        self.assertEqual(vistas, [*self.consultas[:3], empatada, *self.consultas[3:]])
+
+    def test_pagina_anterior_inclui_as_novas(self):
+        _, proximo, _ = agenda_paginada.pagina(self.do_dia(), por_pagina=2)
+        segunda, _, anterior = agenda_paginada.pagina(self.do_dia(), apos=proximo, por_pagina=2)
+        self.assertEqual(segunda, self.consultas[2:4])
+
+        nova = self.agendar(self.medicos[1], time(7, 0))
+        itens, _, mais_antes = agenda_paginada.pagina(self.do_dia(), antes=anterior, por_pagina=2)
+        self.assertEqual(itens, self.consultas[:2])
+        itens, _, mais_antes = agenda_paginada.pagina(self.do_dia(), antes=mais_antes, por_pagina=2)
+        self.assertEqual((itens, mais_antes), ([nova], None))
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        itens, _, anterior = agenda_paginada.pagina(self.do_dia(), apos='lixo', por_pagina=2)
+        self.assertEqual((itens, anterior), (self.consultas[:2], None))
+
+    def test_painel_medico_le_so_a_janela(self):
+        medico = self.medicos[0]
+        medico.perfil.tipo_usuario = 'medico'
+        medico.perfil.save()
+        semana_seguinte = self.amanha + timedelta(days=7)
+        self.agendar(medico, time(8, 0), semana_seguinte)
+        self.client.force_login(medico)
+
+        resposta = self.client.get(reverse('painel_medico'), {'visao': 'semana', 'data': self.amanha.isoformat()})
+        inicio = self.amanha - timedelta(days=self.amanha.weekday())
+        self.assertEqual((resposta.context['inicio'], resposta.context['fim']), (inicio, inicio + timedelta(days=6)))
+        self.assertEqual(list(resposta.context['consultas']), [self.consultas[0], self.consultas[1], self.consultas[3]])
+
+
+class ExportacaoTests(TestCase):
+    """
+    As exportações trazem o cabeçalho e as colunas declaradas e, sob ASGI,
+    começam a sair antes de o queryset ser lido por inteiro.
+    """
+
+    def setUp(self):
+        especialidade = Especialidade.objects.create(nome='Cardiologia Exportada')
+        medico = User.objects.create_user('medico_exportacao', first_name='Ana')
+        Profissional.objects.create(
+            nome='Dra. Ana', slug='dra-ana', crm='CRM-EXP', especialidade=especialidade, usuario=medico,
+        )
+        self.paciente = User.objects.create_user('paciente_exportacao', first_name='Bruno')
+        amanha = timezone.localdate() + timedelta(days=1)
+        self.consultas = [
+            agendar_consulta(self.paciente, medico, timezone.make_aware(datetime.combine(amanha, time(hora, 0))))
+            for hora in (8, 9, 10)
+        ]
+        self.client.force_login(User.objects.create_user('admin_exportacao', is_staff=True))
+
+    def test_csv_de_consultas(self):
+        resposta = self.client.get(reverse('exportar_consultas'), {'formato': 'csv'})
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="consultas.csv"')
+
+        texto = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertTrue(texto.startswith('\ufeff'))
+        leitor = csv.DictReader(io.StringIO(texto.lstrip('\ufeff')))
+        linhas = list(leitor)
+        self.assertEqual(leitor.fieldnames, list(exportacao.COLUNAS_CONSULTAS))
+        self.assertEqual([int(linha['id']) for linha in linhas], [consulta.id for consulta in self.consultas])
+        self.assertEqual(
+            {(linha['profissional_nome'], linha['especialidade'], linha['paciente_nome']) for linha in linhas},
+            {('Dra. Ana', 'Cardiologia Exportada', 'Bruno')},
+        )
+        self.assertEqual(
+            datetime.fromisoformat(linhas[0]['data_hora']), self.consultas[0].data_hora,
+        )
+
+    def test_jsonl_de_pacientes(self):
+        resposta = self.client.get(reverse('exportar_pacientes'), {'formato': 'jsonl'})
+        self.assertEqual(resposta['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        linhas = [json.loads(linha) for linha in b''.join(resposta.streaming_content).decode().splitlines()]
+        self.assertEqual([list(linha) for linha in linhas], [list(exportacao.COLUNAS_PACIENTES)] * len(linhas))
+        self.assertIn(
+            {'id': self.paciente.id, 'usuario': 'paciente_exportacao', 'nome': 'Bruno'},
+            [{chave: linha[chave] for chave in ('id', 'usuario', 'nome')} for linha in linhas],
+        )
+
+    async def test_asgi_envia_antes_de_ler_tudo(self):
+        lidas = []
+        formatar = exportacao._formatar
+
+        def contando(linhas, colunas):
+            for linha in formatar(linhas, colunas):
+                lidas.append(linha[0])
+                yield linha
+
+        request = AsyncRequestFactory().get(reverse('exportar_consultas'))
+        with mock.patch.multiple(exportacao, TAMANHO_BLOCO=2, TAMANHO_ENVIO=1, _formatar=contando):
+            resposta = exportacao.resposta(
+                request, exportacao.consultas(), exportacao.COLUNAS_CONSULTAS, 'csv', 'consultas'
+            )
+            self.assertTrue(resposta.is_async)
+            partes = aiter(resposta.streaming_content)
+            self.assertTrue((await anext(partes)).startswith(b'\xef\xbb\xbfid,'))
+            await anext(partes)
+            # Uma linha enviada, as demais ainda não lidas
+            self.assertEqual(lidas, [self.consultas[0].id])
+            restantes = [parte async for parte in partes]
+        self.assertEqual(len(restantes), 2)
+        self.assertEqual(lidas, [consulta.id for consulta in self.consultas])
+
+
+class DiretorioTests(TestCase):
+    """
+    O diretório de médicos sai de uma única query, fica no cache e é
+    descartado quando especialidade, perfil ou nome do médico mudam.
+    """
+
+    def setUp(self):
+        self.especialidade = Especialidade.objects.create(nome='Cardiologia Diretorio')
+        self.medicos = []
+        for i in range(3):
+            medico = User.objects.create_user(f'medico_diretorio_{i}', last_name='Silva')
+            medico.perfil.tipo_usuario = 'medico'
+            medico.perfil.save()
+            Profissional.objects.create(
+                nome=f'Dr. Diretorio {i}', slug=f'dr-diretorio-{i}', usuario=medico, especialidade=self.especialidade,
+            )
+            self.medicos.append(medico)
+        cache.delete_many(diretorio.CHAVES)
+
+    def queries_fora_do_cache(self, funcao):
+        with CaptureQueriesContext(connection) as queries:
+            resultado = funcao()
+        # A gravação no cache abre um savepoint, que também não conta
+        return resultado, [
+            query['sql'] for query in queries
+            if TABELA_CACHE not in query['sql'] and 'SAVEPOINT' not in query['sql']
+        ]
+
+    def test_cartoes_em_uma_query_e_depois_do_cache(self):
+        cartoes, queries = self.queries_fora_do_cache(diretorio.medicos)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([cartao['id'] for cartao in cartoes], [medico.id for medico in self.medicos])
+        self.assertEqual(cartoes[0]['especialidade'], 'Cardiologia Diretorio')
+        self.assertEqual(cartoes[0]['nome'], 'Dr(a). medico_diretorio_0 Silva')
+
+        self.assertEqual(self.queries_fora_do_cache(diretorio.medicos), (cartoes, []))
+
+    def test_especialidade_renomeada_invalida(self):
+        diretorio.medicos()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.especialidade.nome = 'Cardiologia Nova'
+            self.especialidade.save()
+        self.assertEqual({cartao['especialidade'] for cartao in diretorio.medicos()}, {'Cardiologia Nova'})
+
+    def test_perfil_rebaixado_sai_das_opcoes(self):
+        diretorio.opcoes_medicos()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.medicos[0].perfil.tipo_usuario = 'paciente'
+            self.medicos[0].perfil.save()
+        self.assertNotIn(self.medicos[0].id, [valor for valor, _ in diretorio.opcoes_medicos()])
+
+    def test_login_nao_invalida(self):
+        diretorio.medicos()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.medicos[0].last_login = timezone.now()
+            self.medicos[0].save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+
+class ServidorAsgiTests(SimpleTestCase):
+    """
+    Sob ASGI (cadastro_pessoas.asgi, o servidor de produção), cada requisição
+    roda as views síncronas em uma thread própria: um worker atende várias ao
+    mesmo tempo, sem o limite de --threads do gthread.
+    """
+
+    async def pedir(self, caminho):
+        mensagens = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        desconectado = asyncio.Event()
+        enviadas = []
+
+        async def receber():
+            if mensagens:
+                return mensagens.pop()
+            await desconectado.wait()
+            return {'type': 'http.disconnect'}
+
+        async def enviar(mensagem):
+            enviadas.append(mensagem)
+
+        escopo = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': caminho, 'query_string': b'', 'headers': [], 'server': ('testserver', 80),
+        }
+        await asgi.application(escopo, receber, enviar)
+        return enviadas[0]['status']
+
+    def test_views_sincronas_em_paralelo(self):
+        largada = threading.Barrier(2, timeout=5)
+
+        def esperar_a_outra(request):
+            # Só passa se as duas requisições estiverem em threads ao mesmo tempo
+            largada.wait()
+            return HttpResponse('ok')
+
+        class Rotas:
+            urlpatterns = [path('paralelo/', esperar_a_outra)]
+
+        async def duas_requisicoes():
+            return await asyncio.gather(self.pedir('/paralelo/'), self.pedir('/paralelo/'))
+
+        # Um loop próprio em outra thread, como o do worker do uvicorn: dentro
+        # de um teste assíncrono o asgiref mandaria as views para a thread do teste
+        status = []
+        with override_settings(ROOT_URLCONF=Rotas):
+            servidor = threading.Thread(target=lambda: status.extend(asyncio.run(duas_requisicoes())))
+            servidor.start()
+            servidor.join()
+        self.assertEqual(status, [200, 200])
+
+
+class CachePaginasTests(TestCase):
+    """
+    O cache de páginas serve anônimos só com leituras da tabela do cache,
+    nunca serve usuários logados e é descartado quando um comentário é
+    aprovado.
+    """
+
+    def setUp(self):
+        cache.clear()
+        cache_paginas.zerar_estatisticas()
+        self.paciente = User.objects.create_user('paciente_cache')
+        self.comentario = ComentarioPaciente.objects.create(paciente=self.paciente, texto='Muito bom')
+
+    def test_anonimo_recebe_a_pagina_do_cache(self):
+        primeira = self.client.get(reverse('home'))
+        with mock.patch.object(contadores, 'INTERVALO', 3600), CaptureQueriesContext(connection) as queries:
+            segunda = self.client.get(reverse('home') + '?utm_source=anuncio')
+        # A versão e a página, nenhuma escrita
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all(
+            query['sql'].startswith('SELECT') and TABELA_CACHE in query['sql'] for query in queries
+        ))
+        self.assertEqual(primeira.content, segunda.content)
+        self.assertEqual(cache_paginas.estatisticas()['paginas']['home'], {
+            'acertos': 1, 'faltas': 1, 'taxa_acerto': 0.5,
+        })
+
+    def test_usuario_logado_nao_usa_o_cache(self):
+        self.client.get(reverse('home'))
+        self.client.force_login(self.paciente)
+        resposta = self.client.get(reverse('home'))
+        self.assertContains(resposta, self.paciente.username)
+        self.assertEqual(cache_paginas.estatisticas()['acertos'], 0)
+
+    def test_aprovar_comentario_descarta_as_paginas(self):
+        self.client.get(reverse('home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.comentario.status = 'aprovado'
+            self.comentario.data_aprovacao = timezone.now()
+            self.comentario.save()
+        self.assertContains(self.client.get(reverse('home')), 'Muito bom')
+        self.assertEqual(cache_paginas.estatisticas()['faltas'], 2)
+
+    def test_importar_profissionais_descarta_as_paginas(self):
+        self.client.get(reverse('profissionais'))
+        with self.captureOnCommitCallbacks(execute=True):
+            importacao.importar(io.StringIO('nome,crm\nDra. Importada,CRM-IMP\n'), 'profissionais')
+        self.assertContains(self.client.get(reverse('profissionais')), 'Dra. Importada')
+        self.assertEqual(cache_paginas.estatisticas()['paginas']['profissionais']['faltas'], 2)
+
+    def test_contadores_so_zeram_com_post(self):
+        self.client.get(reverse('home'))
+        self.client.force_login(User.objects.create_user('admin_cache', is_staff=True))
+        url = reverse('cache_paginas_estatisticas')
+        self.assertEqual(self.client.get(url, {'zerar': '1'}).json()['faltas'], 1)
+        self.assertEqual(self.client.post(url).json()['faltas'], 1)
+        self.assertEqual(self.client.get(url).json()['faltas'], 0)
+
+
+class PapelSessaoTests(TestCase):
+    """
+    O papel guardado na sessão custa só a leitura da versão no cache e deixa
+    de valer na requisição seguinte a um rebaixamento, seja pelo tipo de
+    usuário do Perfil ou pelo is_staff.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_papel_da_sessao_le_so_a_versao(self):
+        medico = User.objects.create_user('medico_sessao')
+        medico.perfil.tipo_usuario = 'medico'
+        medico.perfil.save()
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=medico.pk)
+        request.session = SessionStore()
+        request.session[papeis.CHAVE_SESSAO] = [medico.pk, papeis.versao(medico.pk), 'medico']
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(papeis.resolver(request), 'medico')
+        self.assertEqual(len(queries), 1)
+        self.assertIn(TABELA_CACHE, queries[0]['sql'])
+
+    def test_medico_rebaixado_perde_o_painel(self):
+        medico = User.objects.create_user('medico_papel')
+        medico.perfil.tipo_usuario = 'medico'
+        medico.perfil.save()
+        self.client.force_login(medico)
+        self.assertEqual(self.client.get(reverse('painel_medico')).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            medico.perfil.tipo_usuario = 'paciente'
+            medico.perfil.save()
+        self.assertRedirects(self.client.get(reverse('painel_medico')), reverse('home'), fetch_redirect_response=False)
+
+    def test_admin_sem_is_staff_perde_o_acesso(self):
+        admin = User.objects.create_user('admin_papel', is_staff=True)
+        self.client.force_login(admin)
+        url = reverse('cache_paginas_estatisticas')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.is_staff = False
+            admin.save()
+        self.assertRedirects(self.client.get(url), reverse('home'), fetch_redirect_response=False)
+
+
+class CalendarioFeedTests(TestCase):
+    """
+    Feed webcal por token: só a janela do profissional ou do paciente, 304
+    com o ETag da última leitura e um ETag novo a cada alteração ou exclusão.
+    """
+
+    def setUp(self):
+        self.medico = User.objects.create_user('medico_feed', last_name='Feed')
+        self.paciente = User.objects.create_user('paciente_feed', last_name='Assinante')
+        self.profissional = Profissional.objects.create(nome='Dr. Feed', slug='dr-feed', usuario=self.medico)
+        amanha = timezone.localdate() + timedelta(days=1)
+        self.consultas = [
+            Consulta.objects.create(
+                paciente=self.paciente, medico=self.medico,
+                data_hora=timezone.make_aware(datetime.combine(amanha + timedelta(days=dias), time(9, 0))),
+            )
+            for dias in (0, 1, calendario_ics.DIAS_DEPOIS + 10)
+        ]
+        self.assinatura = AssinaturaCalendario.objects.create(profissional=self.profissional)
+
+    def ler(self, assinatura=None, etag=None):
+        token = (assinatura or self.assinatura).token
+        cabecalhos = {'If-None-Match': etag} if etag else {}
+        return self.client.get(reverse('calendario_feed', args=[token]), headers=cabecalhos)
+
+    def test_feed_do_profissional(self):
+        resposta = self.ler()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Content-Type'], 'text/calendar; charset=utf-8')
+        texto = resposta.content.decode()
+        self.assertEqual(texto.count('BEGIN:VEVENT'), 2)
+        self.assertIn(f'UID:consulta-{self.consultas[0].id}@simed.com.br', texto)
+        self.assertNotIn(f'UID:consulta-{self.consultas[2].id}@', texto)
+        self.assertIn('SUMMARY:Consulta - paciente_feed Assinante', texto)
+
+    def test_feed_do_paciente(self):
+        assinatura = AssinaturaCalendario.objects.create(paciente=self.paciente)
+        texto = self.ler(assinatura).content.decode()
+        self.assertEqual(texto.count('BEGIN:VEVENT'), 2)
+        self.assertIn('SUMMARY:Consulta SIMED - Dr(a). medico_feed Feed', texto)
+
+    def test_etag_devolve_304_ate_a_proxima_alteracao(self):
+        etag = self.ler()['ETag']
+        self.assertEqual(self.ler(etag=etag).status_code, 304)
+
+        self.consultas[0].status = 'confirmada'
+        self.consultas[0].save()
+        resposta = self.ler(etag=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('STATUS:CONFIRMED', resposta.content.decode())
+
+        etag = resposta['ETag']
+        self.consultas[1].delete()
+        self.assertEqual(self.ler(etag=etag).status_code, 200)
+
+    def test_token_renovado_desativa_a_url_antiga(self):
+        antiga = AssinaturaCalendario(token=self.assinatura.token)
+        self.assinatura.renovar()
+        self.assertEqual(self.ler(antiga).status_code, 404)
+        self.assertEqual(self.ler().status_code, 200)
+
+
+class ComprovantesTests(TestCase):
+    """
+    O PDF da consulta é desenhado uma vez por versão, revalidado pelo ETag e
+    apagado quando a consulta muda ou é excluída.
+    """
+
+    def setUp(self):
+        self.pasta = pasta_temporaria_de_comprovantes(self)
+        self.paciente = User.objects.create_user('paciente_pdf')
+        self.consulta = agendar_consulta(
+            self.paciente, User.objects.create_user('medico_pdf'),
+            timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), time(9, 0))),
+        )
+        self.client.force_login(self.paciente)
+        self.url = reverse('download_consulta_pdf', args=[self.consulta.id])
+
+    def test_etag_devolve_304(self):
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(b''.join(resposta.streaming_content).startswith(b'%PDF'))
+
+        resposta = self.client.get(self.url, headers={'If-None-Match': resposta['ETag']})
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(resposta.content, b'')
+
+    def test_nova_versao_apaga_a_antiga(self):
+        antigo = comprovantes.obter(self.consulta)
+        self.consulta.status = 'confirmada'
+        self.consulta.save()
+        novo = comprovantes.obter(self.consulta)
+        self.assertNotEqual(antigo, novo)
+        self.assertEqual(list(self.pasta.iterdir()), [novo])
+
+    def test_excluir_a_consulta_apaga_o_pdf(self):
+        comprovantes.obter(self.consulta)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.consulta.delete()
+        self.assertEqual(list(self.pasta.iterdir()), [])
+
+
+class ImagensTests(TestCase):
+    """
+    Variantes das fotos (pessoas/imagens.py) e o srcset da tag {% imagem %},
+    gravadas em um MEDIA_ROOT temporário.
+    """
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.profissional = Profissional.objects.create(
+            nome='Dr. Foto', slug='dr-foto', foto=self.arquivo('foto.jpg', 'RGB', (800, 400), 'JPEG'),
+        )
+
+    def arquivo(self, nome, modo, tamanho, formato):
+        saida = io.BytesIO()
+        Image.new(modo, tamanho, (200, 40, 40, 128)[:len(modo)]).save(saida, formato)
+        return SimpleUploadedFile(nome, saida.getvalue())
+
+    def renderizar(self):
+        return Template('{% load midia %}{% imagem prof largura=320 alt="Dr. Foto" %}').render(
+            Context({'prof': self.profissional})
+        )
+
+    def test_larguras_fixas_em_jpeg_e_webp(self):
+        self.assertTrue(imagens.processar(self.profissional))
+        itens = Profissional.objects.get(pk=self.profissional.pk).foto_variantes['itens']
+        self.assertEqual([(item['largura'], item['altura']) for item in itens], [(160, 80), (320, 160), (640, 320)])
+        armazenamento = self.profissional.foto.storage
+        for item in itens:
+            with armazenamento.open(item['webp']) as webp, armazenamento.open(item['arquivo']) as jpeg:
+                self.assertEqual((Image.open(webp).format, Image.open(jpeg).format), ('WEBP', 'JPEG'))
+        self.assertFalse(imagens.processar(self.profissional))
+
+    def test_png_transparente_continua_png(self):
+        medicamento = Medicamento(nome='Xarope', valor=10, foto=self.arquivo('frasco.png', 'RGBA', (200, 100), 'PNG'))
+        medicamento.save()
+        imagens.processar(medicamento)
+        itens = medicamento.foto_variantes['itens']
+        self.assertEqual([item['largura'] for item in itens], [160, 200])
+        self.assertTrue(all(item['arquivo'].endswith('.png') for item in itens))
+
+    def test_tag_usa_a_original_ate_gerar_as_variantes(self):
+        html = self.renderizar()
+        self.assertIn(f'src="{self.profissional.foto.url}"', html)
+        self.assertNotIn('srcset', html)
+
+        imagens.processar(self.profissional)
+        html = self.renderizar()
+        url = self.profissional.foto.storage.url
+        itens = self.profissional.foto_variantes['itens']
+        self.assertIn(
+            '<source type="image/webp" srcset="'
+            + ', '.join(f'{url(item["webp"])} {item["largura"]}w' for item in itens)
+            + '" sizes="320px">',
+            html,
+        )
+        self.assertIn(f'<img src="{url(itens[1]["arquivo"])}"', html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_foto_trocada_apaga_as_variantes_antigas(self):
+        imagens.processar(self.profissional)
+        antigas = self.profissional.foto_variantes['itens']
+        self.profissional.foto = self.arquivo('nova.jpg', 'RGB', (300, 300), 'JPEG')
+        self.profissional.save()
+        self.assertTrue(imagens.pendente(self.profissional))
+
+        imagens.processar(self.profissional)
+        armazenamento = self.profissional.foto.storage
+        self.assertFalse(any(armazenamento.exists(item['webp']) for item in antigas))
+        self.assertEqual([item['largura'] for item in self.profissional.foto_variantes['itens']], [160, 300])
+
+
+class EstaticosTests(SimpleTestCase):
+    """
+    collectstatic com o EstaticosOtimizadosStorage sobre uma pasta temporária:
+    CSS/JS minificados, PNG recomprimido com alternativa WebP no manifesto e
+    o relatório de bytes economizados. Os blocos {% estilo %} ficam de fora
+    (EstilosTests).
+    """
+
+    def setUp(self):
+        origem = tempfile.TemporaryDirectory()
+        destino = tempfile.TemporaryDirectory()
+        self.addCleanup(origem.cleanup)
+        self.addCleanup(destino.cleanup)
+        self.origem, self.destino = Path(origem.name), Path(destino.name)
+        (self.origem / 'site.css').write_text('/* cores */\nbody {\n  color: red;\n}\n')
+        (self.origem / 'app.js').write_text('// soma\nfunction soma(a, b) {\n  return a + b;\n}\n')
+        Image.new('RGB', (300, 300), (10, 120, 200)).save(self.origem / 'logo.png')
+        configuracao = override_settings(
+            STATIC_ROOT=destino.name,
+            STATICFILES_DIRS=[origem.name],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        with mock.patch.object(estilos, 'gerar', return_value={}):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_otimizar(self):
+        self.assertEqual(estaticos.otimizar('a.css', b'/* x */\np {\n  margin: 0;\n}\n'), (b'p{margin:0}', None))
+        # Sem ganho, o original fica como está
+        self.assertEqual(estaticos.otimizar('a.css', b'p{margin:0}'), (b'p{margin:0}', None))
+
+    def test_manifesto_com_versoes_otimizadas_e_webp(self):
+        manifesto = json.loads((self.destino / 'staticfiles.json').read_text())['paths']
+        self.assertEqual(set(manifesto), {'site.css', 'app.js', 'logo.png', 'logo.png.webp'})
+        self.assertEqual((self.destino / manifesto['site.css']).read_bytes(), b'body{color:red}')
+        self.assertNotIn(b'// soma', (self.destino / manifesto['app.js']).read_bytes())
+        with Image.open(self.destino / manifesto['logo.png.webp']) as webp:
+            self.assertEqual((webp.format, webp.size), ('WEBP', (300, 300)))
+
+        html = Template('{% load midia %}{% imagem_estatica "logo.png" alt="Logo" %}').render(Context())
+        self.assertIn(f'<source type="image/webp" srcset="/static/{manifesto["logo.png.webp"]}">', html)
+        self.assertIn(f'<img src="/static/{manifesto["logo.png"]}"', html)
+
+    def test_relatorio_de_bytes_economizados(self):
+        relatorio = json.loads((self.destino / estaticos.RELATORIO).read_text())
+        self.assertEqual(set(relatorio['arquivos']), {'site.css', 'app.js', 'logo.png'})
+        for nome, entrada in relatorio['arquivos'].items():
+            with self.subTest(nome=nome):
+                self.assertEqual(entrada['original'], (self.origem / nome).stat().st_size)
+                self.assertGreater(entrada['economizado'], 0)
+        self.assertLess(relatorio['arquivos']['logo.png']['webp'], relatorio['arquivos']['logo.png']['original'])
+        self.assertEqual(
+            relatorio['total_economizado'], sum(entrada['economizado'] for entrada in relatorio['arquivos'].values())
+        )
+
+        # Sem nada novo para copiar, o relatório é refeito a partir da origem
+        with mock.patch.object(estilos, 'gerar', return_value={}):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        self.assertEqual(json.loads((self.destino / estaticos.RELATORIO).read_text()), relatorio)
+
+
+class EstilosTests(TestCase):
+    """
+    Blocos {% estilo %}: inline sem manifesto, <link> para o arquivo com hash
+    depois do collectstatic e CSS crítico só com as regras acima da dobra.
+    """
+
+    CSS = """
+        .topo { display: flex; animation: surgir 1s; }
+        .topo:hover { color: blue; }
+        #titulo, .rodape { font-size: 2em; }
+        .rodape { color: gray; }
+        section .topo { margin: 0; }
+        @media (max-width: 600px) { .topo { display: block; } .rodape { display: none; } }
+        @keyframes surgir { from { opacity: 0; } to { opacity: 1; } }
+        @keyframes sumir { from { opacity: 1; } to { opacity: 0; } }
+        @font-face { font-family: Titulo; src: url(titulo.woff2); }
+    """
+
+    TEMPLATE = '{% load estilos %}{% estilo "teste" critico %}<style>.a { color: red; }</style>{% endestilo %}'
+
+    def test_presentes_ignora_tags_de_template(self):
+        classes, ids, tags = estilos.presentes(
+            '<header class="topo {% if ativo %}ativo{% endif %}"><h1 id="titulo">{{ titulo }}</h1></header>'
+        )
+        self.assertEqual((classes, ids), ({'topo', 'ativo'}, {'titulo'}))
+        self.assertLessEqual({'header', 'h1', 'body'}, tags)
+
+    def test_critico_so_com_o_que_aparece(self):
+        critico = estilos.extrair_critico(self.CSS, estilos.presentes('<header class="topo"><h1 id="titulo">'))
+        # Sem .rodape sozinho, section, a animação não usada e a regra de .rodape na @media
+        self.assertEqual(critico.splitlines(), [
+            '.topo{ display: flex; animation: surgir 1s; }',
+            '.topo:hover{ color: blue; }',
+            '#titulo, .rodape{ font-size: 2em; }',
+            '@media (max-width: 600px){.topo{ display: block; }}',
+            '@font-face{ font-family: Titulo; src: url(titulo.woff2); }',
+            '@keyframes surgir{ from { opacity: 0; } to { opacity: 1; } }',
+        ])
+
+    def test_gerar_arquivos_das_paginas(self):
+        arquivos = estilos.gerar()
+        home, critico = arquivos['css/paginas/home.css'], arquivos['css/paginas/home.critico.css']
+        self.assertNotIn('<style', home)
+        self.assertLess(len(critico), len(home) / 2)
+        # Blocos sem `critico` não geram o arquivo crítico
+        self.assertIn('css/paginas/configurar-horarios.css', arquivos)
+        self.assertNotIn('css/paginas/configurar-horarios.critico.css', arquivos)
+
+    def test_tag_inline_sem_manifesto(self):
+        self.assertEqual(Template(self.TEMPLATE).render(Context()), '<style>.a { color: red; }</style>')
+
+    def test_tag_com_manifesto(self):
+        with mock.patch.object(estilos, 'publicado', return_value=True), \
+                mock.patch.object(estilos, 'critico', return_value='.a{color:red}'):
+            html = Template(self.TEMPLATE).render(Context())
+        self.assertTrue(html.startswith(
+            '<style>.a{color:red}</style><link rel="preload" href="/static/css/paginas/teste.css"'
+        ))
+        self.assertIn('<noscript><link rel="stylesheet" href="/static/css/paginas/teste.css"></noscript>', html)
+
+        with mock.patch.object(estilos, 'publicado', return_value=True), \
+                mock.patch.object(estilos, 'critico', return_value=''):
+            html = Template(self.TEMPLATE).render(Context())
+        self.assertEqual(html, '<link rel="stylesheet" href="/static/css/paginas/teste.css">')
+
+    def test_home_fica_menor_com_os_arquivos_publicados(self):
+        self.client.force_login(User.objects.create_user('visitante_estilos'))
+        inline = len(self.client.get(reverse('home')).content)
+        arquivos = estilos.gerar()
+        with mock.patch.object(estilos, 'publicado', return_value=True), \
+                mock.patch.object(estilos, 'critico', side_effect=lambda nome: arquivos[estilos.arquivo_critico(nome)]):
+            publicado = self.client.get(reverse('home')).content
+        self.assertIn(b'href="/static/css/paginas/home.css"', publicado)
+        self.assertLess(len(publicado), inline - len(arquivos['css/paginas/home.css']) / 2)
+
+
+class LotePdfTests(TestCase):
+    """
+    O lote do dia junta agenda e comprovantes em um PDF ou em um ZIP, e os
+    processos do pool gravam os comprovantes na pasta configurada.
+    """
+
+    def setUp(self):
+        self.pasta = pasta_temporaria_de_comprovantes(self)
+        self.data = timezone.localdate() + timedelta(days=1)
+        medico = User.objects.create_user('medico_lote')
+        self.consultas = [
+            agendar_consulta(
+                User.objects.create_user(f'paciente_lote_{hora}'), medico,
+                timezone.make_aware(datetime.combine(self.data, time(hora, 0))),
+            )
+            for hora in (9, 10)
+        ]
+
+    def test_pdf_unico_com_agenda_e_comprovantes(self):
+        destino = io.BytesIO()
+        relatorio = lote_pdf.gerar(lote_pdf.consultas(self.data), destino, 'pdf', processos=2)
+
+        self.assertEqual((relatorio.agendas, relatorio.comprovantes, relatorio.paginas), (1, 2, 3))
+        self.assertEqual(len(PdfReader(io.BytesIO(destino.getvalue())).pages), 3)
+        self.assertEqual(
+            sorted(self.pasta.iterdir()),
+            sorted(comprovantes.caminho(consulta) for consulta in self.consultas),
+        )
+
+    def test_zip_com_um_arquivo_por_documento(self):
+        destino = io.BytesIO()
+        lote_pdf.gerar(lote_pdf.consultas(self.data), destino, 'zip', processos=2)
+
+        with zipfile.ZipFile(io.BytesIO(destino.getvalue())) as pacote:
+            self.assertEqual(pacote.namelist(), [
+                f'agenda_medico_lote_{self.data:%Y%m%d}.pdf',
+                *(comprovantes.nome_arquivo(consulta) for consulta in self.consultas),
+            ])
+            self.assertTrue(all(pacote.read(nome).startswith(b'%PDF') for nome in pacote.namelist()))
+        self.assertEqual(len(list(self.pasta.iterdir())), 2)
+
+
+class OrcamentoDesempenhoTests(TestCase):
+    """
+    Acessa cada URL de pessoas/urls.py com cada papel sobre um volume de
+    dados realista e confere o número de queries e o tempo de cada view
+    contra o orçamento abaixo. Caches são limpos antes de cada requisição
+    (mede-se o caminho frio) e cada requisição roda em uma transação
+    desfeita no fim, então ações que alteram dados não afetam as seguintes.
+    Os orçamentos contam todas as queries, inclusive as da tabela do cache
+    (DatabaseCache): no caminho frio, cada valor guardado custa a leitura que
+    falhou e a gravação. O relatório separa quantas foram do cache.
+
+    O resultado vai para um JSON (SIMED_RELATORIO_DESEMPENHO, padrão
+    relatorio_desempenho.json na raiz do projeto) para comparar versões.
+    SIMED_FATOR_TEMPO multiplica os orçamentos de tempo em máquinas lentas.
+    """
+    PACIENTES = 400
+    MEDICOS = 30
+    CONSULTAS = 3000
+    MEDICAMENTOS = 80
+    COMENTARIOS = 60
+
+    PAPEIS = ('anonimo', 'paciente', 'atendente', 'medico', 'admin')
+
+    # Máximo de queries por requisição (no pior papel), cache incluído; não
+    # pode crescer com o volume, exceto pelos lotes de ORCAMENTO_POR_LOTE
+    ORCAMENTO_QUERIES = {
+        'home': 24,
+        'sobre': 15,
+        'consulta_rapida': 4,
+        'cirurgia': 13,
+        'exames': 13,
+        'odontologia': 13,
+        'oftalmologia': 13,
+        'tomografia': 13,
+        'encontre': 4,
+        'consulta': 0,
+        'agenda': 4,
+        'checkup_consulta': 4,
+        'checkup_tratamento': 4,
+        'politicas-de-uso': 4,
+        'profissionais': 27,
+        'profissional_detalhe': 15,
+        'profissionais_especialidade': 10,
+        'privacidade': 4,
+        'cadastro': 4,
+        'login': 3,
+        'logout': 6,
+        'painel': 3,
+        'painel_medico': 6,
+        'painel_paciente': 15,
+        'painel_atendente': 13,
+        'agenda_eventos': 6,
+        'horarios_disponiveis_ajax': 12,
+        'reservar_horario_ajax': 4,
+        'escrever_relatorio': 7,
+        'download_consulta_pdf': 10,
+        'lista_medicamentos': 5,
+        'cadastrar_medicamento': 4,
+        'excluir_medicamento': 3,
+        'dashboard_admin': 5,
+        'dashboard_produtos': 5,
+        'dashboard_consultas': 6,
+        'dashboard_ocupacao': 19,
+        'dashboard_pacientes': 5,
+        'dashboard_medicos': 5,
+        'exportar_consultas': 5,
+        'exportar_pacientes': 5,
+        'editar_medicamento': 5,
+        'cancelar_consulta_admin': 24,
+        'remover_medico': 56,
+        'remover_paciente': 43,
+        'gerenciar_cargos': 6,
+        'dashboard_profissionais': 8,
+        'adicionar_profissional': 6,
+        'editar_profissional': 9,
+        'remover_profissional': 22,
+        'dashboard_especialidades': 7,
+        'adicionar_especialidade': 5,
+        'remover_especialidade': 7,
+        'dashboard_horarios': 6,
+        'configurar_horarios': 6,
+        'remover_horario': 4,
+        'horarios_profissional_ajax': 9,
+        'horarios_periodo_ajax': 13,
+        'proximos_horarios_especialidade': 10,
+        'cache_disponibilidade_estatisticas': 9,
+        'cache_paginas_estatisticas': 5,
+        'ocupacao_json': 19,
+        'download_consulta_ics': 8,
+        'calendario_feed': 5,
+        'assinar_calendario': 4,
+        'enviar_comentario': 4,
+        'dashboard_comentarios': 7,
+        'aprovar_comentario': 5,
+        'reprovar_comentario': 5,
+        'excluir_comentario': 5,
+    }
+
+    # As remoções de usuário excluem as consultas dele em lote: o Django apaga
+    # de LOTE_REMOCAO em LOTE_REMOCAO e os eventos são gravados com bulk_create,
+    # então cabem estas queries a mais por lote de consultas removidas
+    LOTE_REMOCAO = 100
+    ORCAMENTO_POR_LOTE = {
+        'remover_medico': 2,
+        'remover_paciente': 2,
+    }
+
+    # Tempo máximo por requisição, em ms; views fora da lista usam o padrão
+    ORCAMENTO_MS_PADRAO = 500
+    ORCAMENTO_MS = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        agora = timezone.now()
+        hoje = timezone.localdate()
+
+        especialidades = Especialidade.objects.bulk_create([
+            Especialidade(nome=f'Especialidade {i}') for i in range(8)
+        ])
+
+        def criar_usuarios(prefixo, quantidade, tipo):
+            User.objects.bulk_create([
+                User(username=f'{prefixo}{i}', first_name=prefixo.title(), last_name=str(i))
+                for i in range(quantidade)
+            ])
+            usuarios = list(User.objects.filter(username__startswith=prefixo).order_by('id'))
+            Perfil.objects.bulk_create([Perfil(usuario=u, tipo_usuario=tipo) for u in usuarios])
+            return usuarios
+
+        pacientes = criar_usuarios('paciente', cls.PACIENTES, 'paciente')
+        medicos = criar_usuarios('medico', cls.MEDICOS, 'medico')
+        cls.atendente = criar_usuarios('atendente', 1, 'atendente')[0]
+        cls.admin = User.objects.create_superuser('admin_orcamento', 'admin@simed.test', 'x')
+        cls.paciente, cls.medico = pacientes[0], medicos[0]
+
+        Profissional.objects.bulk_create([
+            Profissional(
+                usuario=medico, nome=f'Dr. Medico {i}', slug=f'medico-{i}',
+                especialidade=especialidades[i % len(especialidades)], crm=f'CRM{i}',
+            )
+            for i, medico in enumerate(medicos)
+        ])
+        profissionais = list(Profissional.objects.order_by('id'))
+        HorarioTrabalho.objects.bulk_create([
+            HorarioTrabalho(
+                profissional=profissional, dia_semana=dia,
+                hora_inicio=time(8, 0), hora_fim=time(17, 0), intervalo_minutos=30,
+            )
+            for profissional in profissionais for dia in range(5)
+        ])
+
+        # Consultas espalhadas 30 dias para trás e para frente, sem repetir (médico, horário)
+        Consulta.objects.bulk_create([
+            Consulta(
+                paciente=pacientes[i % len(pacientes)],
+                medico=medicos[i % len(medicos)],
+                profissional=profissionais[i % len(profissionais)],
+                data_hora=timezone.make_aware(datetime.combine(
+                    hoje + timedelta(days=(i // len(medicos)) % 60 - 30),
+                    time(8 + (i // (len(medicos) * 60)) % 9, 0)
+                )),
+                status=('agendada', 'confirmada', 'concluida', 'cancelada')[i % 4],
+            )
+            for i in range(cls.CONSULTAS)
+        ])
+        # Mais consultas para o paciente usado nos acessos (o médico já tem 1 a cada MEDICOS)
+        Consulta.objects.filter(pk__in=Consulta.objects.order_by('id').values('pk')[:40]).update(
+            paciente=cls.paciente
+        )
+        metricas.recalcular()
+
+        Medicamento.objects.bulk_create([
+            Medicamento(nome=f'Medicamento {i}', valor=10 + i, estoque=i) for i in range(cls.MEDICAMENTOS)
+        ])
+        ComentarioPaciente.objects.bulk_create([
+            ComentarioPaciente(
+                paciente=pacientes[i], texto='Ótimo atendimento', avaliacao=5,
+                status=('pendente', 'aprovado', 'reprovado')[i % 3],
+                data_aprovacao=agora if i % 3 == 1 else None,
+            )
+            for i in range(cls.COMENTARIOS)
+        ])
+
+        consulta = Consulta.objects.filter(paciente=cls.paciente, medico=cls.medico).first()
+        profissional = profissionais[0]
+        cls.profissional_2 = profissionais[1]
+        cls.argumentos = {
+            'slug': profissional.slug,
+            'especialidade_id': profissional.especialidade_id,
+            'consulta_id': consulta.id,
+            'medicamento_id': Medicamento.objects.first().id,
+            'medico_id': medicos[1].id,
+            'paciente_id': pacientes[1].id,
+            'user_id': pacientes[2].id,
+            'profissional_id': profissional.id,
+            'horario_id': profissional.horarios.first().id,
+            'comentario_id': ComentarioPaciente.objects.first().id,
+            'token': AssinaturaCalendario.objects.create(profissional=profissional).token,
+        }
+        # Consultas que cada remoção exclui, para o orçamento por lote
+        cls.removidas = {
+            'remover_medico': Consulta.objects.filter(
+                Q(medico=medicos[1]) | Q(paciente=medicos[1])
+            ).count(),
+            'remover_paciente': Consulta.objects.filter(
+                Q(medico=pacientes[1]) | Q(paciente=pacientes[1])
+            ).count(),
+        }
+        cls.volumes = {
+            'pacientes': cls.PACIENTES,
+            'medicos': cls.MEDICOS,
+            'consultas': cls.CONSULTAS,
+            'medicamentos': cls.MEDICAMENTOS,
+            'comentarios': cls.COMENTARIOS,
+        }
+
+    def setUp(self):
+        pasta_temporaria_de_comprovantes(self)
+
+    def orcamento_queries(self, nome):
+        lotes = -(-self.removidas.get(nome, 0) // self.LOTE_REMOCAO)
+        return self.ORCAMENTO_QUERIES[nome] + self.ORCAMENTO_POR_LOTE.get(nome, 0) * lotes
+
+    def usuario(self, papel):
+        return {
+            'anonimo': None,
+            'paciente': self.paciente,
+            'atendente': self.atendente,
+            'medico': self.medico,
+            'admin': self.admin,
+        }[papel]
+
+    def url(self, padrao):
+        argumentos = {nome: self.argumentos[nome] for nome in padrao.pattern.converters}
+        # Parâmetros de consulta que algumas APIs exigem
+        consulta = {
+            'horarios_disponiveis_ajax': f'?medico_id={self.medico.id}&data={timezone.localdate() + timedelta(days=1)}',
+            'horarios_profissional_ajax': f'?data={timezone.localdate() + timedelta(days=1)}',
+            'horarios_periodo_ajax': (
+                f'?profissional_id={self.argumentos["profissional_id"]},{self.profissional_2.id}'
+                f'&inicio={timezone.localdate()}&fim={timezone.localdate() + timedelta(days=13)}'
+            ),
+        }.get(padrao.name, '')
+        return reverse(padrao.name, kwargs=argumentos) + consulta
+
+    def entrar(self, usuario):
+        """
+        Login com o papel já guardado na sessão, como nas requisições
+        seguintes à primeira; refeito a cada URL porque a lista inclui o logout.
+        """
+        if usuario is None:
+            self.client.logout()
+            return
+        self.client.force_login(usuario)
+        sessao = self.client.session
+        sessao[papeis.CHAVE_SESSAO] = [usuario.pk, papeis.versao(usuario.pk), get_user_role(usuario)]
+        sessao.save()
+
+    def medir(self, url, usuario):
+        """
+        (status, queries, queries do cache, ms) de um GET, com o corpo inteiro
+        lido. As queries contam também as da tabela do cache.
+        """
+        cache.clear()
+        self.entrar(usuario)
+        # O log de queries da conexão tem tamanho máximo; cheio, a contagem zeraria
+        connection.queries_log.clear()
+        # A gravação periódica dos contadores de cache (uma por minuto por
+        # processo) não pertence a nenhuma view
+        with transaction.atomic(), mock.patch.object(contadores, 'INTERVALO', float('inf')):
+            inicio = cronometro.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                resposta = self.client.get(url)
+                if resposta.streaming:
+                    b''.join(resposta.streaming_content)
+            ms = (cronometro.perf_counter() - inicio) * 1000
+            transaction.set_rollback(True)
+        do_cache = sum(TABELA_CACHE in query['sql'] for query in queries)
+        return resposta.status_code, len(queries), do_cache, ms
+
+    def test_orcamento_por_view(self):
+        fator_tempo = float(os.environ.get('SIMED_FATOR_TEMPO', '1'))
+        padroes = [padrao for padrao in urls.urlpatterns if padrao.name]
+        self.assertEqual(
+            sorted(p.name for p in padroes if p.name not in self.ORCAMENTO_QUERIES), [],
+            'URLs sem orçamento de queries'
+        )
+
+        self.client.raise_request_exception = False
+        resultados = {}
+        for papel in self.PAPEIS:
+            usuario = self.usuario(papel)
+            for padrao in padroes:
+                status, queries, queries_cache, ms = self.medir(self.url(padrao), usuario)
+                resultados[f'{padrao.name}|{papel}'] = {
+                    'status': status,
+                    'queries': queries,
+                    'queries_cache': queries_cache,
+                    'ms': round(ms, 1),
+                    'orcamento_queries': self.orcamento_queries(padrao.name),
+                    'orcamento_ms': self.ORCAMENTO_MS.get(padrao.name, self.ORCAMENTO_MS_PADRAO) * fator_tempo,
+                }
+
+        caminho = os.environ.get('SIMED_RELATORIO_DESEMPENHO', settings.BASE_DIR / 'relatorio_desempenho.json')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                'django': django.get_version(),
+                'banco': connection.vendor,
+                'volumes': self.volumes,
+                'views': resultados,
+            }, arquivo, indent=2, sort_keys=True, ensure_ascii=False)
+
+        for chave, resultado in resultados.items():
+            with self.subTest(view=chave):
+                self.assertLess(resultado['status'], 500)
+                self.assertLessEqual(resultado['queries'], resultado['orcamento_queries'])
+                self.assertLessEqual(resultado['ms'], resultado['orcamento_ms'])
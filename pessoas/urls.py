@@ -41,7 +41,9 @@ urlpatterns = [
     path("painel/medico/", views.painel_medico, name="painel_medico"),
     path("painel/paciente/", views.painel_paciente, name="painel_paciente"),
     path("painel/atendente/", views.painel_atendente, name="painel_atendente"),
+    path("painel/atendente/eventos/", views.agenda_eventos, name="agenda_eventos"),
     path('ajax/horarios_disponiveis/', views.get_horarios_disponiveis_ajax, name='horarios_disponiveis_ajax'),
+    path('ajax/reservar_horario/', views.reservar_horario_ajax, name='reservar_horario_ajax'),
 
     # URLs de Ações
     path("consulta/<int:consulta_id>/relatorio/", views.escrever_relatorio, name="escrever_relatorio"),
@@ -57,6 +59,8 @@ urlpatterns = [
     path('dashboard/ocupacao/', views.dashboard_ocupacao, name='dashboard_ocupacao'),
     path('dashboard/pacientes/', views.dashboard_pacientes, name='dashboard_pacientes'),
     path('dashboard/medicos/', views.dashboard_medicos, name='dashboard_medicos'),
+    path('dashboard/exportar/consultas/', views.exportar_consultas, name='exportar_consultas'),
+    path('dashboard/exportar/pacientes/', views.exportar_pacientes, name='exportar_pacientes'),
     
     # Ações do Dashboard
     path('dashboard/medicamento/<int:medicamento_id>/editar/', views.editar_medicamento, name='editar_medicamento'),
@@ -85,9 +89,17 @@ urlpatterns = [
     
     # API para horários disponíveis por profissional
     path('api/profissional/<int:profissional_id>/horarios/', views.get_horarios_profissional_ajax, name='horarios_profissional_ajax'),
+    path('api/profissionais/horarios/', views.get_horarios_periodo_ajax, name='horarios_periodo_ajax'),
+    path('api/especialidade/<int:especialidade_id>/proximos-horarios/', views.proximos_horarios_especialidade_ajax, name='proximos_horarios_especialidade'),
+    path('api/disponibilidade/cache/', views.cache_disponibilidade_estatisticas, name='cache_disponibilidade_estatisticas'),
+    path('api/paginas/cache/', views.cache_paginas_estatisticas, name='cache_paginas_estatisticas'),
+    path('api/ocupacao/', views.ocupacao_json, name='ocupacao_json'),
     
     # Download de arquivo ICS para calendário
     path('consulta/<int:consulta_id>/ics/', views.download_consulta_ics, name='download_consulta_ics'),
+    # Feed assinável (webcal) da agenda do profissional ou das consultas do paciente
+    path('calendario/<str:token>.ics', views.calendario_feed, name='calendario_feed'),
+    path('calendario/assinar/', views.assinar_calendario, name='assinar_calendario'),
     
     # URLs para Comentarios de Pacientes
     path('comentario/enviar/', views.enviar_comentario, name='enviar_comentario'),
@@ -8,65 +8,46 @@ from .forms import (
     RelatorioConsultaForm, AgendarConsultaAtendenteForm, 
     MedicamentoForm, LoginUsuarioForm
 )
-from .models import User, Perfil, Consulta, Medicamento, Profissional, Especialidade, HorarioTrabalho, ComentarioPaciente
+from .models import User, Perfil, Consulta, Medicamento, Profissional, Especialidade, HorarioTrabalho, ComentarioPaciente, AssinaturaCalendario
 from .decorators import (
     admin_required, medico_required, atendente_required, paciente_required,
-    role_required, min_role_required, get_user_role
+    role_required, min_role_required, get_request_role
 )
+from . import agenda_paginada, cache_paginas, calendario_ics, comprovantes, disponibilidade, diretorio, eventos_agenda, reservas, cache_disponibilidade, metricas, ocupacao, exportacao
+from .agendamento import agendar_consulta, remover_consultas, HorarioIndisponivel
+from .busca_horarios import proximos_horarios, PERIODOS
 from django.utils import timezone
 from datetime import timedelta, time, datetime
-from django.db.models import Q
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_GET, require_POST
+from django.db import transaction
+from django.db.models import Q, Prefetch
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET, require_http_methods, require_POST, require_safe
 from django.template.loader import render_to_string
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-from reportlab.lib.colors import HexColor
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph
-import io
-
-def gerar_horarios_disponiveis(medico_id, data_selecionada=None):
+
+def gerar_horarios_disponiveis(medico_id, data_selecionada=None, usuario=None):
     """
     Gera uma lista de tuplas (hora_str, hora_str) para os horários disponíveis
-    do médico no dia selecionado, de 15 em 15 minutos, das 8h às 18h.
+    do médico no dia selecionado, a partir da grade de disponibilidade
+    (horários de trabalho ou a grade padrão). Horários reservados
+    temporariamente por outro usuário que não `usuario` são omitidos.
     """
-    horarios_base = []
-    hora_inicio = datetime.strptime("08:00", "%H:%M").time()
-    hora_fim = datetime.strptime("18:00", "%H:%M").time()
-    intervalo = timedelta(minutes=15)
-
-    # Gera todos os horários possíveis de 15 em 15 minutos
-    current_time = datetime.combine(datetime.min, hora_inicio)
-    while current_time.time() < hora_fim:
-        horarios_base.append(current_time.time())
-        current_time += intervalo
-
     if not medico_id or not data_selecionada:
         # Se o médico ou a data não forem selecionados, retorna uma lista vazia
         return []
 
-    # Se a data for selecionada, verifica as consultas existentes
-    data_inicio = timezone.make_aware(datetime.combine(data_selecionada, hora_inicio))
-    data_fim = timezone.make_aware(datetime.combine(data_selecionada, hora_fim))
+    reservados = reservas.horarios_reservados([medico_id], data_selecionada, data_selecionada, usuario)
+    reservados = {hora for _, _, hora in reservados}
 
-    consultas_ocupadas = Consulta.objects.filter(
-        medico__id=medico_id,
-        data_hora__gte=data_inicio,
-        data_hora__lt=data_fim,
-        status='agendada'
-    ).values_list('data_hora', flat=True)
+    livres = cache_disponibilidade.obter(
+        cache_disponibilidade.chave_medico(medico_id, data_selecionada),
+        lambda: disponibilidade.horarios_livres_do_medico(medico_id, data_selecionada)
+    )
+    return [(h.isoformat(timespec='minutes'), h.strftime("%H:%M")) for h in livres if h not in reservados]
 
-    # Converte os datetimes ocupados para objetos time localizados
-    horarios_ocupados = {timezone.localtime(dt).time() for dt in consultas_ocupadas}
-    
-    horarios_disponiveis = []
-    for h in horarios_base:
-        if h not in horarios_ocupados:
-            horarios_disponiveis.append((h.isoformat(timespec='minutes'), h.strftime("%H:%M")))
-            
-    return horarios_disponiveis
 
 @require_GET
 def get_horarios_disponiveis_ajax(request):
@@ -85,13 +66,53 @@ def get_horarios_disponiveis_ajax(request):
     except ValueError:
         return JsonResponse({'error': 'ID do médico ou formato de data inválido.'}, status=400)
 
-    horarios = gerar_horarios_disponiveis(medico_id, data_selecionada)
+    horarios = gerar_horarios_disponiveis(medico_id, data_selecionada, request.user)
     
     # Formato de retorno: [{'value': '08:00:00', 'display': '08:00'}, ...]
     horarios_json = [{'value': h[0], 'display': h[1]} for h in horarios]
 
     return JsonResponse({'horarios': horarios_json})
 
+@login_required
+@require_POST
+def reservar_horario_ajax(request):
+    """
+    Reserva temporariamente o horário escolhido no formulário de agendamento,
+    para que ele não apareça para outros usuários enquanto o formulário é
+    preenchido.
+    """
+    medico_id_str = request.POST.get('medico_id')
+    data_str = request.POST.get('data')
+    hora_str = request.POST.get('hora')
+
+    if not medico_id_str or not data_str or not hora_str:
+        return JsonResponse({'error': 'Médico, data e hora são obrigatórios.'}, status=400)
+
+    try:
+        medico_id = int(medico_id_str)
+        data_hora = timezone.make_aware(datetime.combine(
+            datetime.strptime(data_str, '%Y-%m-%d').date(),
+            time.fromisoformat(hora_str)
+        ))
+    except ValueError:
+        return JsonResponse({'error': 'ID do médico, data ou hora inválidos.'}, status=400)
+
+    try:
+        reserva = reservas.reservar(request.user, medico_id, data_hora)
+    except reservas.HorarioInvalido as erro:
+        return JsonResponse({'reservado': False, 'mensagem': str(erro)}, status=400)
+    if reserva is None:
+        return JsonResponse({
+            'reservado': False,
+            'mensagem': 'Este horário acabou de ser escolhido por outra pessoa. Por favor, escolha outro.'
+        }, status=409)
+
+    return JsonResponse({
+        'reservado': True,
+        'expira_em': reserva.expira_em.isoformat(),
+        'validade_segundos': reservas.TTL_MINUTOS * 60
+    })
+
 # --- VIEWS DE PÁGINA ---
 
 def sobre(request):
@@ -122,7 +143,8 @@ def tomografia(request):
     return render(request, 'pessoas/tomografia.html')
 
 def consulta(request):
-    return render(request, 'pessoas/consulta.html')
+    # O agendamento fica no painel do paciente (não há template próprio)
+    return redirect('painel_paciente')
 
 def agenda(request):
     return render(request, 'pessoas/agenda.html')
@@ -132,11 +154,9 @@ def politicas_de_uso(request):
 
 def profissionais(request):
     """Lista todos os profissionais ativos"""
-    profissionais_lista = Profissional.objects.filter(ativo=True).select_related('especialidade')
-    especialidades = Especialidade.objects.all()
     return render(request, 'pessoas/profissionais.html', {
-        'profissionais': profissionais_lista,
-        'especialidades': especialidades
+        'profissionais': diretorio.profissionais(),
+        'especialidades': diretorio.especialidades()
     })
 
 def profissional_detalhe(request, slug):
@@ -149,10 +169,10 @@ def profissional_detalhe(request, slug):
 def profissionais_por_especialidade(request, especialidade_id):
     """Lista profissionais de uma especialidade específica"""
     especialidade = get_object_or_404(Especialidade, pk=especialidade_id)
-    profissionais_lista = Profissional.objects.filter(
-        especialidade=especialidade, 
-        ativo=True
-    )
+    profissionais_lista = [
+        profissional for profissional in diretorio.profissionais()
+        if profissional.especialidade_id == especialidade.id
+    ]
     return render(request, 'pessoas/profissionais_especialidade.html', {
         'especialidade': especialidade,
         'profissionais': profissionais_lista
@@ -250,70 +270,66 @@ def painel(request):
         if request.user.is_staff:
             return redirect('dashboard_consultas')
         elif perfil.tipo_usuario == 'medico':
-            return redirect('dashboard')
+            return redirect('painel_medico')
         elif perfil.tipo_usuario == 'paciente':
             return redirect('home')
         elif perfil.tipo_usuario == "atendente":
             return redirect("painel_atendente")
+        return redirect('dashboard_admin')
     except Perfil.DoesNotExist:
         return redirect('login')
         
 @medico_required
 def painel_medico(request):
-    user_role = get_user_role(request.user)
+    user_role = get_request_role(request)
     if user_role == 'admin':
-        consultas = Consulta.objects.all().order_by('data_hora')
+        consultas = Consulta.objects.all()
     else:
-        consultas = Consulta.objects.filter(medico=request.user).order_by('data_hora')
-    return render(request, 'pessoas/painel_medico.html', {'consultas': consultas})
+        consultas = Consulta.objects.filter(medico=request.user)
+    # Só a janela pedida (padrão: hoje), em páginas por (data_hora, id)
+    return render(request, 'pessoas/painel_medico.html', {
+        **agenda_paginada.agenda(request, consultas),
+        **_contexto_calendario(request),
+    })
 
 @paciente_required
 def painel_paciente(request):
-    user_role = get_user_role(request.user)
+    user_role = get_request_role(request)
     if user_role == 'admin':
-        consultas = Consulta.objects.all().order_by('-data_hora')
+        consultas = Consulta.objects.all()
     else:
-        consultas = Consulta.objects.filter(paciente=request.user).order_by('-data_hora')
+        consultas = Consulta.objects.filter(paciente=request.user)
+    consultas = consultas.select_related(
+        'medico__profissional__especialidade', 'profissional__especialidade'
+    )
 
     if request.method == 'POST':
         form = AgendarConsultaForm(request.POST)
         if form.is_valid():
-            nova_consulta = form.save(commit=False)
-            nova_consulta.paciente = request.user
-            nova_consulta.data_hora = form.cleaned_data.get('data_hora')
-            nova_consulta.save()
-            medico_nome = f"{nova_consulta.medico.username} {nova_consulta.medico.last_name}"
-            data_formatada = nova_consulta.data_hora.strftime("%d/%m/%Y às %H:%M")
-            messages.success(request, f'Sua consulta com Dr(a). {medico_nome} foi agendada para {data_formatada}. Você pode baixar o comprovante em PDF.')
-            return redirect('painel_paciente')
+            try:
+                nova_consulta = agendar_consulta(
+                    paciente=request.user,
+                    medico=form.cleaned_data['medico'],
+                    data_hora=form.cleaned_data['data_hora'],
+                    reservado_por=request.user
+                )
+            except HorarioIndisponivel as erro:
+                form.add_error(None, str(erro))
+            else:
+                medico_nome = f"{nova_consulta.medico.username} {nova_consulta.medico.last_name}"
+                data_formatada = timezone.localtime(nova_consulta.data_hora).strftime("%d/%m/%Y às %H:%M")
+                messages.success(request, f'Sua consulta com Dr(a). {medico_nome} foi agendada para {data_formatada}. Você pode baixar o comprovante em PDF.')
+                return redirect('painel_paciente')
     else:
         form = AgendarConsultaForm()
 
-    medicos = User.objects.filter(perfil__tipo_usuario='medico')
-    medicos_info = []
-    for medico in medicos:
-        try:
-            prof = Profissional.objects.get(usuario=medico)
-            medicos_info.append({
-                'id': medico.id,
-                'nome': f"Dr(a). {medico.username} {medico.last_name}",
-                'foto': prof.foto.url if prof.foto else '',
-                'especialidade': prof.especialidade.nome if prof.especialidade else 'Clínica Geral',
-                'inicial': medico.username[:1].upper() if medico.username else 'M'
-            })
-        except Profissional.DoesNotExist:
-            medicos_info.append({
-                'id': medico.id,
-                'nome': f"Dr(a). {medico.username} {medico.last_name}",
-                'foto': '',
-                'especialidade': 'Clínica Geral',
-                'inicial': medico.username[:1].upper() if medico.username else 'M'
-            })
-
+    # Da mais recente para a mais antiga, em páginas por (data_hora, id)
     return render(request, 'pessoas/painel_paciente.html', {
-        'consultas': consultas,
+        **agenda_paginada.historico(request, consultas),
+        'total_consultas': consultas.count(),
         'form': form,
-        'medicos_info': medicos_info
+        'medicos_info': diretorio.medicos(),
+        **_contexto_calendario(request),
     })
 
 @login_required
@@ -326,31 +342,69 @@ def checkup_tratamento(request):
     
 @atendente_required
 def painel_atendente(request):
-    consultas = Consulta.objects.all().order_by("data_hora")
 
     if request.method == "POST":
         form = AgendarConsultaAtendenteForm(request.POST)
         if form.is_valid():
-            nova_consulta = form.save(commit=False)
-            nova_consulta.data_hora = form.cleaned_data.get('data_hora')
-            nova_consulta.save()
-            messages.success(request, 'Consulta agendada com sucesso!')
-            return redirect("painel_atendente")
+            try:
+                agendar_consulta(
+                    paciente=form.cleaned_data['paciente'],
+                    medico=form.cleaned_data['medico'],
+                    data_hora=form.cleaned_data['data_hora'],
+                    reservado_por=request.user
+                )
+            except HorarioIndisponivel as erro:
+                form.add_error(None, str(erro))
+            else:
+                messages.success(request, 'Consulta agendada com sucesso!')
+                return redirect("painel_atendente")
     else:
         form = AgendarConsultaAtendenteForm()
 
     form.fields['hora'].choices = [('', '---------')]
 
     return render(request, "pessoas/painel_atendente.html", {
-        "consultas": consultas,
-        "form": form
+        **agenda_paginada.agenda(request, Consulta.objects.all()),
+        "form": form,
+        # A página já reflete os eventos até aqui; o stream continua deste ponto
+        "ultimo_evento": eventos_agenda.ultimo_id()
     })
 
+
+@require_GET
+async def agenda_eventos(request):
+    """
+    Stream (text/event-stream) das consultas criadas, alteradas e removidas
+    hoje, a partir do evento ?desde= ou do cabeçalho Last-Event-ID. Sob ASGI
+    a conexão fica aberta sem ocupar uma thread; sob WSGI responde só com os
+    eventos pendentes e o navegador reconecta.
+    """
+    usuario = await request.auser()
+    if not usuario.is_authenticated or await sync_to_async(get_request_role)(request) not in ('admin', 'medico', 'atendente'):
+        return HttpResponseForbidden()
+    try:
+        apos = int(request.headers.get('Last-Event-ID') or request.GET.get('desde') or 0)
+    except ValueError:
+        apos = 0
+
+    hoje = timezone.localdate()
+    if isinstance(request, ASGIRequest):
+        corpo = eventos_agenda.stream(hoje, apos)
+    else:
+        corpo = [f'retry: {eventos_agenda.RETRY_MS}\n\n'] + [
+            eventos_agenda.formatar(evento) for evento in await eventos_agenda.pendentes(hoje, apos)
+        ]
+    response = StreamingHttpResponse(corpo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Impede que proxies (nginx) segurem os eventos em buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # --- AÇÕES ESPECÍFICAS ---
 
 @medico_required
 def escrever_relatorio(request, consulta_id):
-    user_role = get_user_role(request.user)
+    user_role = get_request_role(request)
     if user_role == 'admin':
         consulta = get_object_or_404(Consulta, id=consulta_id)
     else:
@@ -381,25 +435,15 @@ def dashboard_produtos(request):
 
 @admin_required
 def dashboard_consultas(request):
-    from django.db.models import Count
-    from datetime import date
-    
-    total_consultas = Consulta.objects.count()
-    consultas_realizadas = Consulta.objects.filter(status='concluida').count()
-    consultas_agendadas = Consulta.objects.filter(status='agendada').count()
-    consultas_canceladas = Consulta.objects.filter(status='cancelada').count()
-    
-    max_atendimentos_dia = Consulta.objects.filter(
-        data_hora__date=date.today()
-    ).count()
-    
-    medico_mais_ocupado = Consulta.objects.filter(
-        status='agendada'
-    ).values(
-        'medico__first_name', 'medico__last_name'
-    ).annotate(
-        total=Count('id')
-    ).order_by('-total').first()
+    # Totais mantidos pelos signals (pessoas/metricas.py) em vez de contar todas as consultas
+    totais = metricas.resumo_geral(timezone.localdate())
+    total_consultas = totais['total_consultas']
+    consultas_realizadas = totais['total_concluidas']
+    consultas_agendadas = totais['total_agendadas']
+    consultas_canceladas = totais['total_canceladas']
+    max_atendimentos_dia = totais['total_hoje']
+
+    medico_mais_ocupado = metricas.medico_mais_ocupado()
     
     profissional_nome = "N/A"
     if medico_mais_ocupado:
@@ -416,19 +460,97 @@ def dashboard_consultas(request):
     
     return render(request, 'pessoas/dashboard_consultas.html', contexto)
 
+def _parametros_ocupacao(request):
+    """Semana inicial, número de semanas e dia da semana pedidos ao mapa de ocupação."""
+    semana_str = request.GET.get('semana')
+    inicio = datetime.strptime(semana_str, '%Y-%m-%d').date() if semana_str else timezone.localdate()
+    semanas = int(request.GET.get('semanas', 1))
+    dia = request.GET.get('dia')
+    dia = int(dia) if dia not in (None, '') else None
+    if not 1 <= semanas <= ocupacao.MAX_SEMANAS or (dia is not None and not 0 <= dia <= 6):
+        raise ValueError
+    return inicio, semanas, dia
+
 @admin_required
 def dashboard_ocupacao(request):
-    consultas = Consulta.objects.filter(status='agendada').order_by('data_hora')
-    return render(request, 'pessoas/dashboard_ocupacao.html', {'consultas': consultas})
+    try:
+        inicio, semanas, dia = _parametros_ocupacao(request)
+    except ValueError:
+        inicio, semanas, dia = timezone.localdate(), 1, None
+    if dia is None:
+        dia = timezone.localdate().weekday()
+
+    mapa = ocupacao.mapa_ocupacao(inicio, semanas, dia)
+    segunda = datetime.strptime(mapa['inicio'], '%Y-%m-%d').date()
+    clinica = [
+        (mapa['dias_semana'][d], [(taxa, ocupacao.nivel(taxa)) for taxa in taxas])
+        for d, taxas in enumerate(mapa['clinica'])
+    ]
+    return render(request, 'pessoas/dashboard_ocupacao.html', {
+        'mapa': mapa,
+        'clinica': clinica,
+        'linhas': ocupacao.linhas_do_dia(mapa, dia),
+        'dia': dia,
+        'dias_semana': list(enumerate(mapa['dias_semana'])),
+        'semanas': semanas,
+        'opcoes_semanas': [1, 4, ocupacao.MAX_SEMANAS],
+        'semana_anterior': (segunda - timedelta(weeks=1)).isoformat(),
+        'semana_seguinte': (segunda + timedelta(weeks=1)).isoformat(),
+    })
+
+@admin_required
+@require_GET
+def ocupacao_json(request):
+    """
+    Mapa de ocupação em JSON. Parâmetros: semana (AAAA-MM-DD, padrão hoje),
+    semanas (1 a 12) e dia (0 = segunda a 6 = domingo, opcional) para trazer
+    o detalhe por profissional de um único dia.
+    """
+    try:
+        inicio, semanas, dia = _parametros_ocupacao(request)
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros inválidos.'}, status=400)
+    return JsonResponse(ocupacao.mapa_ocupacao(inicio, semanas, dia))
+
+@admin_required
+@require_GET
+def exportar_consultas(request):
+    """
+    Exporta todas as consultas (ou as de ?inicio=&fim=, AAAA-MM-DD) com
+    paciente, médico, profissional e especialidade. ?formato=csv ou jsonl.
+    """
+    formato = request.GET.get('formato', 'csv')
+    try:
+        inicio_str, fim_str = request.GET.get('inicio'), request.GET.get('fim')
+        inicio = datetime.strptime(inicio_str, '%Y-%m-%d').date() if inicio_str else None
+        fim = datetime.strptime(fim_str, '%Y-%m-%d').date() if fim_str else None
+    except ValueError:
+        return JsonResponse({'error': 'Datas inválidas.'}, status=400)
+    if formato not in exportacao.FORMATOS or bool(inicio) != bool(fim):
+        return JsonResponse({'error': 'Informe formato csv ou jsonl e, se filtrar, inicio e fim.'}, status=400)
+    return exportacao.resposta(
+        request, exportacao.consultas(inicio, fim), exportacao.COLUNAS_CONSULTAS, formato, 'consultas'
+    )
+
+@admin_required
+@require_GET
+def exportar_pacientes(request):
+    """Exporta os dados de perfil de todos os pacientes. ?formato=csv ou jsonl."""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in exportacao.FORMATOS:
+        return JsonResponse({'error': 'Informe formato csv ou jsonl.'}, status=400)
+    return exportacao.resposta(
+        request, exportacao.pacientes(), exportacao.COLUNAS_PACIENTES, formato, 'pacientes'
+    )
 
 @admin_required
 def dashboard_pacientes(request):
-    pacientes = User.objects.filter(perfil__tipo_usuario='paciente').order_by('first_name')
+    pacientes = User.objects.filter(perfil__tipo_usuario='paciente').select_related('perfil').order_by('first_name')
     return render(request, 'pessoas/dashboard_pacientes.html', {'pacientes': pacientes})
 
 @admin_required
 def dashboard_medicos(request):
-    medicos = User.objects.filter(perfil__tipo_usuario='medico').order_by('first_name')
+    medicos = User.objects.filter(perfil__tipo_usuario='medico').select_related('perfil').order_by('first_name')
     return render(request, 'pessoas/dashboard_medicos.html', {'medicos': medicos})
 
 @admin_required
@@ -455,7 +577,9 @@ def cancelar_consulta_admin(request, consulta_id):
 def remover_medico(request, medico_id):
     medico = get_object_or_404(User, pk=medico_id, perfil__tipo_usuario='medico')
     nome = f"{medico.username} {medico.last_name}"
-    medico.delete()
+    with transaction.atomic():
+        remover_consultas(Consulta.objects.filter(Q(medico=medico) | Q(paciente=medico)))
+        medico.delete()
     messages.success(request, f'Médico {nome} removido com sucesso.')
     return redirect('dashboard_medicos')
 
@@ -463,7 +587,9 @@ def remover_medico(request, medico_id):
 def remover_paciente(request, paciente_id):
     paciente = get_object_or_404(User, pk=paciente_id, perfil__tipo_usuario='paciente')
     nome = f"{paciente.username} {paciente.last_name}"
-    paciente.delete()
+    with transaction.atomic():
+        remover_consultas(Consulta.objects.filter(Q(medico=paciente) | Q(paciente=paciente)))
+        paciente.delete()
     messages.success(request, f'Paciente {nome} removido com sucesso.')
     return redirect('dashboard_pacientes')
 
@@ -497,7 +623,9 @@ def download_consulta_pdf(request, consulta_id):
     Gera e baixa um PDF com os detalhes da consulta agendada.
     Apenas o paciente dono da consulta ou um admin/médico pode baixar.
     """
-    consulta = get_object_or_404(Consulta, pk=consulta_id)
+    consulta = get_object_or_404(
+        Consulta.objects.select_related('paciente', 'medico', 'profissional__especialidade'), pk=consulta_id
+    )
     
     if request.user != consulta.paciente and not request.user.is_staff:
         try:
@@ -509,91 +637,23 @@ def download_consulta_pdf(request, consulta_id):
             messages.error(request, 'Você não tem permissão para baixar este documento.')
             return redirect('painel_paciente')
     
-    pdf_buffer = io.BytesIO()
-    p = canvas.Canvas(pdf_buffer, pagesize=A4)
-    width, height = A4
-    
-    primary_color = HexColor('#1B325F')
-    accent_color = HexColor('#4C98D0')
-    
-    p.setFillColor(primary_color)
-    p.rect(0, height - 3*cm, width, 3*cm, fill=True, stroke=False)
-    
-    p.setFillColor(HexColor('#FFFFFF'))
-    p.setFont("Helvetica-Bold", 24)
-    p.drawString(2*cm, height - 2*cm, "SIMED")
-    p.setFont("Helvetica", 12)
-    p.drawString(2*cm, height - 2.6*cm, "Servico Integrado de Medicina")
-    
-    p.setFillColor(primary_color)
-    p.setFont("Helvetica-Bold", 18)
-    p.drawString(2*cm, height - 5*cm, "Comprovante de Consulta")
-    
-    p.setFillColor(accent_color)
-    p.rect(2*cm, height - 5.3*cm, 6*cm, 0.1*cm, fill=True, stroke=False)
-    
-    y_pos = height - 7*cm
-    p.setFillColor(HexColor('#333333'))
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(2*cm, y_pos, "Dados do Paciente")
-    y_pos -= 0.7*cm
-    
-    p.setFont("Helvetica", 11)
-    p.drawString(2*cm, y_pos, f"Nome: {consulta.paciente.username} {consulta.paciente.last_name}")
-    y_pos -= 0.5*cm
-    p.drawString(2*cm, y_pos, f"Email: {consulta.paciente.email}")
-    y_pos -= 1*cm
-    
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(2*cm, y_pos, "Dados da Consulta")
-    y_pos -= 0.7*cm
-    
-    p.setFont("Helvetica", 11)
-    medico_nome = f"{consulta.medico.username} {consulta.medico.last_name}"
-    if consulta.profissional:
-        medico_nome = consulta.profissional.nome
-        if consulta.profissional.especialidade:
-            medico_nome += f" - {consulta.profissional.especialidade.nome}"
-    
-    p.drawString(2*cm, y_pos, f"Medico(a): Dr(a). {medico_nome}")
-    y_pos -= 0.5*cm
-    p.drawString(2*cm, y_pos, f"Data: {consulta.data_hora.strftime('%d/%m/%Y')}")
-    y_pos -= 0.5*cm
-    p.drawString(2*cm, y_pos, f"Horario: {consulta.data_hora.strftime('%H:%M')}")
-    y_pos -= 0.5*cm
-    p.drawString(2*cm, y_pos, f"Status: {consulta.get_status_display()}")
-    y_pos -= 0.5*cm
-    p.drawString(2*cm, y_pos, f"Codigo: #{consulta.id:05d}")
-    y_pos -= 1.5*cm
-    
-    p.setFillColor(accent_color)
-    p.rect(2*cm, y_pos, width - 4*cm, 0.05*cm, fill=True, stroke=False)
-    y_pos -= 1*cm
-    
-    p.setFillColor(HexColor('#666666'))
-    p.setFont("Helvetica", 9)
-    p.drawString(2*cm, y_pos, "Este documento e um comprovante de agendamento.")
-    y_pos -= 0.4*cm
-    p.drawString(2*cm, y_pos, "Apresente-o no dia da consulta.")
-    y_pos -= 0.8*cm
-    p.drawString(2*cm, y_pos, f"Documento gerado em: {timezone.now().strftime('%d/%m/%Y as %H:%M')}")
-    
-    p.setFillColor(primary_color)
-    p.rect(0, 0, width, 1.5*cm, fill=True, stroke=False)
-    p.setFillColor(HexColor('#FFFFFF'))
-    p.setFont("Helvetica", 8)
-    p.drawCentredString(width/2, 0.6*cm, "SIMED - Servico Integrado de Medicina | www.simed.com.br")
-    
-    p.showPage()
-    p.save()
-    
-    pdf_buffer.seek(0)
-    
-    filename = f"consulta_{consulta.id:05d}_{consulta.data_hora.strftime('%Y%m%d')}.pdf"
-    
-    response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
+    # O PDF da versão atual da consulta vem do disco; o navegador revalida pelo ETag
+    etag = comprovantes.etag(consulta)
+    ultima_modificacao = int(consulta.atualizado_em.timestamp())
+    nao_modificado = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    response = FileResponse(
+        open(comprovantes.obter(consulta), 'rb'),
+        as_attachment=True,
+        filename=comprovantes.nome_arquivo(consulta),
+        content_type='application/pdf',
+    )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacao)
+    # Dados do paciente: só o navegador guarda, e sempre revalida
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
@@ -745,11 +805,13 @@ def remover_especialidade(request, especialidade_id):
 
 @admin_required
 def dashboard_horarios(request):
-    profissionais = Profissional.objects.filter(ativo=True).select_related('especialidade').prefetch_related('horarios')
+    profissionais = Profissional.objects.filter(ativo=True).select_related('especialidade').prefetch_related(
+        Prefetch('horarios', queryset=HorarioTrabalho.objects.filter(ativo=True), to_attr='horarios_ativos')
+    )
     
     for prof in profissionais:
         horarios_por_dia = {}
-        for h in prof.horarios.filter(ativo=True):
+        for h in prof.horarios_ativos:
             if h.dia_semana not in horarios_por_dia:
                 horarios_por_dia[h.dia_semana] = []
             horarios_por_dia[h.dia_semana].append(h)
@@ -773,9 +835,9 @@ def configurar_horarios(request, profissional_id):
         (6, 'Domingo'),
     ]
     
-    horarios_existentes = profissional.horarios.filter(ativo=True)
-    horarios_ativos = list(horarios_existentes.values_list('dia_semana', flat=True))
-    horarios_dict = {h.dia_semana: h for h in horarios_existentes}
+    horarios_por_dia = {}
+    for horario in profissional.horarios.order_by('hora_inicio'):
+        horarios_por_dia.setdefault(horario.dia_semana, []).append(horario)
     
     if request.method == 'POST':
         HorarioTrabalho.objects.filter(profissional=profissional).delete()
@@ -799,11 +861,21 @@ def configurar_horarios(request, profissional_id):
         messages.success(request, f'Horários de {profissional.nome} atualizados com sucesso!')
         return redirect('dashboard_horarios')
     
+    # Um item por dia da semana, com o horário ativo (que preenche o formulário) e todos os do dia
+    dias = []
+    for dia_num, dia_nome in dias_semana:
+        horarios = horarios_por_dia.get(dia_num, [])
+        dias.append({
+            'num': dia_num,
+            'nome': dia_nome,
+            'ativo': next((h for h in horarios if h.ativo), None),
+            'horarios': horarios,
+        })
+
     return render(request, 'pessoas/configurar_horarios.html', {
         'profissional': profissional,
-        'dias_semana': dias_semana,
-        'horarios_ativos': horarios_ativos,
-        'horarios_dict': horarios_dict
+        'dias': dias,
+        'intervalos': [(15, '15 minutos'), (30, '30 minutos'), (45, '45 minutos'), (60, '1 hora')],
     })
 
 @admin_required
@@ -826,44 +898,31 @@ def get_horarios_profissional_ajax(request, profissional_id):
         return JsonResponse({'error': 'Data é obrigatória.'}, status=400)
     
     try:
-        profissional = Profissional.objects.get(pk=profissional_id, ativo=True)
+        profissional = Profissional.objects.select_related('especialidade').get(pk=profissional_id, ativo=True)
         data_selecionada = datetime.strptime(data_str, '%Y-%m-%d').date()
     except (Profissional.DoesNotExist, ValueError):
         return JsonResponse({'error': 'Profissional ou data inválidos.'}, status=400)
     
-    dia_semana = data_selecionada.weekday()
-    
-    horario_trabalho = profissional.horarios.filter(dia_semana=dia_semana, ativo=True).first()
+    slots = cache_disponibilidade.obter(
+        cache_disponibilidade.chave_profissional(profissional.id, data_selecionada),
+        lambda: disponibilidade.slots_do_dia(profissional, data_selecionada)
+    )
     
-    if not horario_trabalho:
+    if not slots:
         return JsonResponse({
             'disponivel': False,
             'mensagem': 'Profissional não atende neste dia.',
             'horarios': []
         })
     
-    horarios_disponiveis = []
-    hora_atual = datetime.combine(data_selecionada, horario_trabalho.hora_inicio)
-    hora_fim = datetime.combine(data_selecionada, horario_trabalho.hora_fim)
-    intervalo = timedelta(minutes=horario_trabalho.intervalo_minutos)
-    
-    consultas_ocupadas = set()
-    if profissional.usuario:
-        consultas = Consulta.objects.filter(
-            medico=profissional.usuario,
-            data_hora__date=data_selecionada,
-            status__in=['agendada', 'confirmada']
-        ).values_list('data_hora', flat=True)
-        consultas_ocupadas = {timezone.localtime(dt).time() for dt in consultas}
-    
-    while hora_atual < hora_fim:
-        horario_time = hora_atual.time()
-        if horario_time not in consultas_ocupadas:
-            horarios_disponiveis.append({
-                'value': horario_time.strftime('%H:%M'),
-                'display': horario_time.strftime('%H:%M')
-            })
-        hora_atual += intervalo
+    reservados = reservas.horarios_reservados(
+        [profissional.usuario_id], data_selecionada, data_selecionada, request.user
+    )
+    horarios_disponiveis = [
+        {'value': hora.strftime('%H:%M'), 'display': hora.strftime('%H:%M')}
+        for hora, ocupado in slots
+        if not ocupado and (profissional.usuario_id, data_selecionada, hora) not in reservados
+    ]
     
     return JsonResponse({
         'disponivel': True,
@@ -877,6 +936,156 @@ def get_horarios_profissional_ajax(request, profissional_id):
     })
 
 
+# Limites por requisição na API de disponibilidade por período
+MAX_DIAS_PERIODO = 62
+MAX_PROFISSIONAIS_PERIODO = 10
+
+@login_required
+@require_GET
+def get_horarios_periodo_ajax(request):
+    """
+    Retorna, em uma única requisição, os horários disponíveis de um ou mais
+    profissionais entre duas datas (inclusive), agrupados por dia.
+    Parâmetros: inicio, fim (AAAA-MM-DD) e profissional_id (repetido ou
+    separado por vírgulas, até MAX_PROFISSIONAIS_PERIODO). Ids de
+    profissionais inexistentes ou inativos são recusados antes de gerar
+    qualquer slot.
+    """
+    ids_str = ','.join(request.GET.getlist('profissional_id'))
+    inicio_str = request.GET.get('inicio')
+    fim_str = request.GET.get('fim')
+
+    if not ids_str or not inicio_str or not fim_str:
+        return JsonResponse({'error': 'Profissional, início e fim são obrigatórios.'}, status=400)
+
+    partes = [i for i in ids_str.split(',') if i.strip()]
+    if len(partes) > MAX_PROFISSIONAIS_PERIODO:
+        return JsonResponse({'error': f'Máximo de {MAX_PROFISSIONAIS_PERIODO} profissionais por consulta.'}, status=400)
+
+    try:
+        ids = {int(i) for i in partes}
+        inicio = datetime.strptime(inicio_str, '%Y-%m-%d').date()
+        fim = datetime.strptime(fim_str, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'ID do profissional ou formato de data inválido.'}, status=400)
+
+    if fim < inicio or (fim - inicio).days >= MAX_DIAS_PERIODO:
+        return JsonResponse({'error': f'Período inválido (máximo de {MAX_DIAS_PERIODO} dias).'}, status=400)
+
+    profissionais = list(Profissional.objects.filter(pk__in=ids, ativo=True).prefetch_related(
+        Prefetch('horarios', queryset=HorarioTrabalho.objects.filter(ativo=True), to_attr='horarios_ativos')
+    ))
+    desconhecidos = ids - {profissional.id for profissional in profissionais}
+    if desconhecidos:
+        return JsonResponse({
+            'error': 'Profissional não encontrado.',
+            'profissional_id': sorted(desconhecidos),
+        }, status=404)
+    reservados = reservas.horarios_reservados(
+        [profissional.usuario_id for profissional in profissionais], inicio, fim, request.user
+    )
+    mapa = disponibilidade.mapa_periodo(profissionais, inicio, fim, reservados)
+
+    return JsonResponse({
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'profissionais': {
+            str(profissional.id): {
+                'nome': profissional.nome,
+                'dias': mapa[profissional.id]
+            }
+            for profissional in profissionais
+        }
+    })
+
+
+# Limites da busca de próximos horários por especialidade
+DIAS_BUSCA_PADRAO = 30
+MAX_DIAS_BUSCA = 90
+MAX_RESULTADOS_BUSCA = 50
+
+@require_GET
+def proximos_horarios_especialidade_ajax(request, especialidade_id):
+    """
+    Retorna os N próximos horários livres entre todos os profissionais ativos
+    de uma especialidade. Parâmetros opcionais: inicio, fim (AAAA-MM-DD),
+    periodo (manha, tarde ou noite), de/ate (HH:MM) e n. Com periodo e
+    de/ate, só entram os horários que atendem aos dois.
+    """
+    especialidade = get_object_or_404(Especialidade, pk=especialidade_id)
+
+    try:
+        hoje = timezone.localdate()
+        inicio_str = request.GET.get('inicio')
+        fim_str = request.GET.get('fim')
+        inicio = datetime.strptime(inicio_str, '%Y-%m-%d').date() if inicio_str else hoje
+        fim = datetime.strptime(fim_str, '%Y-%m-%d').date() if fim_str else inicio + timedelta(days=DIAS_BUSCA_PADRAO - 1)
+        limite = min(int(request.GET.get('n', 10)), MAX_RESULTADOS_BUSCA)
+
+        # periodo e de/ate restringem juntos: vale o trecho comum aos dois
+        janelas = []
+        periodo = request.GET.get('periodo')
+        if periodo:
+            janelas.append(PERIODOS[periodo])
+        if request.GET.get('de') or request.GET.get('ate'):
+            de = time.fromisoformat(request.GET.get('de') or '00:00')
+            ate = time.fromisoformat(request.GET.get('ate') or '23:59')
+            janelas.append((de, ate))
+        if len(janelas) == 2:
+            (de_periodo, ate_periodo), (de, ate) = janelas
+            janelas = [(max(de_periodo, de), min(ate_periodo, ate))]
+    except (ValueError, KeyError):
+        return JsonResponse({'error': 'Parâmetros de busca inválidos.'}, status=400)
+
+    if limite < 1 or fim < inicio or (fim - inicio).days >= MAX_DIAS_BUSCA:
+        return JsonResponse({'error': f'Período inválido (máximo de {MAX_DIAS_BUSCA} dias).'}, status=400)
+
+    resultados = proximos_horarios(especialidade, inicio, fim, janelas, limite)
+
+    return JsonResponse({
+        'especialidade': {'id': especialidade.id, 'nome': especialidade.nome},
+        'horarios': [
+            {
+                'data': data_hora.date().isoformat(),
+                'hora': data_hora.strftime('%H:%M'),
+                'profissional': {
+                    'id': profissional.id,
+                    'nome': profissional.nome,
+                    'slug': profissional.slug,
+                    'medico_id': profissional.usuario_id,
+                }
+            }
+            for data_hora, profissional in resultados
+        ]
+    })
+
+
+@admin_required
+@require_http_methods(["GET", "POST"])
+def cache_disponibilidade_estatisticas(request):
+    """
+    Acertos e faltas do cache de disponibilidade. Um POST zera os contadores
+    depois da leitura, para medir um intervalo específico.
+    """
+    estatisticas = cache_disponibilidade.estatisticas()
+    if request.method == 'POST':
+        cache_disponibilidade.zerar_estatisticas()
+    return JsonResponse(estatisticas)
+
+
+@admin_required
+@require_http_methods(["GET", "POST"])
+def cache_paginas_estatisticas(request):
+    """
+    Acertos e faltas do cache de páginas públicas, no total e por página.
+    Um POST zera os contadores depois da leitura.
+    """
+    estatisticas = cache_paginas.estatisticas()
+    if request.method == 'POST':
+        cache_paginas.zerar_estatisticas()
+    return JsonResponse(estatisticas)
+
+
 @login_required
 def download_consulta_ics(request, consulta_id):
     """
@@ -894,40 +1103,59 @@ def download_consulta_ics(request, consulta_id):
             messages.error(request, 'Você não tem permissão para baixar este arquivo.')
             return redirect('painel_paciente')
     
-    start_dt = consulta.data_hora
-    end_dt = start_dt + timedelta(minutes=30)
-    
-    ics_content = f"""BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//SIMED//Consulta Médica//PT
-BEGIN:VEVENT
-UID:consulta-{consulta.id}@simed.com.br
-DTSTAMP:{timezone.now().strftime('%Y%m%dT%H%M%SZ')}
-DTSTART:{start_dt.strftime('%Y%m%dT%H%M%S')}
-DTEND:{end_dt.strftime('%Y%m%dT%H%M%S')}
-SUMMARY:Consulta SIMED - Dr(a). {consulta.medico.username} {consulta.medico.last_name}
-DESCRIPTION:Consulta médica na SIMED - Serviço Integrado de Medicina
-LOCATION:SIMED - Clínica Médica
-STATUS:CONFIRMED
-BEGIN:VALARM
-TRIGGER:-PT1H
-ACTION:DISPLAY
-DESCRIPTION:Lembrete: Consulta em 1 hora
-END:VALARM
-BEGIN:VALARM
-TRIGGER:-P1D
-ACTION:DISPLAY
-DESCRIPTION:Lembrete: Consulta amanhã
-END:VALARM
-END:VEVENT
-END:VCALENDAR"""
-    
-    response = HttpResponse(ics_content, content_type='text/calendar')
+    ics_content = calendario_ics.calendario([calendario_ics.evento(consulta, alarmes=True)])
+    
+    response = HttpResponse(ics_content, content_type='text/calendar; charset=utf-8')
     response['Content-Disposition'] = f'attachment; filename="consulta_simed_{consulta.id}.ics"'
     
     return response
 
 
+@require_safe
+def calendario_feed(request, token):
+    """
+    Feed iCalendar assinado pelo aplicativo de calendário (sem login: o token
+    na URL é a credencial). Responde 304 quando nada mudou desde a última leitura.
+    """
+    assinatura = get_object_or_404(
+        AssinaturaCalendario.objects.select_related('profissional'), token=token
+    )
+    etag = calendario_ics.versao(assinatura)
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    response = HttpResponse(calendario_ics.feed(assinatura), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="simed.ics"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _contexto_calendario(request):
+    """Link webcal da assinatura do usuário, para o bloco includes/assinatura_calendario.html."""
+    assinatura = calendario_ics.assinatura(request.user)
+    return {'calendario_url': calendario_ics.url(request, assinatura) if assinatura else None}
+
+
+@login_required
+@require_POST
+def assinar_calendario(request):
+    """
+    Cria a assinatura do calendário do usuário ou, com `renovar`, troca o
+    token, o que desativa a URL anterior.
+    """
+    assinatura, criada = AssinaturaCalendario.objects.get_or_create(**calendario_ics.dono(request.user))
+    if request.POST.get('renovar') and not criada:
+        assinatura.renovar()
+        messages.success(request, 'Novo link do calendário gerado. O link anterior deixou de funcionar.')
+    else:
+        messages.success(request, 'Link do calendário pronto. Adicione-o ao seu aplicativo de calendário.')
+    if 'profissional' in calendario_ics.dono(request.user):
+        return redirect('painel_medico')
+    return redirect('painel_paciente')
+
+
 # --- GERENCIAMENTO DE COMENTARIOS ---
 
 def home(request):